@@ -0,0 +1,74 @@
+# coding=utf-8
+"""
+Measures the cost engine on large print ranges.
+
+    python extras/benchmarks/bench_cost_engine.py [--rows N]
+
+Costs a synthetic history (several printers, some prints with only a
+filament length, some without a printer) with the NumPy path and with the
+pure-Python fallback, checks that both agree and reports rows per second.
+"""
+from __future__ import absolute_import
+
+import argparse
+import logging
+import math
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from octoprint_ExternalPrintHistory.modules.costEngine import CostEngine, CostRates, _load_numpy
+
+RATES = CostRates(electricity_rate=0.30, filament_cost=22.5, filament_diameter=1.75, filament_density=1.24)
+PRINTERS = {
+    1: (0.12, 799.0, 5000.0, 0.05),
+    2: (0.35, 1499.0, 8000.0, 0.10),
+    3: (0.09, 249.0, None, None),
+}
+
+
+def synthetic_columns(rows, seed=42):
+    generator = random.Random(seed)
+    columns = {"printer_id": [], "duration": [], "length": [], "weight": []}
+    for _ in range(rows):
+        columns["printer_id"].append(generator.choice([1, 2, 3, None]))
+        columns["duration"].append(generator.randint(60, 48 * 3600) if generator.random() > 0.01 else None)
+        length = generator.uniform(10, 80000)
+        columns["length"].append(length)
+        columns["weight"].append(length * 0.00298 if generator.random() > 0.3 else None)
+    return columns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    columns = synthetic_columns(args.rows)
+    logger = logging.getLogger("benchmark")
+    engines = [("python", CostEngine(logger, use_numpy=False))]
+    if _load_numpy() is not None:
+        engines.insert(0, ("numpy", CostEngine(logger)))
+    else:
+        print("NumPy is not installed, only the pure-Python path is measured")
+
+    totals = {}
+    for name, engine in engines:
+        for method in ("compute", "compute_totals"):
+            run = getattr(engine, method)
+            best = min(timeit.repeat(lambda: run(columns, PRINTERS, RATES), number=1, repeat=args.repeat))
+            print(f"{name:<7} {method:<15} {best * 1000:8.1f} ms  {args.rows / best:12,.0f} rows/s")
+        totals[name] = engine.compute_totals(columns, PRINTERS, RATES)
+
+    if len(totals) == 2:
+        mismatched = [column for column in CostEngine.COLUMNS
+                      if not math.isclose(totals["numpy"][column], totals["python"][column], rel_tol=1e-9)]
+        print("numpy and python totals " + ("differ: " + ", ".join(mismatched) if mismatched else "agree"))
+
+
+if __name__ == "__main__":
+    main()
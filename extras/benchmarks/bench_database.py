@@ -0,0 +1,124 @@
+# coding=utf-8
+"""
+Benchmarks the DatabaseManager and EventHandler hot paths against a local
+MariaDB loaded from tabla.sql.
+
+    python extras/benchmarks/bench_database.py [--iterations N] [--json out.json] [--baseline old.json]
+
+Without --host a throw-away MariaDB is started (mariadb-install-db and
+mariadbd must be on PATH). With --baseline the run fails (exit code 1) when
+the p95 latency of any benchmark regressed by more than --tolerance.
+"""
+from __future__ import absolute_import
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+
+import harness
+
+
+def bench_printer_config(plugin, iterations):
+    database_manager = plugin.database_manager
+    printer_id = plugin.config_manager._get_printer_id()
+    counter = [0]
+
+    def update():
+        counter[0] += 1
+        database_manager._update_insert_printer_config({
+            "printer_name": f"Benchmark {counter[0]}",
+            "printer_power_consumption": 120,
+        }, printer_id)
+
+    return harness.measure(update, iterations)
+
+
+def bench_select_printer(plugin, iterations):
+    printer_id = plugin.config_manager._get_printer_id()
+    return harness.measure(lambda: plugin.database_manager._select_Printer(printer_id), iterations)
+
+
+def bench_settings(plugin, iterations):
+    results = {"on_settings_load": harness.measure(plugin.on_settings_load, iterations)}
+    data = dict(plugin.on_settings_load())
+    data.update({"printer_name": "Benchmark printer", "printer_brand": "Benchmark"})
+    results["on_settings_save"] = harness.measure(lambda: plugin.on_settings_save(dict(data)), iterations)
+    return results
+
+
+def bench_event_to_row(plugin, database, iterations):
+    """
+    Time spent inside on_event (what OctoPrint's event thread pays) and the
+    time until the row is visible in Print.
+    """
+    from octoprint.events import Events
+
+    connection = database.connect()
+    event_samples = []
+    row_samples = []
+
+    def count_rows():
+        with connection.cursor() as cursor:
+            # The start row is written first, the print counts once its end is
+            cursor.execute("SELECT COUNT(*) FROM Print WHERE state <> 'printing'")
+            return cursor.fetchone()[0]
+
+    rows = count_rows()
+    for index in range(iterations):
+        payload = {"name": f"benchmark_{index}.gcode", "path": f"benchmark/benchmark_{index}.gcode", "origin": "local"}
+        plugin.on_event(Events.PRINT_STARTED, payload)
+
+        started = time.perf_counter()
+        plugin.on_event(Events.PRINT_DONE, dict(payload, time=1234.5))
+        event_samples.append(time.perf_counter() - started)
+
+        rows += 1
+        while count_rows() < rows:
+            time.sleep(0.001)
+        row_samples.append(time.perf_counter() - started)
+
+    connection.close()
+    return {
+        "on_event(PRINT_DONE)": harness.summarize(event_samples),
+        "event_to_row": harness.summarize(row_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    harness.add_database_arguments(parser)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--event-iterations", type=int, default=50)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against results previously written with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression (default 20%%)")
+    args = parser.parse_args()
+
+    data_folder = tempfile.mkdtemp(prefix="eph-benchmark-")
+    with harness.database_from_arguments(args) as database:
+        harness.load_schema(database)
+        plugin = harness.create_plugin(database, data_folder)
+        try:
+            # Make sure the printer row exists so every call below is an update/select
+            plugin.on_settings_save({"printer_name": "Benchmark printer"})
+
+            results = {}
+            results["_update_insert_printer_config"] = bench_printer_config(plugin, args.iterations)
+            results["_select_Printer"] = bench_select_printer(plugin, args.iterations)
+            results.update(bench_settings(plugin, args.iterations))
+            results.update(bench_event_to_row(plugin, database, args.event_iterations))
+            results["pool"] = plugin.database_manager._get_pool_statistics()
+        finally:
+            plugin.on_shutdown()
+            shutil.rmtree(data_folder, ignore_errors=True)
+
+    pool = results.pop("pool")
+    regressions = harness.report(results, args.json, args.baseline, args.tolerance)
+    print(f"pool: {pool}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
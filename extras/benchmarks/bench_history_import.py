@@ -0,0 +1,152 @@
+# coding=utf-8
+"""
+Measures the bulk history import on a synthetic PrintJobHistory database.
+
+    python extras/benchmarks/bench_history_import.py [--prints N] [--sqlite | --host ...] [--json out.json]
+
+Writes a PrintJobHistory-shaped printJobHistory.db with --prints jobs, then
+imports it through HistoryImporter into the embedded SQLite backend
+(--sqlite) or a throw-away MariaDB loaded from tabla.sql. Reports the
+latency of each chunk and the rows imported per second; a second import
+over the same rows checks that nothing is duplicated.
+"""
+from __future__ import absolute_import
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import harness
+
+
+class EmbeddedSQLite():
+    """
+    The plugin's embedded SQLite backend in a temporary file, in place of a
+    MariaDB server.
+    """
+    password = ""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def settings(self):
+        return {"db_backend": "sqlite", "db_sqlite_path": self.path}
+
+
+def write_print_job_history(path, count, seed=42):
+    generator = random.Random(seed)
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE pjh_printjobmodel (
+            databaseId INTEGER PRIMARY KEY, printStartDateTime TEXT, printEndDateTime TEXT, duration INTEGER,
+            fileName TEXT, filePathName TEXT, printStatusResult TEXT);
+        CREATE TABLE pjh_filamentmodel (
+            databaseId INTEGER PRIMARY KEY, printJob_id INTEGER, usedLength REAL, usedWeight REAL);
+    """)
+    started = datetime(2023, 1, 1, 8)
+    jobs, filaments = [], []
+    for job_id in range(1, count + 1):
+        started += timedelta(minutes=generator.randint(30, 600))
+        duration = generator.randint(600, 12 * 3600)
+        jobs.append((job_id, started.isoformat(), (started + timedelta(seconds=duration)).isoformat(), duration,
+                     f"benchmark_{job_id}.gcode", f"benchmark/benchmark_{job_id}.gcode",
+                     "success" if generator.random() > 0.1 else "failed"))
+        length = generator.uniform(100, 40000)
+        filaments.append((job_id, length, length * 0.00298))
+    connection.executemany("INSERT INTO pjh_printjobmodel VALUES (?, ?, ?, ?, ?, ?, ?)", jobs)
+    connection.executemany("INSERT INTO pjh_filamentmodel (printJob_id, usedLength, usedWeight) VALUES (?, ?, ?)", filaments)
+    connection.commit()
+    connection.close()
+
+
+def run_import(plugin):
+    """
+    One import of the PrintJobHistory source, waited for, timing each chunk.
+    """
+    database_manager = plugin.database_manager
+    insert_prints = database_manager._insert_prints
+    samples = []
+
+    def timed_insert(records, connection=None):
+        chunk_started = time.perf_counter()
+        try:
+            return insert_prints(records, connection)
+        finally:
+            samples.append(time.perf_counter() - chunk_started)
+
+    database_manager._insert_prints = timed_insert
+    try:
+        started = time.perf_counter()
+        result = plugin.history_importer.start(["PrintJobHistory"])
+        if result["error"]:
+            raise RuntimeError(result["message"])
+        plugin.history_importer._thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        del database_manager._insert_prints
+    status = plugin.history_importer.get_status()
+    if status.get("error"):
+        raise RuntimeError(status["error"])
+    return samples, elapsed, status["sources"]["PrintJobHistory"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    harness.add_database_arguments(parser)
+    parser.add_argument("--sqlite", action="store_true", help="import into the embedded SQLite backend")
+    parser.add_argument("--prints", type=int, default=50000)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against results previously written with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression (default 20%%)")
+    args = parser.parse_args()
+
+    data_folder = tempfile.mkdtemp(prefix="eph-benchmark-")
+    source_folder = os.path.join(data_folder, "PrintJobHistory")
+    os.makedirs(source_folder)
+    write_print_job_history(os.path.join(source_folder, "printJobHistory.db"), args.prints)
+
+    if args.sqlite:
+        database = EmbeddedSQLite(os.path.join(data_folder, "print_history.db"))
+    else:
+        database = harness.database_from_arguments(args)
+    with database:
+        if not args.sqlite:
+            harness.load_schema(database)
+        plugin = harness.create_plugin(database, data_folder)
+        try:
+            plugin.on_settings_save({"printer_name": "Benchmark printer"})
+            plugin._plugin_manager.get_plugin_info = lambda identifier: identifier
+            plugin.event_handler._get_other_plugin_data_folder = lambda identifier: source_folder
+
+            results = {}
+            for name in ("import", "import again (checkpoint reset)"):
+                samples, elapsed, progress = run_import(plugin)
+                results[name] = harness.summarize(samples, elapsed)
+                print(f"{name}: {progress['read']} read, {progress['imported']} imported, "
+                      f"{progress['read'] / elapsed:.0f} rows/s in {len(samples)} chunks")
+                # The second run re-reads every row, as after a change of target database
+                os.remove(plugin.history_importer._checkpoint_path())
+            if progress["imported"]:
+                raise RuntimeError("the second import duplicated prints")
+        finally:
+            plugin.on_shutdown()
+            shutil.rmtree(data_folder, ignore_errors=True)
+
+    regressions = harness.report(results, args.json, args.baseline, args.tolerance)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
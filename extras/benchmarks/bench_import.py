@@ -0,0 +1,85 @@
+# coding=utf-8
+"""
+Measures what importing and instantiating the plugin adds to OctoPrint startup.
+
+    python extras/benchmarks/bench_import.py [--runs N] [--baseline REV]
+
+Every run is a fresh interpreter that first imports the modules OctoPrint has
+already loaded when it gets to the plugins (octoprint.plugin, flask), then
+imports the plugin package and creates the plugin instance. Reported are the
+median time, the memory allocated and the modules loaded by that step. With
+--baseline the plugin package is also measured as it was at the given git
+revision, for a before/after comparison.
+"""
+from __future__ import absolute_import
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPOSITORY_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+PACKAGE = "octoprint_ExternalPrintHistory"
+
+PROBE = """
+import json, sys, time, tracemalloc
+import octoprint.plugin, octoprint.events, flask
+before = set(sys.modules)
+tracemalloc.start()
+started = time.perf_counter()
+from octoprint_ExternalPrintHistory import ExternalPrintHistoryPlugin
+ExternalPrintHistoryPlugin()
+elapsed = time.perf_counter() - started
+allocated = tracemalloc.get_traced_memory()[0]
+loaded = sorted(set(sys.modules) - before)
+print(json.dumps({"seconds": elapsed, "allocated": allocated, "modules": loaded}))
+"""
+
+
+def measure(tree, runs):
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [tree, os.environ.get("PYTHONPATH")])))
+    samples = []
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, "-c", PROBE], cwd=tree, env=environment, capture_output=True, text=True)
+        if process.returncode:
+            raise RuntimeError(f"Importing the plugin from {tree} failed:\n{process.stderr}")
+        samples.append(json.loads(process.stdout.splitlines()[-1]))
+    modules = samples[-1]["modules"]
+    return {
+        "seconds": statistics.median(sample["seconds"] for sample in samples),
+        "allocated": statistics.median(sample["allocated"] for sample in samples),
+        "modules": len(modules),
+        "third_party": sorted({name.split(".")[0] for name in modules
+                               if not name.startswith(PACKAGE) and name.split(".")[0] not in getattr(sys, "stdlib_module_names", ())}),
+    }
+
+
+def export_revision(revision, directory):
+    archive = subprocess.run(["git", "-C", REPOSITORY_ROOT, "archive", revision, PACKAGE],
+                             check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+    return directory
+
+
+def report(label, result):
+    print(f"{label:<10} {result['seconds'] * 1000:8.1f} ms  {result['allocated'] / 1024:8.0f} KiB  "
+          f"{result['modules']:4d} modules  third party: {', '.join(result['third_party']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--baseline", help="git revision to compare against, e.g. HEAD~1")
+    args = parser.parse_args()
+
+    if args.baseline:
+        with tempfile.TemporaryDirectory(prefix="eph-import-") as directory:
+            report(args.baseline, measure(export_revision(args.baseline, directory), args.runs))
+    report("current", measure(REPOSITORY_ROOT, args.runs))
+
+
+if __name__ == "__main__":
+    main()
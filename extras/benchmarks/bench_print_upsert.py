@@ -0,0 +1,201 @@
+# coding=utf-8
+"""
+Compares the insert_or_update_print stored procedure with the batched
+multi-row upserts prints are written with, on a local MariaDB loaded from
+tabla.sql.
+
+    python extras/benchmarks/bench_print_upsert.py [--prints N] [--batch-size N] [--json out.json]
+
+Every print is written twice, as the plugin does: its start row, then its
+completion. The procedure path calls insert_or_update_print for each write
+with all its parameters, reading the new print_id back after the start. The
+upsert path goes through DatabaseManager._insert_prints, once per write and
+in batches of --batch-size records: starts as one multi-row upsert, each
+completion as a keyed UPDATE of its row. Latencies are per print (start and
+end).
+"""
+from __future__ import absolute_import
+
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import harness
+
+# As tabla.sql used to create it
+PROCEDURE_SQL = """
+CREATE PROCEDURE insert_or_update_print (
+    IN p_print_id INT, IN p_order_id INT, IN p_printer_id INT, IN p_filament_id INT,
+    IN p_start_datetime DATETIME, IN p_end_datetime DATETIME, IN p_duration INT, IN p_estimated_time INT,
+    IN p_thumbnail_hash CHAR(64), IN p_calculated_length DECIMAL(10,2), IN p_total_length DECIMAL(10,2),
+    IN p_calculated_height DECIMAL(10,2), IN p_total_height DECIMAL(10,2), IN p_calculated_layers INT,
+    IN p_total_layers INT, IN p_calculated_weight DECIMAL(10,2), IN p_total_weight DECIMAL(10,2),
+    IN p_nozzle_temperature DECIMAL(5,2), IN p_bed_temperature DECIMAL(5,2), IN p_bed_type VARCHAR(50),
+    IN p_nozzle_diameter DECIMAL(5,2), IN p_state VARCHAR(50), OUT p_result_id INT
+)
+BEGIN
+    DECLARE v_existing_id INT;
+    SELECT print_id INTO v_existing_id FROM Print WHERE print_id = p_print_id;
+    IF v_existing_id IS NOT NULL THEN
+        UPDATE Print
+        SET order_id = p_order_id, printer_id = p_printer_id, filament_id = p_filament_id,
+            start_datetime = p_start_datetime, end_datetime = p_end_datetime, duration = p_duration,
+            estimated_time = p_estimated_time, thumbnail_hash = p_thumbnail_hash,
+            calculated_length = p_calculated_length, total_length = p_total_length,
+            calculated_height = p_calculated_height, total_height = p_total_height,
+            calculated_layers = p_calculated_layers, total_layers = p_total_layers,
+            calculated_weight = p_calculated_weight, total_weight = p_total_weight,
+            nozzle_temperature = p_nozzle_temperature, bed_temperature = p_bed_temperature,
+            bed_type = p_bed_type, nozzle_diameter = p_nozzle_diameter, state = p_state
+        WHERE print_id = p_print_id;
+        SET p_result_id = p_print_id;
+    ELSE
+        INSERT INTO Print (order_id, printer_id, filament_id, start_datetime, end_datetime, duration,
+                           estimated_time, thumbnail_hash, calculated_length, total_length, calculated_height,
+                           total_height, calculated_layers, total_layers, calculated_weight, total_weight,
+                           nozzle_temperature, bed_temperature, bed_type, nozzle_diameter, state)
+        VALUES (p_order_id, p_printer_id, p_filament_id, p_start_datetime, p_end_datetime, p_duration,
+                p_estimated_time, p_thumbnail_hash, p_calculated_length, p_total_length, p_calculated_height,
+                p_total_height, p_calculated_layers, p_total_layers, p_calculated_weight, p_total_weight,
+                p_nozzle_temperature, p_bed_temperature, p_bed_type, p_nozzle_diameter, p_state);
+        SET p_result_id = LAST_INSERT_ID();
+    END IF;
+END
+"""
+
+PROCEDURE_COLUMNS = ["order_id", "printer_id", "filament_id", "start_datetime", "end_datetime", "duration",
+                     "estimated_time", "thumbnail_hash", "calculated_length", "total_length", "calculated_height",
+                     "total_height", "calculated_layers", "total_layers", "calculated_weight", "total_weight",
+                     "nozzle_temperature", "bed_temperature", "bed_type", "nozzle_diameter", "state"]
+
+
+def synthetic_prints(count, printer_id, seed=42):
+    """
+    ``(start record, end changes)`` pairs shaped like the event handler's.
+    """
+    generator = random.Random(seed)
+    prints = []
+    started = datetime(2026, 1, 1, 8)
+    for index in range(count):
+        started += timedelta(minutes=generator.randint(30, 600))
+        duration = generator.randint(600, 12 * 3600)
+        start = {
+            "print_uuid": str(uuid.uuid4()),
+            "printer_id": printer_id,
+            "start_datetime": started,
+            "estimated_time": int(duration * generator.uniform(0.8, 1.2)),
+            "calculated_length": round(generator.uniform(100, 40000), 2),
+            "total_length": round(generator.uniform(100, 40000), 2),
+            "total_height": round(generator.uniform(1, 200), 2),
+            "total_layers": generator.randint(5, 1000),
+            "total_weight": round(generator.uniform(1, 300), 2),
+            "nozzle_temperature": 215.0,
+            "bed_temperature": 60.0,
+            "nozzle_diameter": 0.4,
+            "bed_type": "PEI",
+            "file_name": f"benchmark_{index}.gcode",
+            "file_path": f"benchmark/benchmark_{index}.gcode",
+            "state": "printing",
+            "electricity_rate": 0.3,
+        }
+        # As the event handler sends it: the whole row, over the start row
+        end = dict(start, **{
+            "end_datetime": started + timedelta(seconds=duration),
+            "duration": duration,
+            "state": "done" if generator.random() > 0.1 else "failed",
+            "update_only": True,
+        })
+        prints.append((start, end))
+    return prints
+
+
+def bench_procedure(connection, prints):
+    samples = []
+    with connection.cursor() as cursor:
+        started = time.perf_counter()
+        for start, end in prints:
+            print_started = time.perf_counter()
+            cursor.callproc("insert_or_update_print", [None] + [start.get(column) for column in PROCEDURE_COLUMNS] + [None])
+            cursor.execute("SELECT @_insert_or_update_print_22")
+            print_id = cursor.fetchone()[0]
+            completed = dict(start, **end)
+            cursor.callproc("insert_or_update_print", [print_id] + [completed.get(column) for column in PROCEDURE_COLUMNS] + [None])
+            samples.append(time.perf_counter() - print_started)
+        elapsed = time.perf_counter() - started
+    return harness.summarize(samples, elapsed)
+
+
+def bench_upsert(plugin, prints, batch_size):
+    """
+    Starts then ends, ``batch_size`` records per transaction. A batch costs
+    each of its prints an equal share.
+    """
+    database_manager = plugin.database_manager
+    samples = [0.0] * len(prints)
+    started = time.perf_counter()
+    for phase in (0, 1):
+        for offset in range(0, len(prints), batch_size):
+            batch = [pair[phase] for pair in prints[offset:offset + batch_size]]
+            batch_started = time.perf_counter()
+            database_manager._insert_prints(batch)
+            share = (time.perf_counter() - batch_started) / len(batch)
+            for index in range(offset, offset + len(batch)):
+                samples[index] += share
+    elapsed = time.perf_counter() - started
+    return harness.summarize(samples, elapsed)
+
+
+def count_finished(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM Print WHERE state IN ('done', 'failed')")
+        return cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    harness.add_database_arguments(parser)
+    parser.add_argument("--prints", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against results previously written with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression (default 20%%)")
+    args = parser.parse_args()
+
+    data_folder = tempfile.mkdtemp(prefix="eph-benchmark-")
+    with harness.database_from_arguments(args) as database:
+        harness.load_schema(database)
+        connection = database.connect()
+        with connection.cursor() as cursor:
+            cursor.execute(PROCEDURE_SQL)
+        plugin = harness.create_plugin(database, data_folder)
+        try:
+            plugin.on_settings_save({"printer_name": "Benchmark printer"})
+            printer_id = plugin.config_manager._get_printer_id()
+
+            results = {}
+            variants = [
+                ("procedure, call per write", lambda prints: bench_procedure(connection, prints)),
+                ("upsert, one write per batch", lambda prints: bench_upsert(plugin, prints, 1)),
+                (f"upsert, {args.batch_size} writes per batch", lambda prints: bench_upsert(plugin, prints, args.batch_size)),
+            ]
+            for seed, (name, run) in enumerate(variants):
+                finished = count_finished(connection)
+                results[name] = run(synthetic_prints(args.prints, printer_id, seed))
+                if count_finished(connection) - finished != args.prints:
+                    raise RuntimeError(f"{name} did not finish every print")
+        finally:
+            plugin.on_shutdown()
+            connection.close()
+            shutil.rmtree(data_folder, ignore_errors=True)
+
+    regressions = harness.report(results, args.json, args.baseline, args.tolerance)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# coding=utf-8
+"""
+Measures the cost the telemetry recorder adds to OctoPrint's sent G-code hook.
+
+    python extras/benchmarks/bench_telemetry_hook.py [--iterations N]
+
+Compares the hook with recording disabled (the baseline every non-printing
+line pays) against recording enabled, for a representative G-code mix.
+"""
+from __future__ import absolute_import
+
+import argparse
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from octoprint_ExternalPrintHistory.modules.telemetryRecorder import TelemetryRecorder
+
+GCODE_MIX = [
+    ("G1 X10.5 Y20.1 E0.0345", "G1"),
+    ("G1 X11.2 Y20.9 E0.0212", "G1"),
+    ("G1 X12.0 Y21.4 E0.0301 F1800", "G1"),
+    ("G0 X50 Y50 F9000", "G0"),
+    ("G1 Z0.4 F600", "G1"),
+    ("M104 S215", "M104"),
+    ("M106 S255", "M106"),
+    ("G92 E0", "G92"),
+]
+
+
+class _Printer():
+    def get_current_temperatures(self):
+        return {"tool0": {"actual": 214.8, "target": 215.0}, "bed": {"actual": 60.1, "target": 60.0}}
+
+
+class _Plugin():
+    _printer = _Printer()
+
+
+def run(recorder, iterations):
+    lines = GCODE_MIX * (iterations // len(GCODE_MIX))
+    hook = recorder.on_gcode_sent
+
+    def send_all():
+        for cmd, gcode in lines:
+            hook(cmd, gcode)
+
+    best = min(timeit.repeat(send_all, number=1, repeat=5))
+    return best / len(lines) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=400000)
+    args = parser.parse_args()
+
+    recorder = TelemetryRecorder(_Plugin(), logging.getLogger("benchmark"))
+    idle = run(recorder, args.iterations)
+    recorder.start()
+    recording = run(recorder, args.iterations)
+    recorder.finish()
+
+    print(f"hook, not printing : {idle:8.1f} ns/line")
+    print(f"hook, recording    : {recording:8.1f} ns/line")
+
+
+if __name__ == "__main__":
+    main()
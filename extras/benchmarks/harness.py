@@ -0,0 +1,323 @@
+# coding=utf-8
+"""
+Shared helpers for the benchmark scripts: a throw-away local MariaDB,
+a loader for tabla.sql, minimal stand-ins for the OctoPrint objects the
+plugin is injected with, and latency statistics.
+"""
+from __future__ import absolute_import
+
+import json
+import math
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPOSITORY_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+SCHEMA_PATH = os.path.join(REPOSITORY_ROOT, "tabla.sql")
+
+sys.path.insert(0, REPOSITORY_ROOT)
+
+
+###################################################################
+##################### DATABASE ####################################
+###################################################################
+class LocalMariaDB():
+    """
+    Starts a private MariaDB server in a temporary directory. The server runs
+    with --skip-grant-tables, so any user name and password are accepted.
+    """
+    def __init__(self, database="print_history_benchmark"):
+        self.database = database
+        self.host = "127.0.0.1"
+        self.port = None
+        self.user = "benchmark"
+        self.password = "benchmark"
+        self._workdir = None
+        self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self, timeout=60):
+        install = shutil.which("mariadb-install-db") or shutil.which("mysql_install_db")
+        server = shutil.which("mariadbd") or shutil.which("mysqld")
+        if not install or not server:
+            raise RuntimeError("MariaDB binaries not found, install MariaDB or pass --host to use an existing server")
+
+        self._workdir = tempfile.mkdtemp(prefix="eph-mariadb-")
+        datadir = os.path.join(self._workdir, "data")
+        self.port = _free_port()
+        subprocess.run([install, "--no-defaults", f"--datadir={datadir}", "--skip-test-db"],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._process = subprocess.Popen([
+            server, "--no-defaults", f"--datadir={datadir}", f"--port={self.port}",
+            f"--socket={os.path.join(self._workdir, 'mysqld.sock')}", "--bind-address=127.0.0.1",
+            "--skip-grant-tables", "--innodb-buffer-pool-size=64M",
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                connection = self.connect(database=None)
+                break
+            except Exception:
+                if time.monotonic() > deadline or self._process.poll() is not None:
+                    self.stop()
+                    raise RuntimeError("MariaDB did not start")
+                time.sleep(0.2)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE `{self.database}` CHARACTER SET utf8mb4")
+        connection.close()
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+            self._process = None
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+
+    def connect(self, database=""):
+        import pymysql
+        return pymysql.connect(host=self.host, port=self.port, user=self.user, password=self.password,
+                               database=self.database if database == "" else database, autocommit=True)
+
+    def settings(self):
+        return {"db_host": self.host, "db_port": self.port, "db_user": self.user,
+                "db_password": self.password, "db_database": self.database}
+
+
+class ExistingDatabase(LocalMariaDB):
+    """
+    Uses an already running server given on the command line.
+    """
+    def __init__(self, host, port, user, password, database):
+        LocalMariaDB.__init__(self, database)
+        self.host, self.port, self.user, self.password = host, port, user, password
+
+    def start(self, timeout=60):
+        pass
+
+    def stop(self):
+        pass
+
+
+def add_database_arguments(parser):
+    parser.add_argument("--host", help="use this MySQL/MariaDB server instead of starting a local one")
+    parser.add_argument("--port", type=int, default=3306)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--database", default="print_history_benchmark",
+                        help="database to (re)create the schema in; it is dropped first")
+
+
+def database_from_arguments(args):
+    if args.host:
+        return ExistingDatabase(args.host, args.port, args.user, args.password, args.database)
+    return LocalMariaDB(args.database)
+
+
+def split_sql_script(script):
+    """
+    Split a mysqldump-style script into statements, honouring DELIMITER.
+    """
+    statements = []
+    delimiter = ";"
+    current = []
+    for line in script.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith("DELIMITER "):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        current.append(line)
+        if stripped.endswith(delimiter):
+            statement = "\n".join(current).strip()
+            statement = statement[:len(statement) - len(delimiter)].strip()
+            if statement:
+                statements.append(statement)
+            current = []
+    return statements
+
+
+def load_schema(database, path=SCHEMA_PATH):
+    connection = database.connect(database=None)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS `{database.database}`")
+        cursor.execute(f"CREATE DATABASE `{database.database}` CHARACTER SET utf8mb4")
+        cursor.execute(f"USE `{database.database}`")
+        with open(path, encoding="utf-8") as schema_file:
+            for statement in split_sql_script(schema_file.read()):
+                cursor.execute(statement)
+    connection.close()
+
+
+###################################################################
+##################### OCTOPRINT STAND-INS #########################
+###################################################################
+class BenchmarkSettings():
+    """
+    In-memory replacement for OctoPrint's PluginSettings.
+    """
+    def __init__(self, defaults):
+        self._data = dict(defaults)
+
+    def get(self, path, **kwargs):
+        return self._data.get(path[0]) if path else dict(self._data)
+
+    def get_boolean(self, path, **kwargs):
+        return bool(self.get(path))
+
+    def get_int(self, path, **kwargs):
+        value = self.get(path)
+        return int(value) if value is not None else None
+
+    def get_float(self, path, **kwargs):
+        value = self.get(path)
+        return float(value) if value is not None else None
+
+    def get_all_data(self, **kwargs):
+        return dict(self._data)
+
+    def set(self, path, value, **kwargs):
+        if path:
+            self._data[path[0]] = value
+        else:
+            self._data.update(value)
+
+    def save(self, *args, **kwargs):
+        pass
+
+
+class BenchmarkPrinter():
+    def get_current_temperatures(self):
+        return {"tool0": {"actual": 214.8, "target": 215.0}, "bed": {"actual": 60.1, "target": 60.0}}
+
+
+class BenchmarkFileManager():
+    def get_metadata(self, origin, path):
+        return {"analysis": {"estimatedPrintTime": 3600, "filament": {"tool0": {"length": 1234.5}}}}
+
+    def path_on_disk(self, origin, path):
+        return None
+
+
+class BenchmarkPluginManager():
+    plugins = {}
+
+    def send_plugin_message(self, identifier, data):
+        pass
+
+    def get_plugin_info(self, identifier):
+        return None
+
+
+def create_plugin(database, data_folder, **overrides):
+    """
+    Instantiate the plugin the way OctoPrint does (constructor, injected
+    attributes, initialize, on_startup) against ``database``.
+    """
+    from octoprint_ExternalPrintHistory import ExternalPrintHistoryPlugin
+
+    plugin = ExternalPrintHistoryPlugin()
+    plugin._identifier = "ExternalPrintHistory"
+    plugin._plugin_version = "benchmark"
+    plugin._data_folder = data_folder
+    plugin.get_plugin_data_folder = lambda: data_folder
+    plugin._printer = BenchmarkPrinter()
+    plugin._file_manager = BenchmarkFileManager()
+    plugin._plugin_manager = BenchmarkPluginManager()
+
+    settings = plugin.get_settings_defaults()
+    settings.update(database.settings())
+    settings.update(overrides)
+    plugin._settings = BenchmarkSettings(settings)
+
+    plugin.config_manager._initialize_key_and_salt()
+    plugin._settings.set(["db_password"], plugin.config_manager._encrypt(database.password))
+    plugin.initialize()
+    plugin.on_startup("127.0.0.1", 5000)
+    return plugin
+
+
+###################################################################
+##################### STATISTICS ##################################
+###################################################################
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(math.ceil(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(function, iterations, warmup=10):
+    """
+    Call ``function`` ``iterations`` times and return its latency summary in ms.
+    """
+    for _ in range(warmup):
+        function()
+
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed)
+
+
+def summarize(samples, elapsed=None):
+    samples = sorted(samples)
+    elapsed = elapsed if elapsed is not None else sum(samples)
+    return {
+        "iterations": len(samples),
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": (samples[-1] if samples else 0.0) * 1000,
+        "ops_per_sec": len(samples) / elapsed if elapsed else 0.0,
+    }
+
+
+def report(results, json_path=None, baseline_path=None, tolerance=0.2):
+    """
+    Print a result table, optionally save it as JSON and compare the p95 of
+    every benchmark against a saved baseline. Returns the number of regressions.
+    """
+    print(f"{'benchmark':<40} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+    for name, result in results.items():
+        print(f"{name:<40} {result['p50_ms']:9.3f} {result['p95_ms']:9.3f} {result['p99_ms']:9.3f} {result['ops_per_sec']:10.1f}")
+
+    if json_path:
+        with open(json_path, "w") as json_file:
+            json.dump(results, json_file, indent=2, sort_keys=True)
+
+    regressions = 0
+    if baseline_path:
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous and result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions += 1
+                print(f"REGRESSION {name}: p95 {previous['p95_ms']:.3f} ms -> {result['p95_ms']:.3f} ms")
+    return regressions
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
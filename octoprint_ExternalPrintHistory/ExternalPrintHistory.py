@@ -1,18 +1,28 @@
 # coding=utf-8
 from __future__ import absolute_import
 
+import json
 import logging
+import re
+import threading
 import octoprint.plugin
 import flask
 
+from datetime import datetime
 from flask import request
 from octoprint.events import Events
 from .modules.eventHandler import EventHandler
 from .modules.databaseManager import DatabaseManager
-from .modules.configurationManager import ConfigurationManager
+from .modules.configurationManager import ConfigurationManager, ConfigSnapshot
 from .modules.pluginChecker import PluginChecker
+from .modules.printWriter import PrintWriter
+from .modules.gcodeMetadata import GcodeMetadataCache
+from .modules.telemetryRecorder import TelemetryRecorder
+from .modules.activePrints import ActivePrints
 from .common.SettingsKeys import SettingsKeys
 
+THUMBNAIL_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
 class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
                                 octoprint.plugin.TemplatePlugin,
                                 octoprint.plugin.SettingsPlugin,
@@ -27,8 +37,80 @@ class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
         self.event_handler = EventHandler(plugin=self, _logger=self._logger)
         self.config_manager = ConfigurationManager(plugin=self, _logger=self._logger)
         self.plugin_Checker = PluginChecker(plugin=self, _logger=self._logger)
+        self.print_writer = PrintWriter(plugin=self, _logger=self._logger)
+        self.gcode_metadata = GcodeMetadataCache(_logger=self._logger)
+        self.telemetry_recorder = TelemetryRecorder(plugin=self, _logger=self._logger)
+        self.active_prints = ActivePrints(plugin=self, _logger=self._logger)
+        self._components = {}  # name -> component created on first use
+        self._components_lock = threading.RLock()
         self._isInitialized = False
 
+    def _component(self, name, create):
+        component = self._components.get(name)
+        if component is None:
+            with self._components_lock:
+                component = self._components.get(name)
+                if component is None:
+                    component = self._components[name] = create()
+        return component
+
+    # Components only some routes, print ends or settings need: their modules
+    # are loaded and the components created on first use
+    @property
+    def metrics(self):
+        def create():
+            from .modules.metrics import MetricsRegistry
+            return MetricsRegistry(_logger=self._logger)
+        return self._component("metrics", create)
+
+    @property
+    def analytics_cache(self):
+        def create():
+            from .modules.analyticsCache import AnalyticsCache
+            return AnalyticsCache(_logger=self._logger)
+        return self._component("analytics_cache", create)
+
+    @property
+    def cost_engine(self):
+        def create():
+            from .modules.costEngine import CostEngine
+            return CostEngine(_logger=self._logger)
+        return self._component("cost_engine", create)
+
+    @property
+    def eta_model(self):
+        def create():
+            from .modules.etaModel import EtaModel
+            return EtaModel(plugin=self, _logger=self._logger)
+        return self._component("eta_model", create)
+
+    @property
+    def history_publisher(self):
+        def create():
+            from .modules.historyPublisher import HistoryPublisher
+            return HistoryPublisher(plugin=self, _logger=self._logger)
+        return self._component("history_publisher", create)
+
+    @property
+    def history_importer(self):
+        def create():
+            from .modules.historyImporter import HistoryImporter
+            return HistoryImporter(plugin=self, _logger=self._logger)
+        return self._component("history_importer", create)
+
+    @property
+    def history_exporter(self):
+        def create():
+            from .modules.historyExporter import HistoryExporter
+            return HistoryExporter(plugin=self, _logger=self._logger)
+        return self._component("history_exporter", create)
+
+    def _invalidate_analytics(self):
+        # A cache that was never created holds nothing to invalidate
+        analytics_cache = self._components.get("analytics_cache")
+        if analytics_cache is not None:
+            analytics_cache.invalidate()
+
     def initialize(self):
         self._logger.info("Initializing ExternalPrintHistory Plugin")
         self._isInitialized = True
@@ -36,34 +118,56 @@ class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
     def on_startup(self, host, port):
         self._logger.info("ExternalPrintHistory Plugin started")
         self.config_manager._initialize_key_and_salt()
-        settings = self.config_manager._load_config()
-        self.database_manager._set_and_test_connection(settings)
+        config = self.config_manager._get_config()
+        self.metrics.slow_query_threshold = (config.slow_query_threshold or 0) / 1000.0
+        self.database_manager._set_and_test_connection(config)
+        self.print_writer.configure(config.edge_sync, config.sync_interval)
+        self.print_writer.start()
         
-    #def on_after_startup(self):
+    def on_after_startup(self):
+        # All plugins are loaded by now, check the optional dependencies once and keep the result
+        self.plugin_Checker._checkAndLoadThirdPartyPluginInfos()
         
     def on_shutdown(self):
         self._logger.info("Shutting down ExternalPrintHistory plugin")
+        if "history_importer" in self._components:
+            self.history_importer.stop()
+        self.print_writer.stop()
+        if "history_publisher" in self._components:
+            self.history_publisher.stop()
+        self.gcode_metadata.shutdown()
+        self._logger.info(f"Print writer statistics: {self.print_writer.get_statistics()}")
+        self._logger.info(f"Database pool statistics: {self.database_manager._get_pool_statistics()}")
+        self.database_manager._close_pool()
         
     def get_settings_defaults(self):
         settings = {
             SettingsKeys.PLUGIN_DEPENDENCY_CHECK: True,
             SettingsKeys.PRINTER_ID: 0,
+            SettingsKeys.DB_BACKEND: "mysql",
+            SettingsKeys.DB_SQLITE_PATH: "",
             SettingsKeys.DB_USER: "",
             SettingsKeys.DB_PASSWORD: "",
             SettingsKeys.DB_HOST: "",
             SettingsKeys.DB_DATABASE: "",            
             SettingsKeys.DB_PORT: 3306,
+            SettingsKeys.EDGE_SYNC: False,
+            SettingsKeys.SYNC_INTERVAL: 300,
+            SettingsKeys.SLOW_QUERY_THRESHOLD: 0,
             SettingsKeys.CURRENCY: "\u20ac",
-            SettingsKeys.ELECTRICITY_COST: 0.0
+            SettingsKeys.ELECTRICITY_COST: 0.0,
+            SettingsKeys.FILAMENT_COST: 0.0,
+            SettingsKeys.FILAMENT_DIAMETER: 1.75,
+            SettingsKeys.FILAMENT_DENSITY: 1.24
         }
 
         return settings
     
     def on_settings_load(self):  
-        settings = self.config_manager._load_config()
-        self.database_manager._set_and_test_connection(settings)
+        config = self.config_manager._get_config()
+        self.database_manager._set_and_test_connection(config)
         
-        return settings
+        return config.to_dict()
     
     def on_settings_save(self, data):
         result = {"error": False}       
@@ -74,7 +178,7 @@ class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
             config.update(setting)
 
         if printer_data:
-            result = self.database_manager._set_and_test_connection(config)
+            result = self.database_manager._set_and_test_connection(ConfigSnapshot(config))
             
             if not result.get("error"):
                 result = self.database_manager._update_insert_printer_config(printer_data, self.config_manager._get_printer_id())
@@ -85,13 +189,22 @@ class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
                 self.config_manager._showPopUp("error", "Error saving data", "Data not updated.", False)
             elif result.get("insert"):
                 config.update({SettingsKeys.PRINTER_ID: result.get("printer_id")})
+
+            # Costs depend on the printer's power and price
+            self._invalidate_analytics()
         
         if not result.get("error"):
             self.config_manager._showPopUp("success", "Saved Data", "Data was updated", True)
         
+        if self.config_manager._set_config(config) and not printer_data:
+            # Re-point the pool at the new database; unchanged settings cost nothing
+            self.database_manager._set_and_test_connection(self.config_manager._get_config())
+        self.print_writer.configure(config.get(SettingsKeys.EDGE_SYNC), config.get(SettingsKeys.SYNC_INTERVAL))
+        self.metrics.slow_query_threshold = float(config.get(SettingsKeys.SLOW_QUERY_THRESHOLD) or 0) / 1000.0
+
         db_password = config.get(SettingsKeys.DB_PASSWORD)
         encrypted_db_password = self.config_manager._encrypt(db_password)
-        config.update({SettingsKeys.DB_PASSWORD: encrypted_db_password})
+        config = dict(config, **{SettingsKeys.DB_PASSWORD: encrypted_db_password})
         
         octoprint.plugin.SettingsPlugin.on_settings_save(self, config)
 
@@ -101,8 +214,7 @@ class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
     def on_sentGCodeHook(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
         if not self._isInitialized:
             return
-        # Aquí puedes manejar el código G según sea necesario.
-        pass
+        self.telemetry_recorder.on_gcode_sent(cmd, gcode)
     
     def on_event(self, event, payload):
         
@@ -111,7 +223,10 @@ class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
 
         if event == Events.CLIENT_OPENED:
             if self.config_manager._get_plugin_dependency_check():
-                self.plugin_Checker._checkAndLoadThirdPartyPluginInfos()
+                self.plugin_Checker._sendMissingPluginsMessage()
+
+        elif event in PluginChecker.INVALIDATING_EVENTS:
+            self.plugin_Checker._invalidate()
 
         elif event == Events.PRINT_STARTED:
             self.event_handler._handle_print_started(payload)
@@ -122,6 +237,9 @@ class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
         elif event == Events.PRINT_FAILED:
             self.event_handler._handle_print_failed(payload)
 
+        elif event == Events.Z_CHANGE:
+            self.event_handler._handle_z_change(payload)
+
         elif event == Events.METADATA_STATISTICS_UPDATED:
             self.event_handler._handle_metadata_statistics_updated(payload)
         
@@ -156,10 +274,191 @@ class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
         
         return flask.jsonify(response)
 
+    @octoprint.plugin.BlueprintPlugin.route("/history", methods=["GET"])
+    def history(self):
+        args = request.args
+        try:
+            after = json.loads(args["after"]) if args.get("after") else None
+            if after is not None and (not isinstance(after, list) or len(after) != 2):
+                raise ValueError("after must be a [value, print_id] pair")
+            response = self.database_manager._select_history(
+                self.config_manager._get_printer_id(),
+                limit=max(1, min(int(args.get("limit", 50)), 200)),
+                after=after,
+                sort_by=args.get("sort_by", "start_datetime"),
+                descending=args.get("order", "desc") != "asc",
+                state=args.get("state") or None,
+                date_from=self._parse_date_argument(args.get("date_from")),
+                date_to=self._parse_date_argument(args.get("date_to")),
+                file_name=args.get("file_name") or None,
+                cost_rates=self.config_manager._get_config().cost_rates(),
+            )
+        except ValueError as e:
+            response = {"error": True, "message": "Invalid history query: " + str(e)}
+        except Exception as e:
+            self._logger.error(f"Error selecting print history: {str(e)}")
+            response = {"error": True, "message": str(e)}
+
+        return flask.jsonify(response)
+
+    @octoprint.plugin.BlueprintPlugin.route("/stats", methods=["GET"])
+    def stats(self):
+        args = request.args
+        try:
+            response = self.database_manager._select_stats(
+                self.config_manager._get_printer_id(),
+                period=args.get("period", "day"),
+                date_from=self._parse_date_argument(args.get("date_from")),
+                date_to=self._parse_date_argument(args.get("date_to")),
+            )
+        except ValueError as e:
+            response = {"error": True, "message": "Invalid statistics query: " + str(e)}
+        except Exception as e:
+            self._logger.error(f"Error selecting printer statistics: {str(e)}")
+            response = {"error": True, "message": str(e)}
+
+        return flask.jsonify(response)
+
+    @octoprint.plugin.BlueprintPlugin.route("/analytics", methods=["GET"])
+    def analytics(self):
+        args = request.args
+        try:
+            metrics = (args.get("metric") or ",".join(DatabaseManager.ANALYTICS_METRICS)).split(",")
+            date_from = self._parse_date_argument(args.get("date_from"))
+            date_to = self._parse_date_argument(args.get("date_to"))
+            printer_id = self.config_manager._get_printer_id()
+            cost_rates = self.config_manager._get_config().cost_rates()
+
+            response = {"error": False, "analytics": {}}
+            for metric in metrics:
+                key = (printer_id, date_from, date_to, metric, cost_rates)
+                result = self.analytics_cache.get_or_load(key, lambda metric=metric: self.database_manager._select_analytics(
+                    printer_id, metric, date_from=date_from, date_to=date_to, cost_rates=cost_rates))
+                if result.get("error"):
+                    response = result
+                    break
+                response["analytics"][metric] = result["data"]
+        except ValueError as e:
+            response = {"error": True, "message": "Invalid analytics query: " + str(e)}
+        except Exception as e:
+            self._logger.error(f"Error selecting analytics: {str(e)}")
+            response = {"error": True, "message": str(e)}
+
+        return flask.jsonify(response)
+
+    @octoprint.plugin.BlueprintPlugin.route("/export", methods=["GET"])
+    def export(self):
+        args = request.args
+        try:
+            chunks, mimetype, file_name, close = self.history_exporter.open(
+                args.get("format", "csv"),
+                compress=args.get("gzip", "false").lower() in ("1", "true", "yes"),
+                state=args.get("state") or None,
+                date_from=self._parse_date_argument(args.get("date_from")),
+                date_to=self._parse_date_argument(args.get("date_to")),
+            )
+        except ValueError as e:
+            return flask.make_response(flask.jsonify({"error": True, "message": "Invalid export query: " + str(e)}), 400)
+        except Exception as e:
+            self._logger.error(f"Error exporting print history: {str(e)}")
+            return flask.make_response(flask.jsonify({"error": True, "message": str(e)}), 500)
+
+        headers = {"Content-Disposition": f'attachment; filename="{file_name}"'}
+        response = flask.Response(flask.stream_with_context(chunks), mimetype=mimetype, headers=headers)
+        # The generators never run (nor their cleanup) when the body is not iterated, e.g. for HEAD
+        response.call_on_close(close)
+        return response
+
+    def _parse_date_argument(self, value):
+        if not value:
+            return None
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+
+    @octoprint.plugin.BlueprintPlugin.route("/thumbnail/<thumbnail_hash>", methods=["GET"])
+    def thumbnail(self, thumbnail_hash):
+        if not THUMBNAIL_HASH_PATTERN.match(thumbnail_hash):
+            return flask.make_response(flask.jsonify({"error": True, "message": "Invalid thumbnail hash"}), 400)
+
+        # Thumbnails are content-addressed, so a matching ETag never needs a database round-trip
+        etag = f'"{thumbnail_hash}"'
+        cache_headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return flask.Response(status=304, headers=cache_headers)
+
+        response = self.database_manager._select_thumbnail(thumbnail_hash)
+        if response.get("error"):
+            return flask.make_response(flask.jsonify(response), 500)
+        if response.get("image") is None:
+            return flask.make_response(flask.jsonify(response), 404)
+
+        image = response["image"]
+        def generate(chunk_size=64 * 1024):
+            for offset in range(0, len(image), chunk_size):
+                yield image[offset:offset + chunk_size]
+
+        cache_headers["Content-Length"] = str(len(image))
+        return flask.Response(generate(), mimetype=response["content_type"], headers=cache_headers)
+
+    @octoprint.plugin.BlueprintPlugin.route("/importHistory", methods=["PUT"])
+    def import_history(self):
+        data = request.json or {}
+        try:
+            response = self.history_importer.start(data.get("sources"))
+        except Exception as e:
+            self._logger.error(f"Error starting history import: {str(e)}")
+            response = {"error": True, "message": str(e)}
+
+        return flask.jsonify(response)
+
+    @octoprint.plugin.BlueprintPlugin.route("/importStatus", methods=["GET"])
+    def import_status(self):
+        response = {"error": False, "status": self.history_importer.get_status()}
+        return flask.jsonify(response)
+
+    @octoprint.plugin.BlueprintPlugin.route("/eta", methods=["GET"])
+    def eta(self):
+        try:
+            response = {
+                "error": False,
+                "printing": self.event_handler._get_active_print(),
+                "models": self.eta_model.summary(self.config_manager._get_printer_id()),
+            }
+        except Exception as e:
+            self._logger.error(f"Error reading print time model: {str(e)}")
+            response = {"error": True, "message": str(e)}
+        return flask.jsonify(response)
+
+    @octoprint.plugin.BlueprintPlugin.route("/writerStatistics", methods=["GET"])
+    def writer_statistics(self):
+        response = {"error": False, "statistics": self.print_writer.get_statistics()}
+        return flask.jsonify(response)
+
+    @octoprint.plugin.BlueprintPlugin.route("/metrics", methods=["GET"])
+    def metrics_endpoint(self):
+        writer = self.print_writer.get_statistics()
+        pool = self.database_manager._get_pool_statistics()
+        analytics = self.analytics_cache.get_statistics()
+        values = {
+            "writer_queue_depth": ("gauge", "Print records waiting to be spooled.", writer["queue_depth"]),
+            "writer_spool_pending": ("gauge", "Spooled print records not yet in the database.", writer["spool_pending"]),
+            "writer_dead_letters": ("gauge", "Print records in the spool's dead-letter table.", writer["dead_letters"]),
+            "writer_written_total": ("counter", "Print records written to the database.", writer["written"]),
+            "writer_failures_total": ("counter", "Failed spool replays.", writer["failures"]),
+            "writer_dropped_total": ("counter", "Print records dropped by the writer.", writer["dropped"]),
+            "writer_dead_lettered_total": ("counter", "Print records moved to the dead-letter table.", writer["dead_lettered"]),
+            "db_pool_size": ("gauge", "Open pooled database connections.", pool.get("size")),
+            "db_pool_in_use": ("gauge", "Pooled database connections checked out.", pool.get("in_use")),
+            "db_pool_waits_total": ("counter", "Connection checkouts that had to wait.", pool.get("waits")),
+            "analytics_cache_hits_total": ("counter", "Analytics cache hits.", analytics["hits"]),
+            "analytics_cache_misses_total": ("counter", "Analytics cache misses.", analytics["misses"]),
+        }
+        return flask.Response(self.metrics.render(values), mimetype="text/plain; version=0.0.4")
+
     @octoprint.plugin.BlueprintPlugin.route("/deactivatePluginCheck", methods=["PUT"])
     def deactivatePluginCheck(self):
         response = {"error": False, "message": "Plugin check deactivated"}
         self._settings.set([SettingsKeys.PLUGIN_DEPENDENCY_CHECK], False)
+        self.config_manager._invalidate_config()
         return flask.jsonify(response)
     
     def is_blueprint_csrf_protected(self):
@@ -177,6 +476,7 @@ class ExternalPrintHistoryPlugin(octoprint.plugin.StartupPlugin,
                 "js/ExternalPrintHistory_ApiRest.js",
                 "js/ExternalPrintHistory_pluginCheckDialog.js",                
                 "js/ExternalPrintHistory_settings.js",
+                "js/ExternalPrintHistory_tab.js",
                 "js/ExternalPrintHistory.js",           
                 ],
             css = [
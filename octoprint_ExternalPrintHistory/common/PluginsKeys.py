@@ -3,8 +3,27 @@ from __future__ import absolute_import
 
 class PluginsKeys:
 
-    # Plugin parameters
-    PLUGIN_PREHEAT = { "key": "preheat", "minVersion": "0.4.0"}
-    PLUGIN_DISPLAY_LAYER_PROGRESS = { "key": "DisplayLayerProgress", "minVersion": "1.26.0"}
-    PLUGIN_ULTIMAKER_FORMAT_PACKAGE = { "key": "UltimakerFormatPackage", "minVersion": "1.0.0"}
-    PLUGIN_PRUSA_SLICER_THUMNAIL = { "key": "prusaslicerthumbnails", "minVersion": "1.0.0"}    
\ No newline at end of file
+    # Registry of the third-party plugins checked at startup, in display order.
+    # Adding a dependency means adding one entry here.
+    DEPENDENCIES = (
+        {
+            "key": "preheat",
+            "minVersion": "0.4.0",
+            "name": "PreHeat Button",
+            "url": "https://plugins.octoprint.org/plugins/preheat/"},
+        {
+            "key": "DisplayLayerProgress",
+            "minVersion": "1.26.0",
+            "name": "DisplayLayerProgress",
+            "url": "https://plugins.octoprint.org/plugins/DisplayLayerProgress/"},
+        {
+            "key": "UltimakerFormatPackage",
+            "minVersion": "1.0.0",
+            "name": "Cura Thumbnails",
+            "url": "https://plugins.octoprint.org/plugins/UltimakerFormatPackage/"},
+        {
+            "key": "prusaslicerthumbnails",
+            "minVersion": "1.0.0",
+            "name": "PrusaSlicer Thumbnails",
+            "url": "https://plugins.octoprint.org/plugins/prusaslicerthumbnails/"},
+    )
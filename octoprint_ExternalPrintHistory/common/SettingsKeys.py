@@ -10,13 +10,27 @@ class SettingsKeys:
     PRINTER_ID = "printer_id"
     
     # Database parameters
+    DB_BACKEND = "db_backend"
+    DB_SQLITE_PATH = "db_sqlite_path"
     DB_USER = "db_user"
     DB_PASSWORD = "db_password"
     DB_HOST = "db_host"
     DB_PORT = "db_port"
     DB_DATABASE = "db_database"
 
+    # Edge sync to a central database
+    EDGE_SYNC = "edge_sync"
+    SYNC_INTERVAL = "sync_interval"
+
+    # Instrumentation
+    SLOW_QUERY_THRESHOLD = "slow_query_threshold"
+
     # Currency and electricity cost
     CURRENCY = "currency"
     ELECTRICITY_COST = "electricity_cost"
 
+    # Filament cost and properties, to cost prints with only a length
+    FILAMENT_COST = "filament_cost"
+    FILAMENT_DIAMETER = "filament_diameter"
+    FILAMENT_DENSITY = "filament_density"
+
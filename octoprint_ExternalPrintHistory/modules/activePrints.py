@@ -0,0 +1,103 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import json
+import os
+import threading
+import time
+
+class ActivePrints():
+    """
+    Prints in progress, keyed by job: origin, path and start time. Each entry
+    carries the UUID its start row was written with, so the end event updates
+    that row directly.
+
+    The table is saved to a small checkpoint file in the plugin data folder on
+    every change, so a print started before OctoPrint restarted is still
+    matched with its end event. While a print runs, the last time it was seen
+    alive is checkpointed at most every ``CHECKPOINT_INTERVAL`` seconds; it
+    is the end time of a print interrupted without an end event.
+    """
+    CHECKPOINT_FILE_NAME = "active_prints.json"
+    CHECKPOINT_INTERVAL = 60
+
+    def __init__(self, plugin, _logger):
+        self._logger = _logger
+        self.plugin = plugin
+        self._prints = None  # job key -> entry, loaded on first use
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    def job_key(self, origin, path, start_time):
+        return f"{origin}:{path}:{int(start_time)}"
+
+    def start(self, entry):
+        """
+        Register a started print and return the entries still open. A printer
+        runs one job at a time, so those were interrupted without an end event
+        and are removed.
+        """
+        with self._lock:
+            prints = self._load()
+            interrupted = list(prints.values())
+            prints.clear()
+            prints[self.job_key(entry["origin"], entry["path"], entry["start_time"])] = entry
+            self._save()
+        return interrupted
+
+    def finish(self, origin, path):
+        """
+        Remove and return the most recent print of the job, None when its start
+        was never seen.
+        """
+        with self._lock:
+            prints = self._load()
+            matches = [key for key, entry in prints.items() if entry["origin"] == origin and entry["path"] == path]
+            if not matches:
+                return None
+            entry = prints.pop(max(matches, key=lambda key: prints[key]["start_time"]))
+            self._save()
+        return entry
+
+    def touch(self):
+        """
+        Note that the running print is still alive.
+        """
+        now = time.time()
+        with self._lock:
+            prints = self._load()
+            if not prints:
+                return
+            for entry in prints.values():
+                entry["last_seen"] = now
+            if now - self._last_save >= self.CHECKPOINT_INTERVAL:
+                self._save()
+
+    def current(self):
+        with self._lock:
+            prints = self._load()
+            if not prints:
+                return None
+            return max(prints.values(), key=lambda entry: entry["start_time"])
+
+    def _checkpoint_path(self):
+        return os.path.join(self.plugin.get_plugin_data_folder(), self.CHECKPOINT_FILE_NAME)
+
+    def _load(self):
+        if self._prints is None:
+            try:
+                with open(self._checkpoint_path(), encoding="utf-8") as checkpoint_file:
+                    self._prints = json.load(checkpoint_file)
+            except (OSError, ValueError):
+                self._prints = {}
+        return self._prints
+
+    def _save(self):
+        self._last_save = time.time()
+        path = self._checkpoint_path()
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as checkpoint_file:
+                json.dump(self._prints, checkpoint_file)
+            os.replace(path + ".tmp", path)
+        except (OSError, TypeError, ValueError) as e:
+            self._logger.error(f"Error saving active prints: {e}")
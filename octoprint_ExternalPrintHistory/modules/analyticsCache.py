@@ -0,0 +1,60 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import threading
+import time
+from collections import OrderedDict
+
+class AnalyticsCache():
+    """
+    In-process TTL + LRU cache for aggregate query results, keyed by
+    (printer, range, metric). Cleared whenever a new print is recorded.
+    """
+    def __init__(self, _logger, max_entries=128, ttl=300.0):
+        self._logger = _logger
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._cache = OrderedDict()  # key -> (expires_at, value)
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.statistics = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for ``key`` or call ``loader`` and cache its
+        result unless it reports an error.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(key)
+                self.statistics["hits"] += 1
+                return entry[1]
+            self.statistics["misses"] += 1
+            generation = self._generation
+
+        value = loader()
+        if value.get("error"):
+            return value
+
+        with self._lock:
+            # A print recorded while the query ran makes its result stale already
+            if generation == self._generation:
+                self._cache[key] = (time.monotonic() + self.ttl, value)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+            self.statistics["invalidations"] += 1
+
+    def get_statistics(self):
+        with self._lock:
+            statistics = dict(self.statistics)
+            statistics["entries"] = len(self._cache)
+        return statistics
@@ -3,13 +3,66 @@ from __future__ import absolute_import
 
 import base64
 import binascii
+import hashlib
 import os
-from cryptography.fernet import Fernet
 from ..common.SettingsKeys import SettingsKeys
+from .costEngine import CostRates
+from .metrics import timed
+
+class ConfigSnapshot():
+    """
+    Immutable view of the plugin settings with the database password already
+    decrypted. Built once and reused until the settings change.
+    """
+    __slots__ = ("printer_id", "currency", "electricity_cost", "filament_cost", "filament_diameter", "filament_density", "db_backend", "db_host", "db_user", "db_password",
+                 "db_database", "db_port", "db_sqlite_path", "edge_sync", "sync_interval", "slow_query_threshold",
+                 "plugin_dependency_check")
+
+    CONNECTION_KEYS = (SettingsKeys.DB_BACKEND, SettingsKeys.DB_HOST, SettingsKeys.DB_USER, SettingsKeys.DB_PASSWORD,
+                       SettingsKeys.DB_DATABASE, SettingsKeys.DB_PORT, SettingsKeys.DB_SQLITE_PATH)
+
+    def __init__(self, config):
+        for key in self.__slots__:
+            object.__setattr__(self, key, config.get(key))
+
+    def __setattr__(self, key, value):
+        raise AttributeError("ConfigSnapshot is immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError("ConfigSnapshot is immutable")
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def replace(self, changes):
+        config = self.to_dict()
+        config.update(changes)
+        return ConfigSnapshot(config)
+
+    def connection_fingerprint(self):
+        """
+        Digest identifying the connection target and credentials.
+        """
+        values = "\x00".join(str(getattr(self, key)) for key in self.CONNECTION_KEYS)
+        return hashlib.sha256(values.encode()).hexdigest()
+
+    def cost_rates(self):
+        return CostRates(self.electricity_cost, self.filament_cost, self.filament_diameter, self.filament_density)
+
+    def connection_settings(self):
+        """
+        Connection arguments for the selected storage backend.
+        """
+        if self.db_backend == "sqlite":
+            return {'path': self.db_sqlite_path or None}
+        return {
+            'host': self.db_host,
+            'user': self.db_user,
+            'password': self.db_password,
+            'database': self.db_database,
+            'port': int(self.db_port)
+        }
 
-from Crypto.Cipher import AES
-from Crypto.Protocol.KDF import scrypt
-from Crypto.Random import get_random_bytes
 
 class ConfigurationManager():
     def __init__(self, plugin, _logger):
@@ -17,17 +70,53 @@ class ConfigurationManager():
         self.plugin = plugin
         self.key_file_path = None
         self.salt_file_path = None       
+        self._config = None
         
+    def _get_config(self):
+        """
+        Return the cached settings snapshot, reading and decrypting the settings
+        only when there is none yet.
+        """
+        config = self._config
+        if config is None:
+            config = self._config = ConfigSnapshot(self._read_config())
+        return config
+
+    def _set_config(self, config):
+        """
+        Replace the cached snapshot with the values that were just saved. Returns
+        True when any of the connection settings changed.
+        """
+        previous = self._config
+        self._config = ConfigSnapshot(config)
+        if previous is None:
+            return True
+        return any(getattr(previous, key) != getattr(self._config, key) for key in ConfigSnapshot.CONNECTION_KEYS)
+
+    def _invalidate_config(self):
+        self._config = None
+
     def _load_config(self):
+        return self._get_config().to_dict()
+
+    def _read_config(self):
         config = {}
         config[SettingsKeys.PRINTER_ID] = self.plugin._settings.get([SettingsKeys.PRINTER_ID])
         config[SettingsKeys.CURRENCY] = self.plugin._settings.get([SettingsKeys.CURRENCY])
         config[SettingsKeys.ELECTRICITY_COST] = self.plugin._settings.get([SettingsKeys.ELECTRICITY_COST])
+        config[SettingsKeys.FILAMENT_COST] = self.plugin._settings.get_float([SettingsKeys.FILAMENT_COST])
+        config[SettingsKeys.FILAMENT_DIAMETER] = self.plugin._settings.get_float([SettingsKeys.FILAMENT_DIAMETER])
+        config[SettingsKeys.FILAMENT_DENSITY] = self.plugin._settings.get_float([SettingsKeys.FILAMENT_DENSITY])
+        config[SettingsKeys.DB_BACKEND] = self.plugin._settings.get([SettingsKeys.DB_BACKEND])
         config[SettingsKeys.DB_HOST] = self.plugin._settings.get([SettingsKeys.DB_HOST])
         config[SettingsKeys.DB_USER] = self.plugin._settings.get([SettingsKeys.DB_USER])
         config[SettingsKeys.DB_PASSWORD] = self.plugin._settings.get([SettingsKeys.DB_PASSWORD])
         config[SettingsKeys.DB_DATABASE] = self.plugin._settings.get([SettingsKeys.DB_DATABASE])
         config[SettingsKeys.DB_PORT] = self.plugin._settings.get([SettingsKeys.DB_PORT])
+        config[SettingsKeys.DB_SQLITE_PATH] = self.plugin._settings.get([SettingsKeys.DB_SQLITE_PATH])
+        config[SettingsKeys.EDGE_SYNC] = self.plugin._settings.get_boolean([SettingsKeys.EDGE_SYNC])
+        config[SettingsKeys.SYNC_INTERVAL] = self.plugin._settings.get_int([SettingsKeys.SYNC_INTERVAL])
+        config[SettingsKeys.SLOW_QUERY_THRESHOLD] = self.plugin._settings.get_int([SettingsKeys.SLOW_QUERY_THRESHOLD])
         config[SettingsKeys.PLUGIN_DEPENDENCY_CHECK] = self.plugin._settings.get_boolean([SettingsKeys.PLUGIN_DEPENDENCY_CHECK])
         
         if config[SettingsKeys.DB_PASSWORD] != '':
@@ -36,12 +125,16 @@ class ConfigurationManager():
         return config
 
     def _get_plugin_dependency_check(self):
-        return self.plugin._settings.get_boolean([SettingsKeys.PLUGIN_DEPENDENCY_CHECK])
+        return self._get_config().plugin_dependency_check
 
     def _get_printer_id(self):
-        return self.plugin._settings.get([SettingsKeys.PRINTER_ID]) or 0
+        return self._get_config().printer_id or 0
             
-    def _update_dictionaries(self, data, config_data={}, printer_data={}):        
+    def _update_dictionaries(self, data, config_data=None, printer_data=None):
+        # Fresh dicts per call: shared defaults would keep the last save's keys
+        config_data = {} if config_data is None else config_data
+        printer_data = {} if printer_data is None else printer_data
+
         keys_printer_to_check = [
         "printer_name",
         "printer_model",
@@ -53,13 +146,21 @@ class ConfigurationManager():
         ]
         
         keys_config_to_check = [
+        "db_backend",
+        "db_sqlite_path",
         "db_user",
         "db_password",
         "db_port",
         "db_host",
         "db_database",
+        "edge_sync",
+        "sync_interval",
+        "slow_query_threshold",
         "currency",
         "electricity_cost",
+        "filament_cost",
+        "filament_diameter",
+        "filament_density",
         "plugin_dependency_check"
         ]
         
@@ -77,11 +178,14 @@ class ConfigurationManager():
     def _showPopUp(self, popupType, title, message, hide):
             self.plugin._plugin_manager.send_plugin_message(self.plugin._identifier, dict(action="showPopUp", popupType=popupType, title=title, message=message, hide=hide))
             
+    @timed("crypto_seconds", operation="load_key")
     def _initialize_key_and_salt(self):
         self.key_file_path = os.path.join(self.plugin.get_plugin_data_folder(), 'key.key')
         self.salt_file_path = os.path.join(self.plugin.get_plugin_data_folder(), 'salt.key')
     
         if not (os.path.exists(self.key_file_path) and os.path.exists(self.salt_file_path)):
+            from Crypto.Protocol.KDF import scrypt
+            from Crypto.Random import get_random_bytes
             self.salt = get_random_bytes(16)
             self.key = scrypt(b'some_password', self.salt, 32, N=2**14, r=8, p=1)
             try:
@@ -101,12 +205,16 @@ class ConfigurationManager():
             except Exception as e:
                 self._logger.error(f"Error loading key and salt: {e}")
                 
+    @timed("crypto_seconds", operation="encrypt")
     def _encrypt(self, password):
+        from Crypto.Cipher import AES
         cipher = AES.new(self.key, AES.MODE_EAX)
         ciphertext, tag = cipher.encrypt_and_digest(password.encode())
         return base64.b64encode(cipher.nonce + tag + ciphertext).decode()
     
+    @timed("crypto_seconds", operation="decrypt")
     def _decrypt(self, encrypted_password):
+        from Crypto.Cipher import AES
         try:
             data = base64.b64decode(encrypted_password)
             nonce, tag, ciphertext = data[:16], data[16:32], data[32:]
@@ -0,0 +1,137 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import math
+from collections import namedtuple
+
+# Rates from the plugin settings: electricity in currency/kWh, filament in
+# currency/kg, diameter in mm and density in g/cm³
+CostRates = namedtuple("CostRates", ["electricity_rate", "filament_cost", "filament_diameter", "filament_density"])
+
+numpy = None
+
+def _load_numpy():
+    """
+    Import NumPy on first use. Returns None when it is not installed, the
+    pure-Python path is used then.
+    """
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            module = False
+        numpy = module
+    return numpy or None
+
+
+class CostEngine():
+    """
+    Per-print material, electricity, depreciation and maintenance costs for a
+    batch of prints, computed in one pass over column arrays: vectorized with
+    NumPy when it is available, with a pure-Python loop otherwise.
+
+    Prints are given as columns (``printer_id``, ``duration`` in seconds,
+    ``length`` of filament in mm and ``weight`` in g, any of them None), the
+    printers as ``{printer_id: (power_consumption, purchase_price,
+    estimated_lifespan, maintenance_costs)}`` with power in kW, lifespan in
+    hours and maintenance in currency per hour.
+    """
+    COLUMNS = ["material_cost", "energy_kwh", "electricity_cost", "depreciation", "maintenance_cost", "total_cost"]
+
+    def __init__(self, _logger, use_numpy=True):
+        self._logger = _logger
+        self.use_numpy = use_numpy
+
+    def compute(self, columns, printers, rates):
+        """
+        Returns ``{cost column: list of floats}``, one value per print.
+        """
+        np = _load_numpy() if self.use_numpy else None
+        if np is None:
+            return self._compute_python(columns, printers, rates)
+        return {column: values.tolist() for column, values in self._compute_numpy(np, columns, printers, rates).items()}
+
+    def compute_totals(self, columns, printers, rates):
+        """
+        Returns ``{cost column: sum over the prints}``.
+        """
+        np = _load_numpy() if self.use_numpy else None
+        if np is None:
+            costs = self._compute_python(columns, printers, rates)
+            return {column: math.fsum(values) for column, values in costs.items()}
+        return {column: float(values.sum()) for column, values in self._compute_numpy(np, columns, printers, rates).items()}
+
+    def _printer_rates(self, printer):
+        power_consumption, purchase_price, estimated_lifespan, maintenance_costs = printer or (None, None, None, None)
+        lifespan = float(estimated_lifespan or 0)
+        return (float(power_consumption or 0),
+                float(purchase_price or 0) / lifespan if lifespan > 0 else 0.0,
+                float(maintenance_costs or 0))
+
+    def _grams_per_mm(self, rates):
+        # Filament cross-section in mm² times density, mm³ -> cm³
+        radius = float(rates.filament_diameter or 0) / 2
+        return math.pi * radius * radius * float(rates.filament_density or 0) / 1000.0
+
+    def _compute_python(self, columns, printers, rates):
+        per_printer = {printer_id: self._printer_rates(printer) for printer_id, printer in printers.items()}
+        no_printer = (0.0, 0.0, 0.0)
+        grams_per_mm = self._grams_per_mm(rates)
+        filament_cost = float(rates.filament_cost or 0) / 1000.0
+        electricity_rate = float(rates.electricity_rate or 0)
+
+        costs = {column: [] for column in self.COLUMNS}
+        material_costs, energies, electricity_costs = costs["material_cost"], costs["energy_kwh"], costs["electricity_cost"]
+        depreciations, maintenance_costs, total_costs = costs["depreciation"], costs["maintenance_cost"], costs["total_cost"]
+        for printer_id, duration, length, weight in zip(columns["printer_id"], columns["duration"], columns["length"], columns["weight"]):
+            power, depreciation_rate, maintenance_rate = per_printer.get(printer_id, no_printer)
+            hours = float(duration or 0) / 3600.0
+            grams = float(weight) if weight else float(length or 0) * grams_per_mm
+            material_cost = grams * filament_cost
+            energy_kwh = power * hours
+            electricity_cost = energy_kwh * electricity_rate
+            depreciation = depreciation_rate * hours
+            maintenance_cost = maintenance_rate * hours
+
+            material_costs.append(material_cost)
+            energies.append(energy_kwh)
+            electricity_costs.append(electricity_cost)
+            depreciations.append(depreciation)
+            maintenance_costs.append(maintenance_cost)
+            total_costs.append(material_cost + electricity_cost + depreciation + maintenance_cost)
+        return costs
+
+    def _compute_numpy(self, np, columns, printers, rates):
+        def array(values):
+            # None becomes NaN, then 0
+            return np.nan_to_num(np.array(values, dtype=float), copy=False)
+
+        hours = array(columns["duration"]) / 3600.0
+        weight = array(columns["weight"])
+        length = array(columns["length"])
+        printer_ids = array(columns["printer_id"])
+
+        # A history holds a handful of printers: one masked assignment per printer
+        power = np.zeros_like(hours)
+        depreciation_rate = np.zeros_like(hours)
+        maintenance_rate = np.zeros_like(hours)
+        for printer_id, printer in printers.items():
+            mask = printer_ids == printer_id
+            power[mask], depreciation_rate[mask], maintenance_rate[mask] = self._printer_rates(printer)
+
+        grams = np.where(weight > 0, weight, length * self._grams_per_mm(rates))
+        material_cost = grams * (float(rates.filament_cost or 0) / 1000.0)
+        energy_kwh = power * hours
+        electricity_cost = energy_kwh * float(rates.electricity_rate or 0)
+        depreciation = depreciation_rate * hours
+        maintenance_cost = maintenance_rate * hours
+
+        return {
+            "material_cost": material_cost,
+            "energy_kwh": energy_kwh,
+            "electricity_cost": electricity_cost,
+            "depreciation": depreciation,
+            "maintenance_cost": maintenance_cost,
+            "total_cost": material_cost + electricity_cost + depreciation + maintenance_cost,
+        }
@@ -1,32 +1,229 @@
 # coding=utf-8
 from __future__ import absolute_import
 
-import pymysql
-from pymysql import MySQLError
+import base64
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from .configurationManager import ConfigSnapshot
+from .metrics import timed
+from . import storage
+from .storage import SchemaMigrator, StorageError, create_backend
+
+class ConnectionPool():
+    """
+    Bounded, thread-safe pool of long-lived connections to a storage backend.
+
+    Connections are pinged on checkout when they have been idle for longer than
+    ``ping_interval``, closed when idle for longer than ``max_idle_time`` and
+    recycled once older than ``max_lifetime``.
+    """
+    def __init__(self, backend, _logger, max_size=4, max_idle_time=300,
+                 max_lifetime=3600, ping_interval=1.0, checkout_timeout=10):
+        self._logger = _logger
+        self.backend = backend
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.checkout_timeout = checkout_timeout
+        self._condition = threading.Condition()
+        self._idle = deque()  # (connection, created_at, last_used)
+        self._created_at = {}  # id(connection) -> created_at, for checked out connections
+        self._size = 0
+        self._closed = False
+        self.statistics = {
+            "checkouts": 0,
+            "waits": 0,
+            "creations": 0,
+            "ping_failures": 0,
+            "idle_evictions": 0,
+            "lifetime_recycles": 0,
+        }
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        entry = None
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise StorageError("Connection pool is closed.")
+                self._evict_idle_locked(time.monotonic())
+                if self._idle:
+                    # LIFO: the most recently used connection is the most likely to be alive
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise StorageError("Timed out waiting for a database connection from the pool.")
+                self.statistics["waits"] += 1
+                self._condition.wait(remaining)
+            self.statistics["checkouts"] += 1
+
+        try:
+            connection, created_at = self._validate(entry)
+            if connection is None:
+                connection = self.backend.connect()
+                created_at = time.monotonic()
+                with self._condition:
+                    self.statistics["creations"] += 1
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._created_at[id(connection)] = created_at
+        return connection
+
+    def release(self, connection, discard=False):
+        if connection is None:
+            return
+        with self._condition:
+            created_at = self._created_at.pop(id(connection), None)
+            keep = (not discard and not self._closed and created_at is not None and self.backend.is_open(connection))
+            if keep:
+                self._idle.append((connection, created_at, time.monotonic()))
+            elif created_at is not None:
+                self._size -= 1
+            # A connection this pool never handed out is closed without touching its size
+            self._condition.notify()
+        if keep:
+            self.backend.on_release(connection)
+        else:
+            self._close_quietly(connection)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for connection, _, _ in idle:
+            self._close_quietly(connection)
+
+    def get_statistics(self):
+        with self._condition:
+            statistics = dict(self.statistics)
+            statistics.update({"size": self._size, "idle": len(self._idle), "in_use": self._size - len(self._idle), "max_size": self.max_size})
+        return statistics
+
+    def _validate(self, entry):
+        if entry is None:
+            return None, None
+
+        connection, created_at, last_used = entry
+        now = time.monotonic()
+        if now - created_at > self.max_lifetime:
+            self._close_quietly(connection)
+            with self._condition:
+                self.statistics["lifetime_recycles"] += 1
+            return None, None
+
+        if now - last_used > self.ping_interval:
+            try:
+                self.backend.ping(connection)
+            except Exception:
+                self._close_quietly(connection)
+                with self._condition:
+                    self.statistics["ping_failures"] += 1
+                return None, None
+
+        return connection, created_at
+
+    def _evict_idle_locked(self, now):
+        # Oldest connections sit at the left end of the deque
+        while self._idle and now - self._idle[0][2] > self.max_idle_time:
+            connection, _, _ = self._idle.popleft()
+            self._size -= 1
+            self.statistics["idle_evictions"] += 1
+            self._close_quietly(connection)
+
+    def _close_quietly(self, connection):
+        try:
+            connection.close()
+        except Exception as e:
+            self._logger.debug("Error closing pooled database connection: " + str(e))
+
+
+class RowStream():
+    """
+    Iterator over the row batches of a streaming query, holding its pooled
+    connection until the rows are read to the end or ``close()`` is called.
+    Unlike a generator's ``finally``, ``close()`` also releases the
+    connection when the stream is closed before its first batch.
+    """
+    def __init__(self, database_manager, connection, cursor, batch_size, transform=None):
+        self._database_manager = database_manager
+        self._connection = connection
+        self._cursor = cursor
+        self.batch_size = batch_size
+        self._transform = transform
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._connection is None:
+            raise StopIteration
+        try:
+            rows = self._cursor.fetchmany(self.batch_size)
+        except Exception:
+            self.close()
+            raise
+        if not rows:
+            self._release(finished=True)
+            raise StopIteration
+        return self._transform(rows) if self._transform else rows
+
+    def close(self):
+        # Abandoned mid-stream (e.g. client disconnected): unread rows make the connection unusable
+        self._release(finished=False)
+
+    def _release(self, finished):
+        with self._lock:
+            connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        if finished:
+            try:
+                self._cursor.close()
+                connection.commit()
+            except Exception:
+                finished = False
+        self._database_manager.release_connection(connection, discard=not finished)
+
 
 class DatabaseManager():
     def __init__(self, plugin, _logger):
         self._logger = _logger
         self.plugin = plugin
-        self.connection_settings = None
-        self.connection = None
+        self.backend = None
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        self._connection_pools = {}  # id(connection) -> pool it was checked out from
+        self._known_thumbnails = set()
+        self._validated_fingerprint = None
 
+    @timed("db_query_seconds", operation="test_connection")
     def _test_connection(self, config):
         try:
-            settings = {
-                'host': config.get('db_host'),
-                'user': config.get('db_user'),
-                'password': config.get('db_password'),
-                'database': config.get('db_database'),
-                'port': int(config.get('db_port'))
-            }
-            with pymysql.connect(**settings) as connection:
-                #self._logger.info("Database connection test successful.")
-                return {"error": False, "message": "Connection successful"}
+            self._create_backend(ConfigSnapshot(config)).test()
+            #self._logger.info("Database connection test successful.")
+            return {"error": False, "message": "Connection successful"}
         except KeyError as e:
             self._logger.error("Missing configuration key: " + str(e))
-            raise MySQLError("Error setting connection settings: Missing configuration key") from e
-        except MySQLError as e:
+            raise StorageError("Error setting connection settings: Missing configuration key") from e
+        except storage.DatabaseError as e:
             self._logger.error("Error testing DB connection: " + str(e))
             return {"error": True, "message": str(e)}
         except Exception as e:
@@ -34,157 +231,215 @@ class DatabaseManager():
             return {"error": True, "message": "An unexpected error occurred: " + str(e)}
         
     def _set_and_test_connection(self, config):
+        """
+        Point the pool at the connection settings of a ``ConfigSnapshot`` and
+        check that a connection can be borrowed. Settings that were already
+        validated are not checked again.
+        """
+        connection = None
         try:
-            self.connection_settings = {
-                'host': config.get('db_host'),
-                'user': config.get('db_user'),
-                'password': config.get('db_password'),
-                'database': config.get('db_database'),
-                'port': int(config.get('db_port'))
-            }
-            with pymysql.connect(**self.connection_settings) as connection:
-                #self._logger.info("Database connection test successful.")
+            fingerprint = config.connection_fingerprint()
+            if fingerprint == self._validated_fingerprint and self.pool is not None:
                 return {"error": False, "message": "Connection successful"}
-        except KeyError as e:
-            self._logger.error("Missing configuration key: " + str(e))
-            raise MySQLError("Error setting connection settings: Missing configuration key") from e
-        except MySQLError as e:
+
+            self._validated_fingerprint = None
+            self._configure_pool(self._create_backend(config))
+            connection = self.get_connection()
+            #self._logger.info("Database connection test successful.")
+            self._validated_fingerprint = fingerprint
+            self.plugin.print_writer.wake()
+            return {"error": False, "message": "Connection successful"}
+        except storage.DatabaseError as e:
             self._logger.error("Error testing DB connection: " + str(e))
             return {"error": True, "message": str(e)}
         except Exception as e:
             self._logger.error("Unexpected error during DB connection test: " + str(e))
             return {"error": True, "message": "An unexpected error occurred: " + str(e)}
+        finally:
+            self.release_connection(connection)
+
+    def _create_backend(self, config):
+        return create_backend(config.db_backend, config.connection_settings(),
+                              self.plugin.get_plugin_data_folder(), self._logger)
+
+    def _configure_pool(self, backend):
+        """
+        Replace the connection pool when the backend points at another database,
+        keeping the warm connections otherwise. The schema of a new database is
+        brought up to date before it is used.
+        """
+        with self._pool_lock:
+            if self.pool is not None and self.backend.identity() == backend.identity():
+                return
+            old_pool = self.pool
+            self.backend = backend
+            self.pool = ConnectionPool(backend, self._logger)
+            self._known_thumbnails = set()
+        if old_pool is not None:
+            old_pool.close()
+        self._migrate_schema()
+
+    def _migrate_schema(self):
+        migrator = SchemaMigrator(self.backend, self._logger, self.plugin.get_plugin_data_folder())
+        if migrator.is_current():
+            return
+
+        connection = None
+        try:
+            connection = self.get_connection()
+            applied = migrator.migrate(connection)
+            if applied:
+                self._logger.info(f"Database schema migrated to version {applied[-1]}")
+        except storage.DatabaseError as e:
+            self._rollback(connection)
+            self._logger.error("Error migrating database schema: " + str(e))
+        finally:
+            self.release_connection(connection)
+
+    def _close_pool(self):
+        with self._pool_lock:
+            pool = self.pool
+            self.pool = None
+        if pool is not None:
+            pool.close()
+
+    def _get_pool_statistics(self):
+        pool = self.pool
+        if pool is None:
+            return {}
+        return pool.get_statistics()
     
+    @timed("db_connection_acquire_seconds")
     def get_connection(self):
-            if not self.connection_settings:
+            pool = self.pool
+            if self.backend is None or pool is None:
                 self._logger.error("Database configuration is not set.")
-                raise MySQLError("Database configuration is not set.")
-            
-            if self.connection is None or not self.connection.open:
-                try:
-                    self.connection = pymysql.connect(**self.connection_settings)
-                    #self._logger.info("Database connection established.")
-                except MySQLError as e:
-                    self._logger.error("Error connecting to MySQL database: " + str(e))
-                    raise
-                except Exception as e:
-                    self._logger.error("Unexpected error connecting to MySQL database: " + str(e))
-                    raise
+                raise StorageError("Database configuration is not set.")
             
-            return self.connection
+            try:
+                connection = pool.acquire()
+                with self._pool_lock:
+                    self._connection_pools[id(connection)] = pool
+                return connection
+            except storage.DatabaseError as e:
+                self._logger.error("Error connecting to database: " + str(e))
+                raise
+            except Exception as e:
+                self._logger.error("Unexpected error connecting to database: " + str(e))
+                raise
 
-    def close_connection(self, result):
+    def release_connection(self, connection, discard=False):
         """
-        Close the database connection and update the result with any errors.
+        Return a borrowed connection to the pool it came from. A connection
+        whose pool has been replaced since (e.g. by a settings save) is closed.
         """
-        if self.connection:
+        if connection is None:
+            return
+        with self._pool_lock:
+            pool = self._connection_pools.pop(id(connection), None)
+            current = pool is not None and pool is self.pool
+        if pool is None:
             try:
-                self.connection.close()
-                #self._logger.info("Database connection closed.")
-            except MySQLError as e:
-                self._logger.error("Error closing database connection: " + str(e))
-                result.update({"error": True, "message": "Error closing database connection: " + str(e)})
-            except Exception as e:
-                self._logger.error("Unexpected error closing database connection: " + str(e))
-                result.update({"error": True, "message": "Unexpected error closing database connection: " + str(e)})
-            finally:
-                self.connection = None
+                connection.close()
+            except Exception:
+                pass
         else:
-            self._logger.warning("Attempted to close a connection that was not open.")
+            pool.release(connection, discard or not current)
+
+    def close_connection(self, result, connection):
+        """
+        Return the connection to the pool and update the result with any errors.
+        """
+        if connection:
+            try:
+                self.release_connection(connection)
+            except storage.DatabaseError as e:
+                self._logger.error("Error releasing database connection: " + str(e))
+                result.update({"error": True, "message": "Error releasing database connection: " + str(e)})
+            except Exception as e:
+                self._logger.error("Unexpected error releasing database connection: " + str(e))
+                result.update({"error": True, "message": "Unexpected error releasing database connection: " + str(e)})
         
         return result
 
+    def _rollback(self, connection):
+        if connection:
+            try:
+                connection.rollback()
+            except Exception as e:
+                self._logger.error("Error rolling back transaction: " + str(e))
+
+    PRINTER_FIELDS = ["printer_brand", "printer_model", "printer_name", "printer_power_consumption",
+                      "printer_purchase_price", "printer_estimated_lifespan", "printer_maintenance_costs"]
+
+    @timed("db_query_seconds", operation="update_insert_printer_config")
     def _update_insert_printer_config(self, printer_data, printer_id):
         result = {"error": False, "printer_id": printer_id, "insert": False, "update": False}
+        connection = None
 
         try:
             connection = self.get_connection()
             if connection:
                 with connection.cursor() as cursor:
-                    if printer_id:
-                        query = """
-                            SELECT printer_id FROM Printer WHERE printer_id = %s
-                        """
-                        cursor.execute(query, (printer_id,))
-                        if cursor.fetchone():
-                            update_fields = []
-                            params = []
-
-                            for field in ["printer_brand", "printer_model", "printer_name", "printer_power_consumption", 
-                                        "printer_purchase_price", "printer_estimated_lifespan", "printer_maintenance_costs"]:
-                                if field in printer_data:
-                                    db_field = field.replace("printer_", "")
-                                    update_fields.append(f"{db_field} = %s")
-                                    params.append(printer_data[field])
-
-                            if update_fields:
-                                update_query = f"""
-                                    UPDATE Printer
-                                    SET {', '.join(update_fields)}
-                                    WHERE printer_id = %s
-                                """
-                                params.append(printer_id)
-                                cursor.execute(update_query, params)
-                                result.update({"update": True})
-                        else:
-                            result = self._insert_printer(cursor, printer_data)
-                    else:
-                        result = self._insert_printer(cursor, printer_data)
-                    
+                    result = self._upsert_printer(cursor, printer_data, printer_id)
                     connection.commit()
             else:
                 result.update({"message": "The connection to the database is not configured"})
                 self._logger.error("The connection to the database is not configured")
                         
-        except MySQLError as e:
-            connection.rollback()
+        except storage.DatabaseError as e:
+            self._rollback(connection)
             result.update({"error": True, "message": str(e)})
             self._logger.error("Error updating/inserting printer configuration: " + str(e))
         except Exception as e:
-            connection.rollback()
+            self._rollback(connection)
             result.update({"error": True, "message": "An unexpected error occurred: " + str(e)})
             self._logger.error("Unexpected error updating/inserting printer configuration: " + str(e))
         finally:
-            result = self.close_connection(result)
+            result = self.close_connection(result, connection)
         
         return result
 
-    def _insert_printer(self, cursor, printer_data):
+    def _upsert_printer(self, cursor, printer_data, printer_id):
+        """
+        Insert or update the printer in a single round-trip with
+        INSERT ... ON DUPLICATE KEY UPDATE.
+        """
         try:
             fields = []
-            values = []
             params = []
 
-            for field in ["printer_brand", "printer_model", "printer_name", "printer_power_consumption", 
-                        "printer_purchase_price", "printer_estimated_lifespan", "printer_maintenance_costs"]:
+            for field in self.PRINTER_FIELDS:
                 if field in printer_data:
                     fields.append(field.replace("printer_", ""))
-                    values.append("%s")
                     params.append(printer_data[field])
 
-            if fields:
-                query = f"""
-                    INSERT INTO Printer ({', '.join(fields)})
-                    VALUES ({', '.join(values)})
-                """
-                cursor.execute(query, params)
-                cursor.execute("SELECT LAST_INSERT_ID()")
-                result = cursor.fetchone()
-                printer_id = result[0]
-                #self._logger.info(f"Inserted new Printer record with ID {printer_id}")
-                return {"error": False, "printer_id": printer_id, "insert": True, "update": False}
-            else:
+            if not fields:
                 raise ValueError("No data provided to insert printer record.")
-        except MySQLError as e:
-            self._logger.error("Error inserting printer record: " + str(e))
+
+            updates = dict.fromkeys(fields, "replace")
+            if printer_id:
+                fields.insert(0, "printer_id")
+                params.insert(0, printer_id)
+
+            query = self.backend.upsert_sql("Printer", fields, ["printer_id"], updates)
+            cursor.execute(query, params)
+
+            if self.backend.was_inserted(cursor, bool(printer_id)):
+                #self._logger.info(f"Inserted new Printer record with ID {cursor.lastrowid}")
+                return {"error": False, "printer_id": cursor.lastrowid, "insert": True, "update": False}
+            return {"error": False, "printer_id": printer_id, "insert": False, "update": cursor.rowcount > 0}
+        except storage.DatabaseError as e:
+            self._logger.error("Error inserting/updating printer record: " + str(e))
             raise
         except Exception as e:
-            self._logger.error("Unexpected error inserting printer record: " + str(e))
+            self._logger.error("Unexpected error inserting/updating printer record: " + str(e))
             raise
 
-
+    @timed("db_query_seconds", operation="select_printer")
     def _select_Printer(self, printer_id):
         result = {"error": True, "message": "Error selecting printer settings"}
+        connection = None
         
         try:
             connection = self.get_connection()
@@ -219,15 +474,696 @@ class DatabaseManager():
             else:
                 result.update({"message": "The connection to the database is not configured"})
                 self._logger.error("The connection to the database is not configured")
-        except MySQLError as e:
-            connection.rollback()
+        except storage.DatabaseError as e:
+            self._rollback(connection)
             result.update({"message": str(e)})
             self._logger.error("Error selecting printer configuration: " + str(e))
         except Exception as e:
-            connection.rollback()
+            self._rollback(connection)
             result.update({"message": "An unexpected error occurred: " + str(e)})
             self._logger.error("Unexpected error selecting printer configuration: " + str(e))
         finally:
-            result = self.close_connection(result)
+            result = self.close_connection(result, connection)
         
         return result
+
+    @timed("db_query_seconds", operation="insert_prints")
+    def _insert_prints(self, records, connection=None):
+        """
+        Insert print records with one multi-row upsert per distinct column set,
+        all in a single transaction. Raises on failure so the caller can retry.
+
+        Records are keyed by their client-generated ``print_uuid``: rows stored
+        by an earlier attempt whose commit was not acknowledged are skipped, so
+        retries never duplicate prints, telemetry or rollup totals. Records
+        flagged ``update_only`` finish a start row already written: each is a
+        single keyed UPDATE of a row still ``printing``, with no SELECT first.
+        One that matches no such row (already finished by an earlier attempt,
+        or its start never stored) is skipped. A given ``connection`` is used
+        and left checked out.
+        """
+        if not records:
+            return 0
+
+        merged = {}
+        update_only = {}
+        for record in records:
+            record = dict(record)
+            flagged = record.pop("update_only", False)
+            if not record.get("print_uuid"):
+                # Spooled before records carried a UUID
+                record["print_uuid"] = str(uuid.uuid4())
+            if record["print_uuid"] in merged:
+                # Start and end of the same print in one batch: a single row
+                merged[record["print_uuid"]].update(record)
+                update_only[record["print_uuid"]] = update_only[record["print_uuid"]] and flagged
+            else:
+                merged[record["print_uuid"]] = record
+                update_only[record["print_uuid"]] = flagged
+        finishing = [record for record in merged.values() if update_only[record["print_uuid"]]]
+        records = [record for record in merged.values() if not update_only[record["print_uuid"]]]
+
+        owned = connection is None
+        stored_thumbnails = []
+        try:
+            if owned:
+                connection = self.get_connection()
+            with connection.cursor() as cursor:
+                existing = {}
+                if records:
+                    cursor.execute(f"""
+                        SELECT print_uuid, {', '.join(self.STORED_COLUMNS)}
+                        FROM Print
+                        WHERE print_uuid IN ({', '.join(['%s'] * len(records))})
+                    """, [record["print_uuid"] for record in records])
+                    existing = {row[0]: dict(zip(self.STORED_COLUMNS, row[1:])) for row in cursor.fetchall()}
+
+                groups = {}
+                thumbnails = {}
+                new_records = []
+                electricity_rates = []
+                telemetry = []
+                for record in finishing:
+                    electricity_rate = record.pop("electricity_rate", None)
+                    print_telemetry = record.pop("telemetry", None)
+                    record.pop("thumbnail", None)
+                    columns = [column for column in record if column != "print_uuid"]
+                    cursor.execute(f"""
+                        UPDATE Print
+                        SET {', '.join(f'{column} = %s' for column in columns)}
+                        WHERE print_uuid = %s AND state = 'printing'
+                    """, [record[column] for column in columns] + [record["print_uuid"]])
+                    if cursor.rowcount != 1:
+                        self._logger.warning(f"No printing row stored for print {record['print_uuid']}, skipping its end")
+                        continue
+                    electricity_rates.append(electricity_rate)
+                    if print_telemetry:
+                        telemetry.append((record["print_uuid"], print_telemetry))
+                    new_records.append(record)
+
+                for record in records:
+                    stored = existing.get(record["print_uuid"])
+                    if stored is not None and (stored["state"] != "printing" or record.get("state") == "printing"):
+                        continue
+                    thumbnail = record.pop("thumbnail", None)
+                    if thumbnail:
+                        thumbnails[thumbnail["hash"]] = thumbnail
+                        record["thumbnail_hash"] = thumbnail["hash"]
+                    electricity_rates.append(record.pop("electricity_rate", None))
+                    print_telemetry = record.pop("telemetry", None)
+                    if print_telemetry:
+                        telemetry.append((record["print_uuid"], print_telemetry))
+                    # The rollups need the whole row, the start row holds the rest
+                    new_records.append(dict(stored, **record) if stored is not None else record)
+                    groups.setdefault(tuple(record.keys()), []).append(record)
+
+                if thumbnails:
+                    stored_thumbnails = self._insert_thumbnails(cursor, thumbnails)
+                for fields, rows in groups.items():
+                    # New rows are inserted, finishing rows get the columns sent. The
+                    # guard keeps a row finished meanwhile by another writer as it is
+                    updates = {field: "replace" for field in fields if field != "print_uuid"} or {"print_uuid": "replace"}
+                    query = self.backend.upsert_sql("Print", list(fields), ["print_uuid"], updates, len(rows),
+                                                    guard=("state", "printing"))
+                    params = [row[field] for row in rows for field in fields]
+                    cursor.execute(query, params)
+                self._insert_telemetry(cursor, telemetry)
+                rollups = self._update_rollups(cursor, new_records, electricity_rates)
+            connection.commit()
+            self._known_thumbnails.update(stored_thumbnails)
+            if new_records:
+                self.plugin._invalidate_analytics()
+            for period, deltas in rollups.items():
+                self.plugin.history_publisher.publish_rollups(period, deltas)
+            return len(new_records)
+        except storage.DatabaseError as e:
+            self._rollback(connection)
+            self._logger.error("Error inserting print records: " + str(e))
+            raise
+        except Exception as e:
+            self._rollback(connection)
+            self._logger.error("Unexpected error inserting print records: " + str(e))
+            raise
+        finally:
+            if owned:
+                self.release_connection(connection)
+
+    # Read back for rows already stored: the state decides whether a record
+    # still applies, the rest completes finishing records for the rollups
+    STORED_COLUMNS = ["state", "printer_id", "end_datetime", "duration", "calculated_length", "total_length",
+                      "calculated_weight", "total_weight"]
+
+    def _insert_telemetry(self, cursor, telemetry):
+        """
+        Attach encoded telemetry to the Print rows just inserted.
+        """
+        for print_uuid, print_telemetry in telemetry:
+            cursor.execute("""
+                INSERT INTO PrintTelemetry (print_id, sample_count, data)
+                SELECT print_id, %s, %s
+                FROM Print
+                WHERE print_uuid = %s
+            """, (print_telemetry["samples"], base64.b64decode(print_telemetry["data"]), print_uuid))
+
+    ROLLUP_TABLES = {"PrinterStatsDaily": "day", "PrinterStatsMonthly": "month"}
+    ROLLUP_COLUMNS = ["print_count", "failed_count", "print_seconds", "filament_length", "filament_weight",
+                      "energy_kwh", "electricity_cost", "depreciation"]
+
+    def _update_rollups(self, cursor, records, electricity_rates):
+        """
+        Fold finished prints into the daily and monthly per-printer rollups with
+        one additive upsert per table, inside the caller's transaction. Returns
+        the increments applied, by period and ``(printer_id, bucket)``.
+        """
+        rollups = {}
+        finished = [(record, rate) for record, rate in zip(records, electricity_rates)
+                    if record.get("printer_id") and record.get("state") in ("done", "failed") and record.get("end_datetime")]
+        if not finished:
+            return rollups
+
+        printer_ids = sorted(set(record["printer_id"] for record, _ in finished))
+        cursor.execute(f"""
+            SELECT printer_id, power_consumption, purchase_price, estimated_lifespan
+            FROM Printer
+            WHERE printer_id IN ({', '.join(['%s'] * len(printer_ids))})
+        """, printer_ids)
+        printers = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        for table, period in self.ROLLUP_TABLES.items():
+            deltas = {}
+            for record, rate in finished:
+                day = str(record["end_datetime"])[:10]
+                key = (record["printer_id"], day if period == "day" else day[:7] + "-01")
+                delta = deltas.setdefault(key, dict.fromkeys(self.ROLLUP_COLUMNS, 0))
+                self._add_rollup_delta(delta, record, rate, printers.get(record["printer_id"]))
+
+            params = []
+            for (printer_id, bucket), delta in deltas.items():
+                params.extend([printer_id, bucket] + [delta[column] for column in self.ROLLUP_COLUMNS])
+            cursor.execute(self.backend.upsert_sql(table, ["printer_id", period] + self.ROLLUP_COLUMNS, ["printer_id", period],
+                                                   dict.fromkeys(self.ROLLUP_COLUMNS, "add"), len(deltas)), params)
+            rollups[period] = deltas
+        return rollups
+
+    def _add_rollup_delta(self, delta, record, electricity_rate, printer):
+        power_consumption, purchase_price, estimated_lifespan = printer or (None, None, None)
+        hours = (record.get("duration") or 0) / 3600.0
+        # power_consumption is entered in kW in the printer settings
+        energy_kwh = float(power_consumption or 0) * hours
+
+        delta["print_count"] += 1
+        delta["failed_count"] += 1 if record.get("state") == "failed" else 0
+        delta["print_seconds"] += record.get("duration") or 0
+        delta["filament_length"] += float(record.get("calculated_length") or record.get("total_length") or 0)
+        delta["filament_weight"] += float(record.get("calculated_weight") or record.get("total_weight") or 0)
+        delta["energy_kwh"] += energy_kwh
+        delta["electricity_cost"] += energy_kwh * float(electricity_rate or 0)
+        if purchase_price and estimated_lifespan:
+            # estimated_lifespan is expressed in printing hours
+            delta["depreciation"] += float(purchase_price) / float(estimated_lifespan) * hours
+
+    @timed("db_query_seconds", operation="select_stats")
+    def _select_stats(self, printer_id, period="day", date_from=None, date_to=None):
+        """
+        Read per-printer usage and cost figures from the rollup tables only.
+        """
+        result = {"error": True, "message": "Error selecting printer statistics"}
+        connection = None
+
+        tables = {period_column: table for table, period_column in self.ROLLUP_TABLES.items()}
+        if period not in tables:
+            return {"error": True, "message": f"Unsupported period: {period}"}
+
+        conditions = ["printer_id = %s"]
+        params = [printer_id]
+        if date_from:
+            conditions.append(f"{period} >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append(f"{period} < %s")
+            params.append(date_to)
+
+        try:
+            connection = self.get_connection()
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT {period}, {', '.join(self.ROLLUP_COLUMNS)}
+                    FROM {tables[period]}
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY {period}
+                """, params)
+                rows = cursor.fetchall()
+            connection.commit()
+
+            buckets = []
+            totals = dict.fromkeys(self.ROLLUP_COLUMNS, 0)
+            for row in rows:
+                bucket = {period: str(row[0])[:10]}
+                for column, value in zip(self.ROLLUP_COLUMNS, row[1:]):
+                    bucket[column] = float(value) if isinstance(value, Decimal) else value
+                    totals[column] += bucket[column]
+                bucket["failure_rate"] = bucket["failed_count"] / bucket["print_count"] if bucket["print_count"] else 0.0
+                buckets.append(bucket)
+            totals["failure_rate"] = totals["failed_count"] / totals["print_count"] if totals["print_count"] else 0.0
+
+            result = {"error": False, "period": period, "stats": buckets, "totals": totals}
+        except storage.DatabaseError as e:
+            self._rollback(connection)
+            result.update({"message": str(e)})
+            self._logger.error("Error selecting printer statistics: " + str(e))
+        except Exception as e:
+            self._rollback(connection)
+            result.update({"message": "An unexpected error occurred: " + str(e)})
+            self._logger.error("Unexpected error selecting printer statistics: " + str(e))
+        finally:
+            result = self.close_connection(result, connection)
+
+        return result
+
+    def _insert_thumbnails(self, cursor, thumbnails):
+        """
+        Store thumbnails content-addressed by hash, sending only the images the
+        database does not have yet.
+        """
+        hashes = [thumbnail_hash for thumbnail_hash in thumbnails if thumbnail_hash not in self._known_thumbnails]
+        if not hashes:
+            return hashes
+
+        cursor.execute(f"""
+            SELECT thumbnail_hash FROM Thumbnail WHERE thumbnail_hash IN ({', '.join(['%s'] * len(hashes))})
+        """, hashes)
+        existing = set(row[0] for row in cursor.fetchall())
+        missing = [thumbnails[thumbnail_hash] for thumbnail_hash in hashes if thumbnail_hash not in existing]
+
+        if missing:
+            params = []
+            for thumbnail in missing:
+                data = base64.b64decode(thumbnail["data"])
+                params.extend([thumbnail["hash"], thumbnail["content_type"], len(data), data])
+            cursor.execute(self.backend.insert_ignore_sql("Thumbnail", ["thumbnail_hash", "content_type", "size", "image"], len(missing)), params)
+
+        return hashes
+
+    @timed("db_query_seconds", operation="select_thumbnail")
+    def _select_thumbnail(self, thumbnail_hash):
+        result = {"error": True, "message": "Error selecting thumbnail"}
+        connection = None
+
+        try:
+            connection = self.get_connection()
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT content_type, image FROM Thumbnail WHERE thumbnail_hash = %s
+                """, (thumbnail_hash,))
+                row = cursor.fetchone()
+            connection.commit()
+
+            if row:
+                result = {"error": False, "content_type": row[0], "image": row[1]}
+            else:
+                result = {"error": False, "message": "Thumbnail not found"}
+        except storage.DatabaseError as e:
+            self._rollback(connection)
+            result.update({"message": str(e)})
+            self._logger.error("Error selecting thumbnail: " + str(e))
+        except Exception as e:
+            self._rollback(connection)
+            result.update({"message": "An unexpected error occurred: " + str(e)})
+            self._logger.error("Unexpected error selecting thumbnail: " + str(e))
+        finally:
+            result = self.close_connection(result, connection)
+
+        return result
+
+    HISTORY_COLUMNS = ["print_id", "printer_id", "start_datetime", "end_datetime", "duration", "estimated_time",
+                       "calculated_length", "total_length", "calculated_weight", "total_weight",
+                       "file_name", "file_path", "state", "thumbnail_hash", "print_uuid"]
+    HISTORY_SORT_COLUMNS = ["start_datetime", "file_name", "state"]
+
+    @timed("db_query_seconds", operation="select_history")
+    def _select_history(self, printer_id, limit=50, after=None, sort_by="start_datetime", descending=True,
+                        state=None, date_from=None, date_to=None, file_name=None, cost_rates=None):
+        """
+        Page through a printer's prints with keyset (seek) pagination on
+        ``(printer_id, <sort_by>, print_id)``. ``after`` is the ``[value, print_id]``
+        key of the last row of the previous page; prints without a value in the
+        sort column come last when descending, first when ascending. With
+        ``cost_rates`` every row also carries its costs.
+        """
+        result = {"error": True, "message": "Error selecting print history"}
+        connection = None
+
+        if sort_by not in self.HISTORY_SORT_COLUMNS:
+            return {"error": True, "message": f"Unsupported sort column: {sort_by}"}
+
+        conditions = ["printer_id = %s"]
+        params = [printer_id]
+        if state:
+            conditions.append("state = %s")
+            params.append(state)
+        if date_from:
+            conditions.append("start_datetime >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("start_datetime < %s")
+            params.append(date_to)
+        if file_name:
+            conditions.append("file_name LIKE %s ESCAPE '!'")
+            params.append("%" + file_name.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%")
+
+        comparator = "<" if descending else ">"
+        if after:
+            # Both backends sort NULL first: after the other values when
+            # descending, before them when ascending
+            if after[0] is None:
+                condition = f"{sort_by} IS NULL AND print_id {comparator} %s"
+                params.append(after[1])
+                if not descending:
+                    condition = f"(({condition}) OR {sort_by} IS NOT NULL)"
+            else:
+                condition = f"({sort_by} {comparator} %s OR ({sort_by} = %s AND print_id {comparator} %s))"
+                params.extend([after[0], after[0], after[1]])
+                if descending:
+                    condition = f"({condition} OR {sort_by} IS NULL)"
+            conditions.append(condition)
+
+        direction = "DESC" if descending else "ASC"
+        query = f"""
+            SELECT {', '.join(self.HISTORY_COLUMNS)}
+            FROM Print
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {sort_by} {direction}, print_id {direction}
+            LIMIT %s
+        """
+        params.append(limit + 1)
+
+        try:
+            connection = self.get_connection()
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                printers = self._select_printer_rates(cursor, [printer_id]) if cost_rates and rows else {}
+            connection.commit()
+
+            has_more = len(rows) > limit
+            prints = [self._history_row(row) for row in rows[:limit]]
+            if cost_rates and prints:
+                costs = self.plugin.cost_engine.compute(self._cost_columns(
+                    [(row["printer_id"], row["duration"], row["calculated_length"] or row["total_length"],
+                      row["calculated_weight"] or row["total_weight"]) for row in prints]), printers, cost_rates)
+                for index, row in enumerate(prints):
+                    for column, values in costs.items():
+                        row[column] = values[index]
+            next_key = None
+            if has_more and prints:
+                last = prints[-1]
+                next_key = [last[sort_by], last["print_id"]]
+            result = {"error": False, "prints": prints, "next": next_key}
+        except storage.DatabaseError as e:
+            self._rollback(connection)
+            result.update({"message": str(e)})
+            self._logger.error("Error selecting print history: " + str(e))
+        except Exception as e:
+            self._rollback(connection)
+            result.update({"message": "An unexpected error occurred: " + str(e)})
+            self._logger.error("Unexpected error selecting print history: " + str(e))
+        finally:
+            result = self.close_connection(result, connection)
+
+        return result
+
+    EXPORT_COLUMNS = ["print_id", "print_uuid", "printer_id", "start_datetime", "end_datetime", "duration", "estimated_time",
+                      "calculated_length", "total_length", "calculated_weight", "total_weight", "total_height", "total_layers",
+                      "nozzle_temperature", "bed_temperature", "nozzle_diameter", "bed_type", "file_name", "file_path", "state"]
+
+    @timed("db_query_seconds", operation="open_history_export")
+    def _open_history_export(self, printer_id, state=None, date_from=None, date_to=None, batch_size=1000, cost_rates=None):
+        """
+        Run the export query on a streaming cursor and return a ``RowStream``
+        of row batches, so memory use does not grow with the history size. The
+        connection is held until the stream is exhausted or closed.
+
+        With ``cost_rates`` the cost columns of ``CostEngine.COLUMNS`` are
+        appended to every row, computed batch by batch.
+        """
+        conditions = ["printer_id = %s"]
+        params = [printer_id]
+        if state:
+            conditions.append("state = %s")
+            params.append(state)
+        if date_from:
+            conditions.append("start_datetime >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("start_datetime < %s")
+            params.append(date_to)
+
+        connection = self.get_connection()
+        try:
+            printers = {}
+            if cost_rates:
+                # Before the streaming query, which must be read to the end before the next one
+                with connection.cursor() as cursor:
+                    printers = self._select_printer_rates(cursor, [printer_id])
+            cursor = self.backend.streaming_cursor(connection)
+            cursor.execute(f"""
+                SELECT {', '.join(self.EXPORT_COLUMNS)}
+                FROM Print
+                WHERE {' AND '.join(conditions)}
+                ORDER BY start_datetime, print_id
+            """, params)
+        except Exception as e:
+            self._logger.error("Error exporting print history: " + str(e))
+            self.release_connection(connection, discard=True)
+            raise
+        transform = None
+        if cost_rates:
+            transform = lambda rows: self._with_costs(rows, printers, cost_rates)
+        return RowStream(self, connection, cursor, batch_size, transform)
+
+    def _with_costs(self, rows, printers, cost_rates):
+        columns = [self.EXPORT_COLUMNS.index(column) for column in
+                   ("printer_id", "duration", "calculated_length", "total_length", "calculated_weight", "total_weight")]
+        costs = self.plugin.cost_engine.compute(self._cost_columns(
+            [(row[columns[0]], row[columns[1]], row[columns[2]] or row[columns[3]], row[columns[4]] or row[columns[5]])
+             for row in rows]), printers, cost_rates)
+        return [tuple(row) + values for row, values in zip(rows, zip(*costs.values()))]
+
+    def _history_row(self, row):
+        history_row = {}
+        for column, value in zip(self.HISTORY_COLUMNS, row):
+            if isinstance(value, datetime):
+                value = value.strftime("%Y-%m-%d %H:%M:%S")
+            elif isinstance(value, Decimal):
+                value = float(value)
+            history_row[column] = value
+        return history_row
+
+    ANALYTICS_METRICS = ["summary", "duration", "filament", "costs"]
+    HISTOGRAM_BUCKET_SECONDS = 60
+    PERCENTILES = [0.5, 0.9, 0.95, 0.99]
+
+    @timed("db_query_seconds", operation="select_analytics")
+    def _select_analytics(self, printer_id, metric, date_from=None, date_to=None, cost_rates=None):
+        """
+        Compute one analytics metric over a date range with aggregate queries;
+        only the cost inputs are read per print, in large batches.
+        """
+        result = {"error": True, "message": "Error selecting analytics"}
+        connection = None
+
+        if metric not in self.ANALYTICS_METRICS:
+            return {"error": True, "message": f"Unsupported metric: {metric}"}
+
+        conditions = ["p.printer_id = %s"]
+        params = [printer_id]
+        if date_from:
+            conditions.append("p.start_datetime >= %s")
+            params.append(date_from)
+        if date_to:
+            conditions.append("p.start_datetime < %s")
+            params.append(date_to)
+
+        try:
+            connection = self.get_connection()
+            with connection.cursor() as cursor:
+                if metric == "summary":
+                    data = self._analytics_summary(cursor, conditions, params, printer_id, cost_rates)
+                elif metric == "duration":
+                    data = self._analytics_duration(cursor, conditions, params)
+                elif metric == "costs":
+                    data = self._analytics_costs(cursor, conditions, params, printer_id, cost_rates)
+                else:
+                    data = self._analytics_filament(cursor, conditions, params)
+            connection.commit()
+            result = {"error": False, "metric": metric, "data": data}
+        except storage.DatabaseError as e:
+            self._rollback(connection)
+            result.update({"message": str(e)})
+            self._logger.error("Error selecting analytics: " + str(e))
+        except Exception as e:
+            self._rollback(connection)
+            result.update({"message": "An unexpected error occurred: " + str(e)})
+            self._logger.error("Unexpected error selecting analytics: " + str(e))
+        finally:
+            result = self.close_connection(result, connection)
+
+        return result
+
+    def _analytics_summary(self, cursor, conditions, params, printer_id, cost_rates):
+        """
+        Counts, means and filament totals in one aggregate query. The costs come
+        from the cost engine, as for the ``costs`` metric, so both agree.
+        """
+        cursor.execute(f"""
+            SELECT COUNT(*),
+                   SUM(CASE WHEN p.state = 'done' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN p.state = 'failed' THEN 1 ELSE 0 END),
+                   AVG(p.duration),
+                   AVG(p.estimated_time),
+                   AVG(CASE WHEN p.estimated_time > 0 THEN p.duration - p.estimated_time END),
+                   AVG(CASE WHEN p.estimated_time > 0 THEN p.duration * 1.0 / p.estimated_time END),
+                   SUM(COALESCE(p.calculated_length, p.total_length, 0)),
+                   SUM(COALESCE(p.calculated_weight, p.total_weight, 0))
+            FROM Print p
+            WHERE {' AND '.join(conditions)}
+        """, params)
+        row = [self._number(value) for value in cursor.fetchone()]
+        prints, done, failed = row[0], row[1] or 0, row[2] or 0
+        costs = self._analytics_costs(cursor, conditions, params, printer_id, cost_rates)
+
+        return {
+            "prints": prints,
+            "done": done,
+            "failed": failed,
+            "success_rate": done / (done + failed) if done + failed else None,
+            "mean_duration": row[3],
+            "mean_estimated_time": row[4],
+            "mean_estimate_error": row[5],
+            "mean_estimate_ratio": row[6],
+            "filament_length": row[7] or 0.0,
+            "filament_weight": row[8] or 0.0,
+            "energy_kwh": costs["energy_kwh"],
+            "material_cost": costs["material_cost"],
+            "electricity_cost": costs["electricity_cost"],
+            "depreciation": costs["depreciation"],
+            "maintenance_cost": costs["maintenance_cost"],
+            "total_cost": costs["total_cost"],
+            "cost_per_print": costs["cost_per_print"],
+        }
+
+    def _analytics_duration(self, cursor, conditions, params):
+        """
+        Duration and estimate error percentiles, read from per-minute histograms
+        grouped in the database and interpolated within the bucket. Estimate
+        error buckets are centered on 0, so exact estimates read as 0.
+        """
+        data = {}
+        half_bucket = self.HISTOGRAM_BUCKET_SECONDS // 2
+        # Expression, condition, offset added before bucketing
+        histograms = {
+            "duration": ("p.duration", "p.duration IS NOT NULL", 0),
+            "estimate_error": ("p.duration - p.estimated_time", "p.duration IS NOT NULL AND p.estimated_time > 0", half_bucket),
+        }
+        for name, (expression, condition, offset) in histograms.items():
+            bucket = self.backend.floor_division_sql(f"{expression} + {offset}", self.HISTOGRAM_BUCKET_SECONDS)
+            cursor.execute(f"""
+                SELECT {bucket} AS bucket, COUNT(*)
+                FROM Print p
+                WHERE {' AND '.join(conditions + [condition])}
+                GROUP BY bucket
+                ORDER BY bucket
+            """, params)
+            data[name] = self._histogram_percentiles([(int(row[0]), row[1]) for row in cursor.fetchall()], offset)
+        return data
+
+    def _histogram_percentiles(self, histogram, offset=0):
+        """
+        Percentiles of a ``[(bucket, count)]`` histogram, assuming the values
+        are spread evenly over each bucket. Bucket ``b`` starts at
+        ``b * HISTOGRAM_BUCKET_SECONDS - offset`` seconds.
+        """
+        total = sum(count for _, count in histogram)
+        result = {"count": total}
+        for fraction in self.PERCENTILES:
+            value = None
+            if total:
+                threshold = fraction * total
+                seen = 0
+                for bucket, count in histogram:
+                    if seen + count >= threshold:
+                        start = bucket * self.HISTOGRAM_BUCKET_SECONDS - offset
+                        value = start + (threshold - seen) / count * self.HISTOGRAM_BUCKET_SECONDS
+                        break
+                    seen += count
+            result[f"p{int(fraction * 100)}"] = value
+        return result
+
+    def _analytics_filament(self, cursor, conditions, params):
+        cursor.execute(f"""
+            SELECT DATE(p.start_datetime) AS day,
+                   COUNT(*),
+                   SUM(COALESCE(p.calculated_length, p.total_length, 0)),
+                   SUM(COALESCE(p.calculated_weight, p.total_weight, 0))
+            FROM Print p
+            WHERE {' AND '.join(conditions)}
+            GROUP BY day
+            ORDER BY day
+        """, params)
+        return [{"day": str(row[0])[:10], "prints": row[1], "filament_length": self._number(row[2]) or 0.0,
+                 "filament_weight": self._number(row[3]) or 0.0} for row in cursor.fetchall()]
+
+    COST_BATCH_SIZE = 10000
+
+    def _analytics_costs(self, cursor, conditions, params, printer_id, cost_rates):
+        """
+        Cost totals over the range. The per-print inputs are read in large
+        batches and each batch is costed in one vectorized pass.
+        """
+        if cost_rates is None:
+            cost_rates = self.plugin.config_manager._get_config().cost_rates()
+        printers = self._select_printer_rates(cursor, [printer_id])
+        cursor.execute(f"""
+            SELECT p.printer_id, p.duration, COALESCE(p.calculated_length, p.total_length),
+                   COALESCE(p.calculated_weight, p.total_weight)
+            FROM Print p
+            WHERE {' AND '.join(conditions)}
+        """, params)
+
+        prints = 0
+        totals = dict.fromkeys(self.plugin.cost_engine.COLUMNS, 0.0)
+        while True:
+            rows = cursor.fetchmany(self.COST_BATCH_SIZE)
+            if not rows:
+                break
+            prints += len(rows)
+            for column, total in self.plugin.cost_engine.compute_totals(self._cost_columns(rows), printers, cost_rates).items():
+                totals[column] += total
+
+        totals["prints"] = prints
+        totals["cost_per_print"] = totals["total_cost"] / prints if prints else None
+        return totals
+
+    def _select_printer_rates(self, cursor, printer_ids):
+        """
+        The cost figures of the given printers, as the cost engine takes them.
+        """
+        printer_ids = [printer_id for printer_id in set(printer_ids) if printer_id]
+        if not printer_ids:
+            return {}
+        cursor.execute(f"""
+            SELECT printer_id, power_consumption, purchase_price, estimated_lifespan, maintenance_costs
+            FROM Printer
+            WHERE printer_id IN ({', '.join(['%s'] * len(printer_ids))})
+        """, printer_ids)
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def _cost_columns(self, rows):
+        """
+        ``(printer_id, duration, length, weight)`` rows to the column arrays of the cost engine.
+        """
+        printer_ids, durations, lengths, weights = (list(column) for column in zip(*rows)) if rows else ([], [], [], [])
+        return {"printer_id": printer_ids, "duration": durations, "length": lengths, "weight": weights}
+
+    def _number(self, value):
+        return float(value) if isinstance(value, Decimal) else value
@@ -0,0 +1,159 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import json
+import os
+import threading
+
+# Bucket bounds: layer height in mm, estimated time in hours
+LAYER_HEIGHT_BOUNDS = [(0.12, "fine"), (0.2, "normal"), (0.28, "draft")]
+LENGTH_BOUNDS = [(1, "short"), (4, "medium"), (12, "long")]
+
+class RunningRegression():
+    """
+    Least squares fit of actual against estimated print time kept as running
+    sums, so adding a print and predicting are O(1) whatever the history size.
+    The absolute percentage errors of the slicer estimate and of the model's
+    own prediction (made before the print was added) track their accuracy.
+    """
+    FIELDS = ["count", "sum_x", "sum_y", "sum_xx", "sum_xy", "raw_error", "model_error", "model_count"]
+
+    # Below this many prints (or without spread in the estimates) only the ratio is fitted
+    MIN_LINEAR_COUNT = 5
+
+    def __init__(self, state=None):
+        for field in self.FIELDS:
+            setattr(self, field, (state or {}).get(field, 0))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def add(self, estimated, actual):
+        prediction = self.predict(estimated)
+        if prediction is not None:
+            self.model_error += abs(actual - prediction) / actual
+            self.model_count += 1
+        self.raw_error += abs(actual - estimated) / actual
+        self.count += 1
+        self.sum_x += estimated
+        self.sum_y += actual
+        self.sum_xx += estimated * estimated
+        self.sum_xy += estimated * actual
+
+    def predict(self, estimated):
+        if not self.count or not self.sum_x:
+            return None
+        if self.count >= self.MIN_LINEAR_COUNT:
+            variance = self.count * self.sum_xx - self.sum_x * self.sum_x
+            # Relative threshold, the sums are in seconds squared
+            if variance > 1e-9 * self.count * self.sum_xx:
+                slope = (self.count * self.sum_xy - self.sum_x * self.sum_y) / variance
+                intercept = (self.sum_y - slope * self.sum_x) / self.count
+                if slope > 0:
+                    return max(0.0, slope * estimated + intercept)
+        return estimated * self.sum_y / self.sum_x
+
+    def summary(self):
+        return {
+            "prints": self.count,
+            "ratio": self.sum_y / self.sum_x if self.sum_x else None,
+            "estimate_error": self.raw_error / self.count if self.count else None,
+            "corrected_error": self.model_error / self.model_count if self.model_count else None,
+        }
+
+
+class EtaModel():
+    """
+    Per-printer online correction of the slicer's print time estimates.
+
+    Every finished print updates a running regression of actual against
+    estimated time for its bucket (layer height x estimated length) and one
+    for the printer as a whole. Corrected estimates come from the bucket once
+    it has seen ``min_bucket_prints`` prints, from the printer model before
+    that. The state is a few sums per bucket, persisted in the plugin data
+    folder after every update.
+    """
+    STATE_FILE_NAME = "eta_model.json"
+
+    def __init__(self, plugin, _logger, min_bucket_prints=3):
+        self._logger = _logger
+        self.plugin = plugin
+        self.min_bucket_prints = min_bucket_prints
+        self._models = None  # printer id -> bucket -> RunningRegression, loaded on first use
+        self._lock = threading.Lock()
+
+    def bucket(self, estimated_time, layer_height=None):
+        hours = estimated_time / 3600.0
+        length = next((name for bound, name in LENGTH_BOUNDS if hours < bound), "very_long")
+        if not layer_height:
+            return f"any:{length}"
+        height = next((name for bound, name in LAYER_HEIGHT_BOUNDS if layer_height <= bound + 1e-6), "coarse")
+        return f"{height}:{length}"
+
+    def layer_height(self, gcode_metadata):
+        total_height = (gcode_metadata or {}).get("total_height")
+        total_layers = (gcode_metadata or {}).get("total_layers")
+        if total_height and total_layers:
+            return total_height / total_layers
+        return None
+
+    def observe(self, printer_id, estimated_time, duration, layer_height=None):
+        """
+        Add a finished print. Prints without both times are ignored.
+        """
+        if not estimated_time or not duration or estimated_time <= 0 or duration <= 0:
+            return
+        key = str(printer_id or 0)
+        with self._lock:
+            models = self._load().setdefault(key, {})
+            for bucket in ("all", self.bucket(estimated_time, layer_height)):
+                models.setdefault(bucket, RunningRegression()).add(float(estimated_time), float(duration))
+            self._save()
+
+    def correct(self, printer_id, estimated_time, layer_height=None):
+        """
+        Returns ``(corrected time, model used)``, ``(None, None)`` when nothing
+        is known yet.
+        """
+        if not estimated_time or estimated_time <= 0:
+            return None, None
+        with self._lock:
+            models = self._load().get(str(printer_id or 0), {})
+            bucket = self.bucket(estimated_time, layer_height)
+            for name in (bucket, "all"):
+                model = models.get(name)
+                if model is not None and (name == "all" or model.count >= self.min_bucket_prints):
+                    prediction = model.predict(float(estimated_time))
+                    if prediction is not None:
+                        return prediction, name
+        return None, None
+
+    def summary(self, printer_id):
+        with self._lock:
+            models = self._load().get(str(printer_id or 0), {})
+            return {bucket: model.summary() for bucket, model in sorted(models.items())}
+
+    def _state_path(self):
+        return os.path.join(self.plugin.get_plugin_data_folder(), self.STATE_FILE_NAME)
+
+    def _load(self):
+        if self._models is None:
+            try:
+                with open(self._state_path(), encoding="utf-8") as state_file:
+                    state = json.load(state_file)
+            except (OSError, ValueError):
+                state = {}
+            self._models = {printer_id: {bucket: RunningRegression(model) for bucket, model in buckets.items()}
+                            for printer_id, buckets in state.items()}
+        return self._models
+
+    def _save(self):
+        path = self._state_path()
+        state = {printer_id: {bucket: model.to_dict() for bucket, model in buckets.items()}
+                 for printer_id, buckets in self._models.items()}
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as state_file:
+                json.dump(state, state_file)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            self._logger.error(f"Error saving print time model: {e}")
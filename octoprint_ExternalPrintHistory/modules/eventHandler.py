@@ -2,58 +2,220 @@
 from __future__ import absolute_import
 
 import base64
+import hashlib
+import mimetypes
 import os
+import time
+import uuid
+from datetime import datetime, timezone
 from octoprint.events import Events
+from .metrics import timed
 
 class EventHandler():
     def __init__(self,plugin,_logger):
         self._logger = _logger
         self.plugin = plugin
         
+    @timed("event_handler_seconds", event="print_started")
     def _handle_print_started(self, payload):
         self._logger.info("Print started")
         metadata = self.get_metadata(payload)
 
-        self._logger.info(f"metadata: {metadata}")
-        self._logger.info(f"payload: {payload}")
-
         thumbnail_path = self._takeThumbnailImage(metadata.get("thumbnail",""))
+        analysis = metadata.get("analysis", {})
+
+        disk_path = self._get_disk_path(payload)
+        gcode_metadata = self.plugin.gcode_metadata.get(disk_path)
+        if gcode_metadata is None:
+            # Not analysed yet (e.g. after a restart), parse it in the background for the end event
+            self.plugin.gcode_metadata.submit(disk_path)
+
+        entry = {
+            "print_uuid": str(uuid.uuid4()),
+            "origin": payload.get("origin"),
+            "path": payload.get("path"),
+            "start_time": time.time(),
+            "printer_id": self.plugin.config_manager._get_printer_id() or None,
+            "file_name": payload.get("name"),
+            "disk_path": disk_path,
+            "estimated_time": analysis.get("estimatedPrintTime"),
+            "filament": analysis.get("filament", {}),
+            "gcode_metadata": gcode_metadata,
+        }
+        for interrupted in self.plugin.active_prints.start(entry):
+            # Its end event never came (e.g. OctoPrint stopped mid-print), close its row
+            self._logger.warning(f"Print of {interrupted.get('path')} was interrupted, recording it as failed")
+            self.plugin.print_writer.enqueue(self._interrupted_record(interrupted, entry["start_time"]))
+
+        # The start row, completed by the end event
+        record = self._print_record(entry, gcode_metadata or {})
+        thumbnail = self._read_thumbnail(thumbnail_path)
+        if thumbnail:
+            record["thumbnail"] = thumbnail
+        self.plugin.print_writer.enqueue(record)
+
+        self.plugin.telemetry_recorder.start()
+        self._publish_print(record)
+        self.plugin.history_publisher.publish_state("printing", **self._get_active_print())
 
-        self._logger.info(f"thumbnail_path: {thumbnail_path}")
-
-        #print_id 
-        #printer_id
-        #start_datetime	
-        #end_datetime
-        #duration
-        #estimated_time
-        #thumbnail
-        #calculated_length
-        #total_length
         #calculated_height
-        #total_height
         #calculated_layers
-        #total_layers
         #calculated_weight
-        #total_weight
-        #nozzle_temperature
-        #bed_temperature
-        #print_time
-        #printer_state
-        #file_path
 
+    @timed("event_handler_seconds", event="print_done")
     def _handle_print_done(self, payload):
         self._logger.info("Print done: %s", payload)
+        record = self._record_print_end(payload, "done")
+        eta_model = self.plugin.eta_model
+        eta_model.observe(record["printer_id"], record["estimated_time"], record["duration"], eta_model.layer_height(record))
        
+    @timed("event_handler_seconds", event="print_failed")
     def _handle_print_failed(self, payload):
         self._logger.info("Print failed: %s", payload)
+        self._record_print_end(payload, "failed")
+
+    def _record_print_end(self, payload, state):
+        """
+        Complete the Print row of a finished job and hand it to the write-behind
+        queue. The job's start row, found by the UUID kept in the active print
+        table, is updated in place with a single keyed UPDATE; the record holds
+        the whole row, so the rollups need nothing read back.
+        """
+        end_time = time.time()
+        duration = payload.get("time")
+        entry = self.plugin.active_prints.finish(payload.get("origin"), payload.get("path"))
+        if entry is None:
+            # Start event was missed (e.g. plugin loaded mid-print), the row is inserted whole
+            entry = {
+                "print_uuid": str(uuid.uuid4()),
+                "origin": payload.get("origin"),
+                "path": payload.get("path"),
+                "start_time": end_time - duration if duration is not None else None,
+                "printer_id": self.plugin.config_manager._get_printer_id() or None,
+                "file_name": payload.get("name"),
+                "disk_path": self._get_disk_path(payload),
+            }
+            record = self._print_record(entry, self.plugin.gcode_metadata.get(entry["disk_path"]) or {})
+            thumbnail = self._read_thumbnail(self._takeThumbnailImage(self.get_metadata(payload).get("thumbnail", "")))
+            if thumbnail:
+                record["thumbnail"] = thumbnail
+        else:
+            # The G-code metadata may have been parsed since the start
+            record = self._print_record(entry, entry.get("gcode_metadata") or self.plugin.gcode_metadata.get(entry.get("disk_path")) or {})
+            # Only applies over the start row, see DatabaseManager._insert_prints
+            record["update_only"] = True
+
+        record.update({
+            "end_datetime": self._to_datetime(end_time),
+            "duration": int(duration) if duration is not None else None,
+            "state": state,
+        })
+
+        telemetry = self.plugin.telemetry_recorder.finish()
+        if telemetry:
+            record["telemetry"] = telemetry
+
+        self.plugin.print_writer.enqueue(record)
+        self.plugin._invalidate_analytics()
+
+        self._publish_print(record)
+        self.plugin.history_publisher.publish_state(state, file_name=record["file_name"], file_path=record["file_path"])
+        return record
+
+    def _print_record(self, entry, gcode_metadata):
+        """
+        The Print row of an active print entry, as known at its start.
+        """
+        estimated_time = entry.get("estimated_time") or gcode_metadata.get("estimated_time")
+        return {
+            "print_uuid": entry["print_uuid"],
+            "printer_id": entry.get("printer_id"),
+            "start_datetime": self._to_datetime(entry.get("start_time")),
+            "estimated_time": int(estimated_time) if estimated_time is not None else None,
+            "calculated_length": self._get_filament_length(entry.get("filament", {})),
+            "total_length": gcode_metadata.get("total_length"),
+            "total_height": gcode_metadata.get("total_height"),
+            "total_layers": gcode_metadata.get("total_layers"),
+            "total_weight": gcode_metadata.get("total_weight"),
+            "nozzle_temperature": gcode_metadata.get("nozzle_temperature"),
+            "bed_temperature": gcode_metadata.get("bed_temperature"),
+            "nozzle_diameter": gcode_metadata.get("nozzle_diameter"),
+            "bed_type": gcode_metadata.get("bed_type"),
+            "file_name": entry.get("file_name"),
+            "file_path": entry.get("path"),
+            "state": "printing",
+            "electricity_rate": self.plugin.config_manager._get_config().electricity_cost,
+        }
+
+    def _interrupted_record(self, entry, next_start_time):
+        """
+        Failed end of a print whose end event never came. It ended when it
+        was last seen alive, at the latest when the next print started.
+        """
+        end_time = entry.get("last_seen") or next_start_time
+        start_time = entry.get("start_time")
+        record = self._print_record(entry, entry.get("gcode_metadata") or {})
+        record.update({
+            "end_datetime": self._to_datetime(end_time),
+            "duration": int(max(0, end_time - start_time)) if start_time is not None else None,
+            "state": "failed",
+            "update_only": True,
+        })
+        return record
+
+    def _publish_print(self, record):
+        # Shown in the tab right away, the row itself may be written much later in edge sync mode
+        database_manager = self.plugin.database_manager
+        self.plugin.history_publisher.publish_print(
+            database_manager._history_row([record.get(column) for column in database_manager.HISTORY_COLUMNS]))
+
+    def _get_active_print(self):
+        """
+        The running print with its slicer estimate and the estimate corrected
+        by the printer's print time model, None when nothing is printing.
+        """
+        current_print = self.plugin.active_prints.current()
+        if current_print is None:
+            return None
+        gcode_metadata = current_print.get("gcode_metadata") or self.plugin.gcode_metadata.get(current_print.get("disk_path")) or {}
+        estimated_time = current_print.get("estimated_time") or gcode_metadata.get("estimated_time")
+        eta_model = self.plugin.eta_model
+        corrected_time, model = eta_model.correct(self.plugin.config_manager._get_printer_id(), estimated_time,
+                                                  eta_model.layer_height(gcode_metadata))
+        return {
+            "file_name": current_print.get("file_name"),
+            "file_path": current_print.get("path"),
+            "start_datetime": self._format_datetime(current_print["start_time"]),
+            "estimated_time": estimated_time,
+            "corrected_time": corrected_time,
+            "model": model,
+        }
+
+    def _get_filament_length(self, filament):
+        length = 0.0
+        for tool in (filament or {}).values():
+            if tool:
+                length += tool.get("length") or 0.0
+        return round(length, 2) if length else None
+
+    def _to_datetime(self, timestamp):
+        if timestamp is None:
+            return None
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(tzinfo=None, microsecond=0)
+
+    def _format_datetime(self, timestamp):
+        value = self._to_datetime(timestamp)
+        return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
       
+    def _handle_z_change(self, payload):
+        self.plugin.active_prints.touch()
+
     def _handle_metadata_statistics_updated(self, payload):
         self._logger.info("Metadata statistics updated: %s", payload)
         #self._update_metadata(payload)
 
     def get_metadata(self, payload):
-        return self._file_manager.get_metadata(payload["origin"], payload["path"])
+        return self.plugin._file_manager.get_metadata(payload["origin"], payload["path"]) or {}
 
     def _extract_print_parameters(self, payload):
         
@@ -70,15 +232,50 @@ class EventHandler():
     def _takeThumbnailImage(self, path):        
             thumbnail_path = path.split('?')[0]
             return thumbnail_path
-    
+
+    def _read_thumbnail(self, thumbnail_path):
+        """
+        Read a thumbnail served by a thumbnail plugin
+        (``plugin/<identifier>/thumbnail/<file>``) from that plugin's data folder
+        and return it content-addressed by its SHA-256 hash.
+        """
+        if not thumbnail_path:
+            return None
+
+        parts = thumbnail_path.split("/", 3)
+        if len(parts) != 4 or parts[0] != "plugin" or parts[2] != "thumbnail":
+            self._logger.warning(f"Unsupported thumbnail path: {thumbnail_path}")
+            return None
+
+        data_folder = self._get_other_plugin_data_folder(parts[1])
+        if not data_folder:
+            return None
+
+        file_path = os.path.realpath(os.path.join(data_folder, parts[3]))
+        if not file_path.startswith(os.path.realpath(data_folder) + os.sep):
+            self._logger.warning(f"Thumbnail path outside plugin data folder: {thumbnail_path}")
+            return None
+
+        try:
+            with open(file_path, "rb") as thumbnail_file:
+                data = thumbnail_file.read()
+        except OSError as e:
+            self._logger.error(f"Error reading thumbnail {file_path}: {e}")
+            return None
+
+        return {
+            "hash": hashlib.sha256(data).hexdigest(),
+            "content_type": mimetypes.guess_type(file_path)[0] or "application/octet-stream",
+            "data": base64.b64encode(data).decode(),
+        }
 
     def _get_other_plugin_data_folder(self, plugin_identifier):
         """
         Retrieves the data folder path for another plugin by its identifier.
         """
-        plugin_instance = self._plugin_manager.get_plugin(plugin_identifier)
-        if plugin_instance:
-            return plugin_instance.get_plugin_data_folder()
+        plugin_info = self.plugin._plugin_manager.get_plugin_info(plugin_identifier)
+        if plugin_info and plugin_info.implementation:
+            return plugin_info.implementation.get_plugin_data_folder()
         else:
             self._logger.error(f"Plugin '{plugin_identifier}' not found.")
             return None
@@ -94,8 +291,16 @@ class EventHandler():
         self._logger.info(f"Filament Length: {filament_length} mm")
         self._logger.info(f"Print Time: {print_time} minutes")
         
+    @timed("event_handler_seconds", event="metadata_analysis_finished")
     def _handle_metadata_analysis_finished(self, payload):
-        name = payload.get("path")
-        estimatedPrintTime = payload.get("estimatedPrintTime")
-        filament = payload.get("filament")
-        
+        # Parse the slicer header/footer off the event thread while the file is fresh
+        self.plugin.gcode_metadata.submit(self._get_disk_path(payload))
+
+    def _get_disk_path(self, payload):
+        if payload.get("origin") != "local" or not payload.get("path"):
+            return None
+        try:
+            return self.plugin._file_manager.path_on_disk(payload["origin"], payload["path"])
+        except Exception as e:
+            self._logger.error(f"Error resolving path of {payload.get('path')}: {e}")
+            return None
@@ -0,0 +1,192 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Slicer comment keys (lowercased, without the leading ';') mapped to Print columns
+SLICER_KEYS = {
+    # PrusaSlicer / SuperSlicer / OrcaSlicer
+    "filament used [mm]": "total_length",
+    "total filament used [g]": "total_weight",
+    "filament used [g]": "total_weight",
+    "total layers count": "total_layers",
+    "max_layer_z": "total_height",
+    "first_layer_temperature": "nozzle_temperature",
+    "nozzle_temperature_initial_layer": "nozzle_temperature",
+    "temperature": "nozzle_temperature",
+    "first_layer_bed_temperature": "bed_temperature",
+    "bed_temperature": "bed_temperature",
+    "nozzle_diameter": "nozzle_diameter",
+    "layer_height": "layer_height",
+    "curr_bed_type": "bed_type",
+    "estimated printing time (normal mode)": "estimated_time",
+    # Cura
+    "filament used": "total_length",
+    "layer_count": "total_layers",
+    "maxz": "total_height",
+    "layer height": "layer_height",
+    "time": "estimated_time",
+    "extruder_train.0.initial_temperature": "nozzle_temperature",
+    "extruder_train.0.nozzle.diameter": "nozzle_diameter",
+    "build_plate.initial_temperature": "bed_temperature",
+}
+
+NUMERIC_COLUMNS = ("total_length", "total_weight", "total_height", "nozzle_temperature", "bed_temperature",
+                   "nozzle_diameter", "layer_height")
+
+COMMENT_PATTERN = re.compile(r"^;\s*([^=:]+?)\s*[=:]\s*(.+?)\s*$")
+TEMPERATURE_PATTERN = re.compile(r"^(M104|M109|M140|M190)\b.*?\bS(\d+(?:\.\d+)?)")
+DURATION_PATTERN = re.compile(r"(\d+)\s*([dhms])")
+
+
+class GcodeMetadataParser():
+    """
+    Extracts slicer metadata from the comment blocks at the start and the end
+    of a G-code file. Only ``head_size`` and ``tail_size`` bytes are read, the
+    body of the file is skipped with a seek.
+    """
+    def __init__(self, head_size=64 * 1024, tail_size=128 * 1024):
+        self.head_size = head_size
+        self.tail_size = tail_size
+
+    def parse(self, path):
+        size = os.path.getsize(path)
+        with open(path, "rb") as gcode_file:
+            head = gcode_file.read(self.head_size)
+            tail = b""
+            if size > self.head_size:
+                gcode_file.seek(max(self.head_size, size - self.tail_size))
+                tail = gcode_file.read()
+                # Drop the partial first line of the tail block
+                tail = tail[tail.find(b"\n") + 1:]
+
+        metadata = {}
+        fallback = {}
+        for block in (head, tail):
+            for line in block.decode("utf-8", errors="replace").splitlines():
+                self._parse_line(line.strip(), metadata, fallback)
+
+        for column, value in fallback.items():
+            metadata.setdefault(column, value)
+        return metadata
+
+    def _parse_line(self, line, metadata, fallback):
+        if not line:
+            return
+
+        if line[0] != ";":
+            match = TEMPERATURE_PATTERN.match(line)
+            if match:
+                column = "nozzle_temperature" if match.group(1) in ("M104", "M109") else "bed_temperature"
+                fallback.setdefault(column, float(match.group(2)))
+            return
+
+        match = COMMENT_PATTERN.match(line)
+        if not match:
+            return
+        column = SLICER_KEYS.get(match.group(1).lower())
+        if column is None or column in metadata:
+            return
+
+        value = self._convert(column, match.group(2))
+        if value is not None:
+            metadata[column] = value
+
+    def _convert(self, column, raw_value):
+        try:
+            if column == "bed_type":
+                return raw_value[:50]
+            if column == "estimated_time":
+                if raw_value.isdigit():
+                    return int(raw_value)
+                seconds = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+                parts = DURATION_PATTERN.findall(raw_value)
+                return sum(int(amount) * seconds[unit] for amount, unit in parts) if parts else None
+            if column == "total_layers":
+                return int(float(raw_value))
+
+            # Multi-extruder values are comma separated, sum them (or keep the first for settings)
+            values = [float(value) for value in raw_value.replace("m", "").split(",") if value.strip()]
+            if not values:
+                return None
+            if column in ("total_length", "total_weight"):
+                total = sum(values)
+                if column == "total_length" and raw_value.rstrip().endswith("m"):
+                    total *= 1000.0  # Cura reports meters
+                return round(total, 2)
+            return values[0]
+        except ValueError:
+            return None
+
+
+class GcodeMetadataCache():
+    """
+    Parses G-code files on a worker thread and caches the results keyed by
+    path, mtime and size, so that lookups on the print path are a dict access.
+    """
+    def __init__(self, _logger, max_entries=256):
+        self._logger = _logger
+        self.max_entries = max_entries
+        self.parser = GcodeMetadataParser()
+        self._cache = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _key(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (path, stat.st_mtime_ns, stat.st_size)
+
+    def get(self, path):
+        key = self._key(path) if path else None
+        if key is None:
+            return None
+        with self._lock:
+            metadata = self._cache.get(key)
+            if metadata is not None:
+                self._cache.move_to_end(key)
+        return metadata
+
+    def submit(self, path):
+        """
+        Schedule a file for parsing unless it is already cached or queued.
+        """
+        key = self._key(path) if path else None
+        if key is None:
+            return
+        with self._lock:
+            if key in self._cache or key in self._pending:
+                return
+            self._pending.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ExternalPrintHistory.Gcode")
+            executor = self._executor
+        executor.submit(self._parse, key)
+
+    def shutdown(self):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _parse(self, key):
+        path = key[0]
+        try:
+            metadata = self.parser.parse(path)
+        except Exception as e:
+            self._logger.error(f"Error parsing G-code metadata of {path}: {e}")
+            metadata = {}
+
+        with self._lock:
+            self._pending.discard(key)
+            self._cache[key] = metadata
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
@@ -0,0 +1,92 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+class HistoryExporter():
+    """
+    Streams the print history as CSV or JSON lines, optionally gzip-compressed
+    on the fly. Rows are read from the database in batches and encoded batch by
+    batch, so memory use stays constant whatever the history size.
+    """
+    FORMATS = {
+        "csv": ("text/csv", "csv"),
+        "jsonl": ("application/x-ndjson", "jsonl"),
+    }
+
+    def __init__(self, plugin, _logger):
+        self._logger = _logger
+        self.plugin = plugin
+
+    def open(self, export_format, compress=False, **filters):
+        """
+        Start an export and return ``(generator of bytes, mimetype, file name,
+        close)``. ``close`` hands the database connection back and must be
+        called once the response is done, even when nothing was streamed.
+        Database errors are raised here, before anything is streamed.
+        """
+        if export_format not in self.FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}")
+
+        database_manager = self.plugin.database_manager
+        config = self.plugin.config_manager._get_config()
+        batches = database_manager._open_history_export(config.printer_id or 0, cost_rates=config.cost_rates(), **filters)
+        encode = self._encode_csv if export_format == "csv" else self._encode_jsonl
+        chunks = encode(database_manager.EXPORT_COLUMNS + self.plugin.cost_engine.COLUMNS, batches)
+
+        mimetype, extension = self.FORMATS[export_format]
+        file_name = f"print_history.{extension}"
+        if compress:
+            chunks = self._gzip(chunks)
+            mimetype = "application/gzip"
+            file_name += ".gz"
+        return chunks, mimetype, file_name, batches.close
+
+    def _encode_csv(self, columns, batches):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        try:
+            for rows in batches:
+                writer.writerows([self._value(value) for value in row] for row in rows)
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        finally:
+            # Hand the connection back even when the client goes away mid-stream
+            batches.close()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def _encode_jsonl(self, columns, batches):
+        try:
+            for rows in batches:
+                lines = [json.dumps(dict(zip(columns, (self._value(value) for value in row)))) for row in rows]
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+        finally:
+            batches.close()
+
+    def _gzip(self, chunks, level=6):
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+        try:
+            for chunk in chunks:
+                compressed = compressor.compress(chunk)
+                if compressed:
+                    yield compressed
+            yield compressor.flush()
+        finally:
+            chunks.close()
+
+    def _value(self, value):
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(value, date):
+            return value.strftime("%Y-%m-%d")
+        if isinstance(value, Decimal):
+            return float(value)
+        return value
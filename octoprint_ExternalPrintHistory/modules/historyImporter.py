@@ -0,0 +1,325 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Namespace of the deterministic print UUIDs given to imported prints
+IMPORT_NAMESPACE = uuid.UUID("5b0d7c52-3f4e-4a43-9d49-2f5d1b3c8e61")
+
+class HistoryImporter():
+    """
+    Resumable bulk import of the prints recorded before the plugin was
+    installed: OctoPrint's own file metadata history and the databases of the
+    PrintHistory and PrintJobHistory plugins.
+
+    Sources are streamed in a stable order and loaded in chunks, each chunk a
+    single multi-row transaction sized to the parameters the backend can bind.
+    Imported prints get a UUID derived from their source and source id, so
+    running the import again never duplicates rows. For the plugin databases a
+    checkpoint file records the last imported id per target database and
+    printer, so an interrupted import resumes where it stopped instead of
+    re-reading them.
+    """
+    SOURCES = ["octoprint", "printhistory", "PrintJobHistory"]
+    CHECKPOINT_FILE_NAME = "import_checkpoint.json"
+
+    def __init__(self, plugin, _logger, chunk_size=1000):
+        self._logger = _logger
+        self.plugin = plugin
+        self.chunk_size = chunk_size
+        self._thread = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self.status = {"running": False}
+
+    def start(self, sources=None):
+        sources = sources or self.SOURCES
+        unknown = [source for source in sources if source not in self.SOURCES]
+        if unknown:
+            return {"error": True, "message": f"Unknown import source(s): {', '.join(unknown)}"}
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return {"error": True, "message": "An import is already running"}
+            self._cancel.clear()
+            self.status = {"running": True, "sources": {}}
+            self._thread = threading.Thread(target=self._run, args=(sources,), name="ExternalPrintHistory.Import", daemon=True)
+            self._thread.start()
+        return {"error": False, "message": "Import started"}
+
+    def stop(self, timeout=5.0):
+        self._cancel.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def get_status(self):
+        with self._lock:
+            return json.loads(json.dumps(self.status))
+
+    def _run(self, sources):
+        checkpoint = self._load_checkpoint()
+        started = time.monotonic()
+        try:
+            for source in sources:
+                if self._cancel.is_set():
+                    break
+                self._import_source(source, checkpoint)
+        except Exception as e:
+            self._logger.error(f"Error importing print history: {e}")
+            self._update_status(error=str(e))
+        finally:
+            self._update_status(running=False, elapsed=time.monotonic() - started)
+            self._send_progress()
+
+    def _import_source(self, source, checkpoint):
+        """
+        Load one source from its checkpoint on, committing chunk by chunk.
+        """
+        progress = {"read": 0, "imported": 0, "rate": 0.0, "done": False}
+        self._update_source(source, progress)
+
+        readers = {
+            "octoprint": self._read_octoprint_history,
+            "printhistory": self._read_print_history,
+            "PrintJobHistory": self._read_print_job_history,
+        }
+        started = time.monotonic()
+        chunk = []
+        last_id = None
+        for last_id, record in readers[source](checkpoint.get(self._checkpoint_key(source))):
+            chunk.append(record)
+            if len(chunk) >= self._chunk_rows(record):
+                if not self._load_chunk(source, chunk, last_id, progress, checkpoint, started):
+                    return
+                chunk = []
+        if chunk and not self._load_chunk(source, chunk, last_id, progress, checkpoint, started):
+            return
+
+        progress["done"] = True
+        self._update_source(source, progress)
+        self._send_progress()
+
+    def _load_chunk(self, source, chunk, last_id, progress, checkpoint, started):
+        if self._cancel.is_set():
+            return False
+
+        config = self.plugin.config_manager._get_config()
+        printer_id = config.printer_id or None
+        for record in chunk:
+            record["printer_id"] = printer_id
+            record["electricity_rate"] = config.electricity_cost
+
+        progress["imported"] += self.plugin.database_manager._insert_prints(chunk)
+        progress["read"] += len(chunk)
+        elapsed = time.monotonic() - started
+        progress["rate"] = progress["read"] / elapsed if elapsed else 0.0
+
+        if source != "octoprint":
+            # Plugin databases are read in id order; OctoPrint's metadata has no such order
+            checkpoint[self._checkpoint_key(source)] = last_id
+            self._save_checkpoint(checkpoint)
+        self._update_source(source, progress)
+        self._send_progress()
+        return True
+
+    ###################################################################
+    ##################### SOURCES #####################################
+    ###################################################################
+    def _read_octoprint_history(self, after=None):
+        """
+        Prints OctoPrint keeps in the ``history`` of each uploaded file's
+        ``.metadata.json``. Always read in full, already imported prints are
+        skipped by their UUID.
+        """
+        uploads = self.plugin._settings.global_get_basefolder("uploads")
+        for folder, directories, files in os.walk(uploads):
+            directories.sort()
+            if ".metadata.json" not in files:
+                continue
+            try:
+                with open(os.path.join(folder, ".metadata.json"), encoding="utf-8") as metadata_file:
+                    metadata = json.load(metadata_file)
+            except (OSError, ValueError) as e:
+                self._logger.error(f"Error reading file metadata in {folder}: {e}")
+                continue
+
+            relative_folder = os.path.relpath(folder, uploads).replace(os.sep, "/")
+            for name in sorted(metadata):
+                file_metadata = metadata[name] or {}
+                analysis = file_metadata.get("analysis") or {}
+                path = name if relative_folder == "." else relative_folder + "/" + name
+                for entry in file_metadata.get("history") or []:
+                    end_time = entry.get("timestamp")
+                    duration = entry.get("printTime")
+                    if end_time is None:
+                        continue
+                    yield None, self._record("octoprint", f"{path}:{end_time}", {
+                        "start_time": end_time - duration if duration is not None else None,
+                        "end_time": end_time,
+                        "duration": duration,
+                        "estimated_time": analysis.get("estimatedPrintTime"),
+                        "calculated_length": self.plugin.event_handler._get_filament_length(analysis.get("filament")),
+                        "file_name": name,
+                        "file_path": path,
+                        "state": "done" if entry.get("success") else "failed",
+                    })
+
+    def _read_print_history(self, after=None):
+        """
+        Prints of the PrintHistory plugin (``history.db``).
+        """
+        query = """
+            SELECT id, fileName, filamentLength, printTime, success, timestamp
+            FROM print_history
+            WHERE id > ?
+            ORDER BY id
+        """
+        for row in self._read_plugin_database("printhistory", "history.db", query, after):
+            source_id, file_name, filament_length, print_time, success, end_time = row
+            yield source_id, self._record("printhistory", source_id, {
+                "start_time": end_time - print_time if end_time is not None and print_time is not None else None,
+                "end_time": end_time,
+                "duration": print_time,
+                "calculated_length": filament_length,
+                "file_name": os.path.basename(file_name or "") or None,
+                "file_path": file_name,
+                "state": "done" if success else "failed",
+            })
+
+    def _read_print_job_history(self, after=None):
+        """
+        Prints of the PrintJobHistory plugin (``printJobHistory.db``).
+        """
+        query = """
+            SELECT j.databaseId, j.printStartDateTime, j.printEndDateTime, j.duration, j.fileName,
+                   j.filePathName, j.printStatusResult, SUM(f.usedLength), SUM(f.usedWeight)
+            FROM pjh_printjobmodel j
+            LEFT JOIN pjh_filamentmodel f ON f.printJob_id = j.databaseId
+            WHERE j.databaseId > ?
+            GROUP BY j.databaseId
+            ORDER BY j.databaseId
+        """
+        for row in self._read_plugin_database("PrintJobHistory", "printJobHistory.db", query, after):
+            source_id, start, end, duration, file_name, file_path, status, used_length, used_weight = row
+            yield source_id, self._record("PrintJobHistory", source_id, {
+                "start_time": self._local_timestamp(start),
+                "end_time": self._local_timestamp(end),
+                "duration": duration,
+                "calculated_length": used_length,
+                "calculated_weight": used_weight,
+                "file_name": file_name,
+                "file_path": file_path,
+                "state": "done" if status == "success" else "failed",
+            })
+
+    def _read_plugin_database(self, plugin_identifier, file_name, query, after):
+        if self.plugin._plugin_manager.get_plugin_info(plugin_identifier) is None:
+            # Not installed, nothing to import
+            return
+        data_folder = self.plugin.event_handler._get_other_plugin_data_folder(plugin_identifier)
+        if not data_folder or not os.path.exists(os.path.join(data_folder, file_name)):
+            return
+
+        path = os.path.join(data_folder, file_name)
+        try:
+            # Read only, so the other plugin's database is never modified or locked for writing
+            connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        except sqlite3.Error as e:
+            self._logger.error(f"Error opening {path}: {e}")
+            return
+        try:
+            cursor = connection.execute(query, (after if after is not None else -1,))
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        except sqlite3.Error as e:
+            self._logger.error(f"Error reading {path}: {e}")
+        finally:
+            connection.close()
+
+    def _local_timestamp(self, value):
+        # PrintJobHistory stores naive local times
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(str(value)).timestamp()
+        except ValueError:
+            return None
+
+    def _record(self, source, source_id, values):
+        event_handler = self.plugin.event_handler
+        start_time = values.pop("start_time", None)
+        end_time = values.pop("end_time", None)
+        if start_time is not None:
+            values["start_datetime"] = event_handler._to_datetime(start_time)
+        if end_time is not None:
+            values["end_datetime"] = event_handler._to_datetime(end_time)
+        for key in ("duration", "estimated_time"):
+            if values.get(key) is not None:
+                values[key] = int(values[key])
+
+        record = {"print_uuid": str(uuid.uuid5(IMPORT_NAMESPACE, f"{source}:{source_id}"))}
+        record.update(values)
+        return record
+
+    ###################################################################
+    ##################### PROGRESS ####################################
+    ###################################################################
+    def _chunk_rows(self, record):
+        """
+        Records per chunk: each binds one parameter per column, and its printer
+        id, in the chunk's multi-row upsert.
+        """
+        backend = self.plugin.database_manager.backend
+        max_variables = backend.MAX_VARIABLES if backend is not None else None
+        if not max_variables:
+            return self.chunk_size
+        return max(1, min(self.chunk_size, max_variables // (len(record) + 1)))
+
+    def _checkpoint_key(self, source):
+        """
+        A checkpoint only holds for the database and printer it was written to.
+        """
+        backend = self.plugin.database_manager.backend
+        target = "/".join(str(value) for value in backend.target()) if backend is not None else ""
+        return f"{source}|{target}|{self.plugin.config_manager._get_printer_id()}"
+
+    def _checkpoint_path(self):
+        return os.path.join(self.plugin.get_plugin_data_folder(), self.CHECKPOINT_FILE_NAME)
+
+    def _load_checkpoint(self):
+        try:
+            with open(self._checkpoint_path(), encoding="utf-8") as checkpoint_file:
+                return json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_checkpoint(self, checkpoint):
+        path = self._checkpoint_path()
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as checkpoint_file:
+                json.dump(checkpoint, checkpoint_file)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            self._logger.error(f"Error saving import checkpoint: {e}")
+
+    def _update_status(self, **changes):
+        with self._lock:
+            self.status.update(changes)
+
+    def _update_source(self, source, progress):
+        with self._lock:
+            self.status["sources"][source] = dict(progress)
+
+    def _send_progress(self):
+        self.plugin._plugin_manager.send_plugin_message(self.plugin._identifier, dict(action="importProgress", status=self.get_status()))
@@ -0,0 +1,111 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import threading
+import time
+from collections import OrderedDict
+
+class HistoryPublisher():
+    """
+    Pushes compact history deltas to the open browser tabs over OctoPrint's
+    plugin message socket, so the history tab updates incrementally instead of
+    re-querying the list.
+
+    Three kinds of delta are sent: ``state`` (the active print started or
+    ended), ``print`` (a new history row, keyed by its print UUID) and
+    ``rollup`` (increments of a daily or monthly statistics bucket).
+
+    Deltas are coalesced by key while a message is pending: a later state
+    replaces the earlier one, row fields are merged and rollup increments are
+    summed. At most one ``historyUpdate`` message is sent every
+    ``min_interval`` seconds, and when more than ``max_updates`` deltas of a
+    kind pile up they are dropped and the kind is reported as ``stale``, so the
+    client refreshes it once instead of the socket being flooded.
+    """
+    def __init__(self, plugin, _logger, min_interval=1.0, max_updates=50):
+        self._logger = _logger
+        self.plugin = plugin
+        self.min_interval = min_interval
+        self.max_updates = max_updates
+        self._pending = OrderedDict()  # (type, key) -> update
+        self._stale = set()
+        self._timer = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        self.statistics = {"published": 0, "coalesced": 0, "messages": 0, "stale": 0}
+
+    def publish_state(self, state, **fields):
+        self._publish("state", None, dict(fields, state=state))
+
+    def publish_print(self, row):
+        self._publish("print", row["print_uuid"], row)
+
+    def publish_rollups(self, period, deltas):
+        """
+        ``deltas`` maps ``(printer_id, bucket)`` to the increments of the
+        rollup columns.
+        """
+        for (printer_id, bucket), delta in deltas.items():
+            self._publish("rollup", (period, printer_id, bucket),
+                          {"period": period, "printer_id": printer_id, "bucket": bucket, "delta": delta})
+
+    def _publish(self, kind, key, update):
+        with self._lock:
+            self.statistics["published"] += 1
+            if kind in self._stale:
+                # Already reported as stale, the client refreshes it as a whole
+                return
+
+            pending = self._pending.get((kind, key))
+            if pending is None:
+                self._pending[(kind, key)] = dict(update, type=kind)
+                if sum(1 for pending_kind, _ in self._pending if pending_kind == kind) > self.max_updates:
+                    self._stale.add(kind)
+                    for pending_key in [pending_key for pending_key in self._pending if pending_key[0] == kind]:
+                        del self._pending[pending_key]
+            else:
+                self.statistics["coalesced"] += 1
+                if kind == "rollup":
+                    for column, value in update["delta"].items():
+                        pending["delta"][column] = pending["delta"].get(column, 0) + value
+                else:
+                    pending.update(update)
+
+            if self._timer is None:
+                delay = max(0.0, self._last_flush + self.min_interval - time.monotonic())
+                self._timer = threading.Timer(delay, self._flush)
+                self._timer.name = "ExternalPrintHistory.Publisher"
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            updates = list(self._pending.values())
+            stale = sorted(self._stale)
+            self._pending = OrderedDict()
+            self._stale = set()
+            self._timer = None
+            self._last_flush = time.monotonic()
+            if not updates and not stale:
+                return
+            self.statistics["messages"] += 1
+            self.statistics["stale"] += len(stale)
+
+        try:
+            self.plugin._plugin_manager.send_plugin_message(self.plugin._identifier,
+                                                            dict(action="historyUpdate", updates=updates, stale=stale))
+        except Exception as e:
+            self._logger.error(f"Error pushing history updates: {e}")
+
+    def stop(self):
+        with self._lock:
+            timer = self._timer
+        if timer is not None:
+            timer.cancel()
+            self._flush()
+
+    def get_statistics(self):
+        with self._lock:
+            statistics = dict(self.statistics)
+            statistics["pending"] = len(self._pending)
+        return statistics
@@ -0,0 +1,126 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, from sub-millisecond dict lookups to slow remote queries
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "db_query_seconds": "Time spent in database operations.",
+    "db_connection_acquire_seconds": "Time spent waiting for a pooled database connection.",
+    "event_handler_seconds": "Time spent handling OctoPrint events.",
+    "plugin_check_seconds": "Time spent checking third-party plugin dependencies.",
+    "crypto_seconds": "Time spent encrypting, decrypting and deriving keys.",
+}
+
+PREFIX = "externalprinthistory_"
+
+class Histogram():
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry():
+    """
+    In-memory latency histograms rendered in the Prometheus text format.
+    Recording a sample is a bisect and three increments under a lock.
+    """
+    def __init__(self, _logger, buckets=DEFAULT_BUCKETS):
+        self._logger = _logger
+        self.buckets = buckets
+        self.slow_query_threshold = 0.0  # seconds, 0 disables the slow query log
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, labels=()):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_query(self, operation, seconds):
+        self.observe("db_query_seconds", seconds, (("operation", operation),))
+        if self.slow_query_threshold and seconds >= self.slow_query_threshold:
+            self._logger.warning(f"Slow database operation {operation}: {seconds * 1000:.1f} ms")
+
+    def render(self, values=None):
+        """
+        Prometheus text exposition of the histograms, plus ``values``:
+        ``{name: (type, help, value)}`` with type ``"counter"`` for monotonic
+        totals and ``"gauge"`` otherwise.
+        """
+        with self._lock:
+            snapshot = [(name, labels, list(histogram.counts), histogram.sum, histogram.count)
+                        for (name, labels), histogram in sorted(self._histograms.items())]
+
+        lines = []
+        described = set()
+        for name, labels, counts, total, count in snapshot:
+            metric = PREFIX + name
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {metric} {METRICS.get(name, name)}")
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{metric}_bucket{self._labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{metric}_sum{self._labels(labels)} {total}")
+            lines.append(f"{metric}_count{self._labels(labels)} {count}")
+
+        for name, (metric_type, description, value) in sorted((values or {}).items()):
+            if value is None:
+                continue
+            metric = PREFIX + name
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            lines.append(f"{metric} {float(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def _labels(self, labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def timed(name, **labels):
+    """
+    Decorator recording the duration of a method of a component holding
+    ``self.plugin`` into the plugin's metrics registry. Database operations
+    (``db_query_seconds``) also go through the slow query log.
+    """
+    label_items = tuple(sorted(labels.items()))
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                metrics = self.plugin.metrics
+                if name == "db_query_seconds":
+                    metrics.observe_query(labels.get("operation", method.__name__), elapsed)
+                else:
+                    metrics.observe(name, elapsed, label_items)
+        return wrapper
+    return decorator
@@ -2,94 +2,66 @@
 from __future__ import absolute_import
 
 import logging
-import semantic_version
 from ..common.PluginsKeys import PluginsKeys
+from .metrics import timed
 
 class PluginChecker():
     
     PLUGIN_DEPENDENCY_CHECK = "pluginCheckActivated"
 
+    # Plugin manager events after which the cached check result is stale
+    INVALIDATING_EVENTS = (
+        "plugin_pluginmanager_install_plugin",
+        "plugin_pluginmanager_uninstall_plugin",
+        "plugin_pluginmanager_enable_plugin",
+        "plugin_pluginmanager_disable_plugin",
+    )
+
     def __init__(self,plugin,_logger):
         self._logger = _logger
         self.plugin = plugin
-        self._pluginImplementation = None
-        self._preHeatPluginImplementationState = None
-        self._displayLayerProgressPluginImplementation = None
-        self._displayLayerProgressPluginImplementationState = None
-        self._ultimakerFormatPluginImplementation = None
-        self._ultimakerFormatPluginImplementationState = None
-        self._prusaSlicerThumbnailsPluginImplementation = None
-        self._prusaSlicerThumbnailsPluginImplementationState = None
-
+        self._pluginImplementations = {}
+        self._pluginStates = {}
+        self._missingMessage = None
+        self._comparableVersions = {}
+
+    def _invalidate(self):
+        self._missingMessage = None
+
+    def _sendMissingPluginsMessage(self):
+        """
+        Send the (cached) list of missing plugins to the connected clients.
+        """
+        if self._missingMessage is None:
+            self._checkAndLoadThirdPartyPluginInfos()
+        if self._missingMessage:
+            self.plugin._plugin_manager.send_plugin_message(self.plugin._identifier, dict(type="PluginCheck", message=self._missingMessage))
+
+    @timed("plugin_check_seconds")
     def _checkAndLoadThirdPartyPluginInfos(self):
-        pluginInfo = self._getPluginInformation(PluginsKeys.PLUGIN_PREHEAT)
-        self._preHeatPluginImplementationState = pluginInfo[0]
-        self._preHeatPluginImplementation = pluginInfo[1]
-        preHeatCurrentVersion = pluginInfo[2]
-        preHeatRequiredVersion = pluginInfo[3]
-
-        pluginInfo = self._getPluginInformation(PluginsKeys.PLUGIN_DISPLAY_LAYER_PROGRESS)
-        self._displayLayerProgressPluginImplementationState = pluginInfo[0]
-        self._displayLayerProgressPluginImplementation = pluginInfo[1]
-        displayLayerCurrentVersion = pluginInfo[2]
-        displayLayerRequiredVersion = pluginInfo[3]
-
-        pluginInfo = self._getPluginInformation(PluginsKeys.PLUGIN_ULTIMAKER_FORMAT_PACKAGE)
-        self._ultimakerFormatPluginImplementationState = pluginInfo[0]
-        self._ultimakerFormatPluginImplementation = pluginInfo[1]
-        ultimakerCurrentVersion = pluginInfo[2]
-        ultimakerRequiredVersion = pluginInfo[3]
-
-        pluginInfo = self._getPluginInformation(PluginsKeys.PLUGIN_PRUSA_SLICER_THUMNAIL)
-        self._prusaSlicerThumbnailsPluginImplementationState = pluginInfo[0]
-        self._prusaSlicerThumbnailsPluginImplementation = pluginInfo[1]
-        prusaSlicerCurrentVersion = pluginInfo[2]
-        prusaSlicerRequiredVersion = pluginInfo[3]
-
-        self._logger.info("Plugin-State information:\n"
-                            "| PreHeat=" + self._preHeatPluginImplementationState + " (" + str(preHeatCurrentVersion) + ")\n"
-                            "| DisplayLayerProgress=" + self._displayLayerProgressPluginImplementationState + " (" + str(displayLayerCurrentVersion) + ")\n"
-                            "| UltimakerFormat=" + self._ultimakerFormatPluginImplementationState + " (" + str(ultimakerCurrentVersion) + ")\n"
-                            "| PrusaSlicerThumbnail=" + self._prusaSlicerThumbnailsPluginImplementationState + " (" + str(prusaSlicerCurrentVersion) + ")\n"
-                            )
-            
-        if (self._preHeatPluginImplementation is None
-        or self._displayLayerProgressPluginImplementation is None
-        or self._ultimakerFormatPluginImplementation is None
-        or self._prusaSlicerThumbnailsPluginImplementation is None):
+        stateInformation = ""
+        missingMessage = ""
 
-            #self.plugin._settings.set([SettingsKeys.PLUGIN_DEPENDENCY_CHECK], True)
-            #self.plugin._settings.save()
-            
-            missingMessage = ""
-
-            if self._preHeatPluginImplementation is None:
-                missingMessage += (
-                    "<li><a target='_newTab' href='https://plugins.octoprint.org/plugins/preheat/'>"
-                    f"PreHeat Button ({preHeatRequiredVersion}+)</a> (<b>{self._preHeatPluginImplementationState}</b>)</li>"
-                )
+        for dependency in PluginsKeys.DEPENDENCIES:
+            state, implementation, currentVersion, requiredVersion = self._getPluginInformation(dependency)
+            self._pluginStates[dependency["key"]] = state
+            self._pluginImplementations[dependency["key"]] = implementation
 
-            if self._displayLayerProgressPluginImplementation is None:
+            stateInformation += f"| {dependency['key']}={state} ({currentVersion})\n"
+            if implementation is None:
                 missingMessage += (
-                    "<li><a target='_newTab' href='https://plugins.octoprint.org/plugins/DisplayLayerProgress/'>"
-                    f"DisplayLayerProgress ({displayLayerRequiredVersion}+)</a> (<b>{self._displayLayerProgressPluginImplementationState}</b>)</li>"
+                    f"<li><a target='_newTab' href='{dependency['url']}'>"
+                    f"{dependency['name']} ({requiredVersion}+)</a> (<b>{state}</b>)</li>"
                 )
 
-            if self._ultimakerFormatPluginImplementation is None:
-                missingMessage += (
-                    "<li><a target='_newTab' href='https://plugins.octoprint.org/plugins/UltimakerFormatPackage/'>"
-                    f"Cura Thumbnails ({ultimakerRequiredVersion}+)</a> (<b>{self._ultimakerFormatPluginImplementationState}</b>)</li>"
-                )
+        self._logger.info("Plugin-State information:\n" + stateInformation)
 
-            if self._prusaSlicerThumbnailsPluginImplementation is None:
-                missingMessage += (
-                    "<li><a target='_newTab' href='https://plugins.octoprint.org/plugins/prusaslicerthumbnails/'>"
-                    f"PrusaSlicer Thumbnails ({prusaSlicerRequiredVersion}+)</a> (<b>{self._prusaSlicerThumbnailsPluginImplementationState}</b>)</li>"
-                )
+        #self.plugin._settings.set([SettingsKeys.PLUGIN_DEPENDENCY_CHECK], True)
+        #self.plugin._settings.save()
 
-            if missingMessage != "":
-                missingMessage = f"<ul>{missingMessage}</ul>"
-                self.plugin._plugin_manager.send_plugin_message(self.plugin._identifier, dict(type="PluginCheck", message=missingMessage))
+        if missingMessage != "":
+            missingMessage = f"<ul>{missingMessage}</ul>"
+        self._missingMessage = missingMessage
 
             
     # get the plugin with status information
@@ -139,10 +111,13 @@ class PluginChecker():
         return [status, implementation, version, requiredVersion]
     
     def _get_comparable_version_semantic(self, version_string, force_base=True):
-        version = semantic_version.Version.coerce(version_string, partial=False)
-        if force_base:
-            version_string = "{}.{}.{}".format(version.major, version.minor, version.patch)
+        cacheKey = (version_string, force_base)
+        version = self._comparableVersions.get(cacheKey)
+        if version is None:
+            import semantic_version
             version = semantic_version.Version.coerce(version_string, partial=False)
+            if force_base:
+                version = semantic_version.Version(major=version.major, minor=version.minor, patch=version.patch)
+            self._comparableVersions[cacheKey] = version
 
         return version
-        
@@ -0,0 +1,153 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class PrintSpool():
+    """
+    Append-only SQLite journal of print records that have not reached the
+    database yet. Records are appended in groups, one transaction (and one
+    fsync) per group, and removed once they have been written to ``Print``.
+
+    Failed write attempts are counted per record; records the database keeps
+    rejecting are moved to a ``dead_letter`` table in the same file, where
+    they are kept for inspection instead of blocking the records after them.
+    """
+    FILE_NAME = "print_spool.db"
+
+    def __init__(self, _logger):
+        self._logger = _logger
+        self.path = None
+        self._connection = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._dead_letters = 0
+
+    def open(self, data_folder):
+        self.path = os.path.join(data_folder, self.FILE_NAME)
+        try:
+            self._connection = self._connect(self.path)
+        except sqlite3.Error as e:
+            self._logger.error(f"Error opening print spool {self.path}, falling back to memory: {e}")
+            self.path = None
+            self._connection = self._connect(":memory:")
+
+        self._pending = self._connection.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+        self._dead_letters = self._connection.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        if self._pending:
+            self._logger.info(f"Print spool has {self._pending} record(s) pending from a previous run")
+
+    def _connect(self, path):
+        connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=FULL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created REAL NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(spool)")]
+        if "attempts" not in columns:
+            # Spool written by an earlier version
+            connection.execute("ALTER TABLE spool ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY,
+                created REAL NOT NULL,
+                failed REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT,
+                payload TEXT NOT NULL
+            )
+        """)
+        return connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def append(self, records):
+        """
+        Durably append a group of records in a single transaction.
+        """
+        if not records:
+            return
+        now = time.time()
+        rows = [(now, json.dumps(record, default=str)) for record in records]
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany("INSERT INTO spool (created, payload) VALUES (?, ?)", rows)
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._pending += len(rows)
+
+    def peek(self, limit):
+        """
+        Return up to ``limit`` of the oldest records as ``(id, attempts, record)``.
+        """
+        with self._lock:
+            rows = self._connection.execute("SELECT id, attempts, payload FROM spool ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(spool_id, attempts, json.loads(payload)) for spool_id, attempts, payload in rows]
+
+    def remove_through(self, last_id):
+        with self._lock:
+            cursor = self._connection.execute("DELETE FROM spool WHERE id <= ?", (last_id,))
+            self._pending = max(0, self._pending - cursor.rowcount)
+
+    def add_attempt(self, first_id, last_id):
+        """
+        Count a failed write of the records ``first_id`` to ``last_id``.
+        Returns the highest attempt count among them.
+        """
+        with self._lock:
+            self._connection.execute("UPDATE spool SET attempts = attempts + 1 WHERE id BETWEEN ? AND ?", (first_id, last_id))
+            return self._connection.execute("SELECT MAX(attempts) FROM spool WHERE id BETWEEN ? AND ?",
+                                            (first_id, last_id)).fetchone()[0] or 0
+
+    def move_to_dead_letter(self, spool_id, error):
+        """
+        Take a record the database keeps rejecting out of the spool.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._connection.execute("""
+                    INSERT INTO dead_letter (id, created, failed, attempts, error, payload)
+                    SELECT id, created, ?, attempts, ?, payload FROM spool WHERE id = ?
+                """, (time.time(), str(error), spool_id))
+                self._connection.execute("DELETE FROM spool WHERE id = ?", (spool_id,))
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._pending = max(0, self._pending - cursor.rowcount)
+            self._dead_letters += cursor.rowcount
+
+    def pending(self):
+        return self._pending
+
+    def dead_letters(self):
+        return self._dead_letters
+
+    def size_bytes(self):
+        if self.path is None:
+            return 0
+        size = 0
+        for suffix in ("", "-wal"):
+            try:
+                size += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return size
@@ -0,0 +1,345 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import queue
+import threading
+import time
+from . import storage
+from .printSpool import PrintSpool
+
+class PrintWriter():
+    """
+    Write-behind queue for print records.
+
+    The event thread only enqueues; a background thread appends the queued
+    records to the on-disk spool in groups and replays the spool into the
+    database in batches, backing off exponentially while the database is
+    unreachable. A slow or unreachable database never stalls OctoPrint's
+    event delivery and records survive restarts.
+
+    In edge sync mode the spool is only pushed every ``sync_interval`` seconds,
+    over one connection kept open between syncs, so a fleet of instances
+    sharing a central database does not open a connection per finished print.
+
+    A batch failing with an error about its contents (a constraint violation,
+    a bad value), or whose records have failed ``max_attempts`` times, is
+    retried record by record; records that still fail are moved to the
+    spool's dead-letter table so the records after them are not blocked.
+    """
+    _STOP = object()
+    _WAKE = object()
+
+    def __init__(self, plugin, _logger, max_queue_size=1000, batch_size=100, linger=0.5,
+                 retry_delay=1.0, max_retry_delay=300.0, max_attempts=5):
+        self._logger = _logger
+        self.plugin = plugin
+        self.batch_size = batch_size
+        self.linger = linger
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.spool = PrintSpool(_logger)
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._delay = retry_delay
+        self._next_attempt = 0.0
+        self.edge_sync = False
+        self.sync_interval = 300.0
+        self._connection = None
+        self._reset_connection = False
+        self._statistics_lock = threading.Lock()
+        self.statistics = {
+            "enqueued": 0,
+            "spooled": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "failures": 0,
+            "last_latency": 0.0,
+            "max_latency": 0.0,
+            "total_latency": 0.0,
+            "replay_records": 0,
+            "replay_seconds": 0.0,
+            "last_replay_throughput": 0.0,
+            "syncs": 0,
+            "dead_lettered": 0,
+        }
+
+    def configure(self, edge_sync=False, sync_interval=300):
+        """
+        Switch between writing records as soon as possible and edge sync mode.
+        """
+        edge_sync = bool(edge_sync)
+        sync_interval = max(float(sync_interval or 0), 1.0)
+        if edge_sync == self.edge_sync and sync_interval == self.sync_interval:
+            return
+        self.edge_sync = edge_sync
+        self.sync_interval = sync_interval
+        self.wake()
+
+    def start(self):
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.spool.open(self.plugin.get_plugin_data_folder())
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="ExternalPrintHistory.PrintWriter", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop_event.set()
+        self._put_control(self._STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            # Still inside a write: it closes the spool itself once that returns
+            self._logger.warning("Print writer did not stop in time, leaving the spool to it")
+            return
+        self.spool.close()
+
+    def wake(self):
+        """
+        Retry the spool replay right away, e.g. after the connection was restored.
+        """
+        self._reset_connection = True
+        self._next_attempt = 0.0
+        self._delay = self.retry_delay
+        self._put_control(self._WAKE)
+
+    def enqueue(self, record):
+        """
+        Queue a print record (a dict of ``Print`` columns). Never blocks.
+        """
+        try:
+            self._queue.put_nowait((time.monotonic(), record))
+        except queue.Full:
+            with self._statistics_lock:
+                self.statistics["dropped"] += 1
+            self._logger.error("Print writer queue is full, dropping print record")
+            return False
+
+        with self._statistics_lock:
+            self.statistics["enqueued"] += 1
+        return True
+
+    def get_statistics(self):
+        with self._statistics_lock:
+            statistics = dict(self.statistics)
+        spooled = statistics["spooled"]
+        statistics["queue_depth"] = self._queue.qsize()
+        statistics["average_latency"] = statistics["total_latency"] / spooled if spooled else 0.0
+        statistics["spool_pending"] = self.spool.pending()
+        statistics["spool_bytes"] = self.spool.size_bytes()
+        statistics["dead_letters"] = self.spool.dead_letters()
+        statistics["replay_throughput"] = (statistics["replay_records"] / statistics["replay_seconds"]
+                                           if statistics["replay_seconds"] else 0.0)
+        statistics["running"] = self._thread is not None and self._thread.is_alive()
+        statistics["edge_sync"] = self.edge_sync
+        if self.edge_sync:
+            statistics["next_sync_in"] = max(0.0, self._next_attempt - time.monotonic())
+        return statistics
+
+    def _put_control(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        stop = False
+        while not stop:
+            timeout = None
+            if self.spool.pending():
+                timeout = max(0.0, self._next_attempt - time.monotonic())
+
+            batch, stop = self._take_batch(timeout)
+            if batch:
+                self._spool_batch(batch)
+
+            if self.spool.pending() and time.monotonic() >= self._next_attempt:
+                self._replay()
+
+        self._release_connection()
+        if self.spool.pending():
+            self._logger.info(f"Print writer stopped with {self.spool.pending()} record(s) left in the spool")
+        with self._thread_lock:
+            if self._thread is None:
+                # stop() gave up waiting and no new writer was started meanwhile
+                self.spool.close()
+
+    def _take_batch(self, timeout):
+        """
+        Wait up to ``timeout`` for the first record, then linger briefly to
+        pick up more so they are spooled with a single fsync.
+        """
+        batch = []
+        try:
+            item = self._queue.get(timeout=timeout) if timeout != 0.0 else self._queue.get_nowait()
+        except queue.Empty:
+            return batch, False
+        if item is self._STOP:
+            return batch, True
+        if item is self._WAKE:
+            return batch, False
+        batch.append(item)
+
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                return batch, True
+            if item is self._WAKE:
+                continue
+            batch.append(item)
+
+        return batch, False
+
+    def _spool_batch(self, batch):
+        try:
+            self.spool.append([record for _, record in batch])
+        except Exception as e:
+            with self._statistics_lock:
+                self.statistics["dropped"] += len(batch)
+            self._logger.error(f"Error spooling {len(batch)} print record(s): {e}")
+            return
+
+        now = time.monotonic()
+        with self._statistics_lock:
+            for enqueued_at, _ in batch:
+                latency = now - enqueued_at
+                self.statistics["total_latency"] += latency
+                self.statistics["last_latency"] = latency
+                if latency > self.statistics["max_latency"]:
+                    self.statistics["max_latency"] = latency
+            self.statistics["spooled"] += len(batch)
+
+    def _replay(self):
+        started = time.monotonic()
+        replayed = 0
+        while not self._stop_event.is_set():
+            rows = self.spool.peek(self.batch_size)
+            if not rows:
+                break
+            records = [record for _, _, record in rows]
+            try:
+                self.plugin.database_manager._insert_prints(records, self._get_connection())
+            except Exception as e:
+                self._release_connection(discard=True)
+                with self._statistics_lock:
+                    self.statistics["failures"] += 1
+                attempts = self.spool.add_attempt(rows[0][0], rows[-1][0])
+                if not isinstance(e, storage.TransientError) or attempts >= self.max_attempts:
+                    self._logger.error(f"Error replaying {len(records)} spooled print record(s), retrying them one by one: {e}")
+                    written, handled = self._replay_rows(rows)
+                    replayed += written
+                    if handled:
+                        continue
+                else:
+                    self._backoff(f"Error replaying {len(records)} spooled print record(s)", e)
+                break
+
+            self.spool.remove_through(rows[-1][0])
+            self._delay = self.retry_delay
+            replayed += len(records)
+            with self._statistics_lock:
+                self.statistics["written"] += len(records)
+                self.statistics["batches"] += 1
+
+        if self.edge_sync and self._delay == self.retry_delay:
+            self._next_attempt = time.monotonic() + self.sync_interval
+            with self._statistics_lock:
+                self.statistics["syncs"] += 1
+
+        if replayed:
+            elapsed = time.monotonic() - started
+            with self._statistics_lock:
+                self.statistics["replay_records"] += replayed
+                self.statistics["replay_seconds"] += elapsed
+                self.statistics["last_replay_throughput"] = replayed / elapsed if elapsed else 0.0
+
+    def _replay_rows(self, rows):
+        """
+        Write a failed batch one record at a time, in spool order. A record
+        rejected for its contents, or failing for the ``max_attempts``-th time
+        while the database is reachable, is moved to the dead-letter table.
+        Returns ``(records written, whether the whole batch was handled)``.
+        """
+        written = 0
+        for spool_id, _, record in rows:
+            try:
+                self.plugin.database_manager._insert_prints([record], self._get_connection())
+            except Exception as e:
+                self._release_connection(discard=True)
+                attempts = self.spool.add_attempt(spool_id, spool_id)
+                if isinstance(e, storage.TransientError) and (attempts < self.max_attempts or not self._database_reachable()):
+                    # The database, not the record: keep the order and wait
+                    self._backoff(f"Error replaying spooled print record {spool_id}", e)
+                    return written, False
+                self.spool.move_to_dead_letter(spool_id, e)
+                with self._statistics_lock:
+                    self.statistics["dead_lettered"] += 1
+                self._logger.error(f"Moved spooled print record {spool_id} to the dead-letter table after {attempts} attempt(s): {e}")
+                continue
+
+            self.spool.remove_through(spool_id)
+            written += 1
+            with self._statistics_lock:
+                self.statistics["written"] += 1
+                self.statistics["batches"] += 1
+        self._delay = self.retry_delay
+        return written, True
+
+    def _backoff(self, message, error):
+        self._next_attempt = time.monotonic() + self._delay
+        self._logger.error(f"{message}, retrying in {self._delay:.0f}s: {error}")
+        self._delay = min(self._delay * 2, self.max_retry_delay)
+
+    def _database_reachable(self):
+        database_manager = self.plugin.database_manager
+        try:
+            connection = database_manager.get_connection()
+        except Exception:
+            return False
+        try:
+            database_manager.backend.ping(connection)
+            reachable = True
+        except Exception:
+            reachable = False
+        database_manager.release_connection(connection, not reachable)
+        return reachable
+
+    def _get_connection(self):
+        """
+        Connection for the next batch: the persistent one in edge sync mode,
+        None to borrow one from the pool per batch otherwise.
+        """
+        if self._reset_connection:
+            self._reset_connection = False
+            self._release_connection(discard=True)
+        if not self.edge_sync:
+            self._release_connection()
+            return None
+
+        database_manager = self.plugin.database_manager
+        if self._connection is not None:
+            try:
+                database_manager.backend.ping(self._connection)
+            except Exception:
+                self._release_connection(discard=True)
+        if self._connection is None:
+            self._connection = database_manager.get_connection()
+        return self._connection
+
+    def _release_connection(self, discard=False):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self.plugin.database_manager.release_connection(connection, discard)
@@ -0,0 +1,40 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import os
+import sqlite3
+from .storageBackend import StorageBackend, StorageError
+from .mysqlBackend import MySQLBackend
+from .sqliteBackend import SQLiteBackend
+from .migrations import SchemaMigrator
+
+BACKENDS = {
+    MySQLBackend.name: MySQLBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+# Errors raised by any of the backends' drivers. Drivers are imported on first
+# use, so their errors are added when they are loaded (see register_errors);
+# catch it as ``storage.DatabaseError`` to always see the current tuple.
+DatabaseError = (StorageError, sqlite3.Error)
+
+# The subset that says nothing about the statement itself (server gone, pool
+# exhausted, lock timeouts): retrying the same write later may succeed
+TransientError = (StorageError, sqlite3.OperationalError)
+
+def register_errors(*errors, transient=()):
+    global DatabaseError, TransientError
+    DatabaseError = DatabaseError + tuple(error for error in errors if error not in DatabaseError)
+    TransientError = TransientError + tuple(error for error in transient if error not in TransientError)
+
+def create_backend(name, settings, data_folder, _logger):
+    """
+    Instantiate the backend selected in the settings.
+    """
+    backend_class = BACKENDS.get(name or MySQLBackend.name)
+    if backend_class is None:
+        raise StorageError(f"Unknown storage backend: {name}")
+
+    if backend_class is SQLiteBackend and not settings.get("path"):
+        settings = dict(settings, path=os.path.join(data_folder, SQLiteBackend.DEFAULT_FILE_NAME))
+    return backend_class(settings, _logger)
@@ -0,0 +1,174 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from .schema import TABLES, get_table
+
+class Migration():
+    def __init__(self, version, description, apply):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+def _add_columns(table_name, column_names):
+    """
+    Migration step adding the columns of ``table_name`` that are missing,
+    defined as in the current schema.
+    """
+    def apply(migrator, cursor):
+        table = get_table(table_name)
+        existing = migrator.backend.table_columns(cursor, table_name)
+        for column in table.columns:
+            if column.name in column_names and column.name not in existing:
+                migrator.backend.add_column(cursor, table_name, column)
+    return apply
+
+
+def _modify_columns(table_name, column_names):
+    """
+    Migration step redefining existing columns as in the current schema.
+    """
+    def apply(migrator, cursor):
+        for column in get_table(table_name).columns:
+            if column.name in column_names:
+                migrator.backend.modify_column(cursor, table_name, column)
+    return apply
+
+
+def _add_indexes(table_name, index_names):
+    def apply(migrator, cursor):
+        backend = migrator.backend
+        existing = backend.table_indexes(cursor, table_name)
+        for index in get_table(table_name).indexes:
+            if index.name in index_names and backend.index_name(table_name, index) not in existing:
+                backend.add_index(cursor, table_name, index)
+    return apply
+
+
+def _backfill_print_uuids(migrator, cursor):
+    """
+    Give the prints stored before records carried a UUID one, a batch per
+    transaction so the table is never locked for long.
+    """
+    _add_columns("Print", ["print_uuid"])(migrator, cursor)
+    while True:
+        cursor.execute(f"SELECT print_id FROM Print WHERE print_uuid IS NULL LIMIT {migrator.batch_size}")
+        print_ids = [row[0] for row in cursor.fetchall()]
+        if not print_ids:
+            break
+        cursor.executemany("UPDATE Print SET print_uuid = %s WHERE print_id = %s",
+                           [(str(uuid.uuid4()), print_id) for print_id in print_ids])
+        migrator.connection.commit()
+    _add_indexes("Print", ["print_uuid"])(migrator, cursor)
+
+
+def _drop_print_procedure(migrator, cursor):
+    """
+    Prints are written with batched upserts, the procedure tabla.sql used to
+    create is no longer called.
+    """
+    if migrator.backend.name == "mysql":
+        cursor.execute("DROP PROCEDURE IF EXISTS insert_or_update_print")
+
+
+# Ordered schema changes for databases created by earlier versions. Every step
+# checks what exists, so it is a no-op on a database created from the current schema.
+MIGRATIONS = [
+    Migration(1, "Printer cost columns",
+              _add_columns("Printer", ["purchase_price", "estimated_lifespan", "maintenance_costs"])),
+    Migration(2, "Print file and thumbnail columns",
+              _add_columns("Print", ["thumbnail_hash", "file_name", "file_path"])),
+    Migration(3, "Print history indexes",
+              _add_indexes("Print", ["idx_print_history", "idx_print_history_state", "idx_print_history_file", "thumbnail_hash"])),
+    Migration(4, "Client generated print UUIDs", _backfill_print_uuids),
+    Migration(5, "Drop the insert_or_update_print procedure", _drop_print_procedure),
+    Migration(6, "Print history state sort index", _add_indexes("Print", ["idx_print_history_by_state"])),
+    Migration(7, "Printer lifespan in fractional hours", _modify_columns("Printer", ["estimated_lifespan"])),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+class SchemaMigrator():
+    """
+    Brings a database up to the current schema: creates the missing tables and
+    applies the pending migrations in order, recording each one in the
+    SchemaVersion table.
+
+    Databases known to be current are remembered in a state file in the plugin
+    data folder, so later startups skip the check entirely.
+    """
+    STATE_FILE_NAME = "schema_versions.json"
+    # Keyed by a digest that included the database password
+    LEGACY_STATE_FILE_NAME = "schema_state.json"
+
+    def __init__(self, backend, _logger, data_folder, batch_size=1000):
+        self._logger = _logger
+        self.backend = backend
+        self.state_path = os.path.join(data_folder, self.STATE_FILE_NAME)
+        self.legacy_state_path = os.path.join(data_folder, self.LEGACY_STATE_FILE_NAME)
+        self.batch_size = batch_size
+        self.connection = None
+
+    def is_current(self):
+        return self._load_state().get(self._fingerprint()) == LATEST_VERSION
+
+    def migrate(self, connection):
+        """
+        Returns the list of migrations applied.
+        """
+        if self.is_current():
+            return []
+
+        self.connection = connection
+        applied = []
+        with connection.cursor() as cursor:
+            existing = self.backend.existing_tables(cursor)
+            missing = [table for table in TABLES if table.name not in existing]
+            fresh = "Print" not in existing
+            if missing:
+                self.backend.create_schema(connection, missing)
+
+            cursor.execute("SELECT MAX(version) FROM SchemaVersion")
+            current = cursor.fetchone()[0] or 0
+            for migration in MIGRATIONS:
+                if migration.version <= current:
+                    continue
+                if not fresh:
+                    self._logger.info(f"Applying schema migration {migration.version}: {migration.description}")
+                    migration.apply(self, cursor)
+                cursor.execute("INSERT INTO SchemaVersion (version, description, applied_at) VALUES (%s, %s, %s)",
+                               (migration.version, migration.description,
+                                datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)))
+                connection.commit()
+                applied.append(migration.version)
+
+        state = self._load_state()
+        state[self._fingerprint()] = LATEST_VERSION
+        self._save_state(state)
+        return applied
+
+    def _fingerprint(self):
+        return hashlib.sha256(repr(self.backend.target()).encode()).hexdigest()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        try:
+            with open(self.state_path + ".tmp", "w", encoding="utf-8") as state_file:
+                json.dump(state, state_file)
+            os.replace(self.state_path + ".tmp", self.state_path)
+            if os.path.exists(self.legacy_state_path):
+                os.remove(self.legacy_state_path)
+        except OSError as e:
+            self._logger.error(f"Error saving schema state: {e}")
@@ -0,0 +1,140 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+from .storageBackend import StorageBackend
+
+pymysql = None
+
+def _load_driver():
+    """
+    Import pymysql on first use, so an unconfigured or SQLite setup never
+    pays for loading it.
+    """
+    global pymysql
+    if pymysql is None:
+        import pymysql as driver
+        import pymysql.cursors
+        from . import register_errors
+        register_errors(driver.MySQLError, transient=(driver.OperationalError, driver.InterfaceError))
+        pymysql = driver
+    return pymysql
+
+
+class MySQLBackend(StorageBackend):
+    """
+    Central MySQL/MariaDB server accessed through pymysql.
+    """
+    name = "mysql"
+    TARGET_SETTINGS = ("host", "port", "database")
+    # Placeholders of a prepared statement
+    MAX_VARIABLES = 65535
+
+    def connect(self):
+        return _load_driver().connect(**self.settings)
+
+    def ping(self, connection):
+        connection.ping(reconnect=False)
+
+    def is_open(self, connection):
+        return connection.open
+
+    def streaming_cursor(self, connection):
+        return connection.cursor(_load_driver().cursors.SSCursor)
+
+    def schema_statements(self, tables):
+        statements = []
+        for table in tables:
+            definitions = [self._column_sql(column) for column in table.columns]
+            definitions.append(f"PRIMARY KEY ({self._columns_sql(table.primary_key)})")
+            for index in table.indexes:
+                key = "UNIQUE KEY" if index.unique else "KEY"
+                definitions.append(f"{key} {self.quote(index.name)} ({self._columns_sql(index.columns)})")
+            for foreign_key in table.foreign_keys:
+                definitions.append(self._foreign_key_sql(foreign_key))
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS {self.quote(table.name)} (\n  " + ",\n  ".join(definitions) + "\n)"
+                " ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci"
+            )
+        return statements
+
+    def _column_sql(self, column):
+        sql = f"{self.quote(column.name)} {self.column_type(column)}"
+        if column.not_null:
+            sql += " NOT NULL"
+        if column.auto_increment:
+            sql += " AUTO_INCREMENT"
+        elif column.default is not None:
+            sql += f" DEFAULT {column.default}"
+        elif not column.not_null:
+            sql += " DEFAULT NULL"
+        return sql
+
+    def _columns_sql(self, columns):
+        return ",".join(self.quote(column) for column in columns)
+
+    def existing_tables(self, cursor):
+        cursor.execute("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+        return set(row[0] for row in cursor.fetchall())
+
+    def table_columns(self, cursor, table):
+        cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        return set(row[0] for row in cursor.fetchall())
+
+    def table_indexes(self, cursor, table):
+        cursor.execute("""
+            SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        return set(row[0] for row in cursor.fetchall())
+
+    def add_column(self, cursor, table, column):
+        self._alter(cursor, f"ALTER TABLE {self.quote(table)} ADD COLUMN {self._column_sql(column)}")
+
+    def add_index(self, cursor, table, index):
+        key = "UNIQUE INDEX" if index.unique else "INDEX"
+        self._alter(cursor, f"ALTER TABLE {self.quote(table)} ADD {key} {self.quote(index.name)} ({self._columns_sql(index.columns)})")
+
+    def modify_column(self, cursor, table, column):
+        # A type change copies the table, it cannot be done in place
+        cursor.execute(f"ALTER TABLE {self.quote(table)} MODIFY COLUMN {self._column_sql(column)}")
+
+    def _alter(self, cursor, statement):
+        try:
+            # Online DDL: reads and writes on the table continue while it is altered
+            cursor.execute(statement + ", ALGORITHM=INPLACE, LOCK=NONE")
+        except _load_driver().MySQLError as e:
+            self._logger.warning(f"Online schema change not supported, falling back to a locking one: {e}")
+            cursor.execute(statement)
+
+    def _foreign_key_sql(self, foreign_key):
+        sql = (f"CONSTRAINT {self.quote(foreign_key.name)} FOREIGN KEY ({self._columns_sql(foreign_key.columns)})"
+               f" REFERENCES {self.quote(foreign_key.table)} ({self._columns_sql(foreign_key.references)})")
+        if foreign_key.on_delete:
+            sql += f" ON DELETE {foreign_key.on_delete}"
+        return sql
+
+    def upsert_sql(self, table, columns, key_columns, updates, row_count=1, guard=None):
+        assignments = []
+        # Assignments see the columns already assigned, the guard column goes last
+        for column, mode in sorted(updates.items(), key=lambda update: guard is not None and update[0] == guard[0]):
+            if mode == "add":
+                value = f"{column} + VALUES({column})"
+            else:
+                value = f"VALUES({column})"
+            if guard is not None:
+                value = f"IF({guard[0]} = {self.literal_sql(guard[1])}, {value}, {column})"
+            assignments.append(f"{column} = {value}")
+        return (f"INSERT INTO {self.quote(table)} ({', '.join(columns)})"
+                f" VALUES {self.values_sql(len(columns), row_count)}"
+                f" ON DUPLICATE KEY UPDATE {', '.join(assignments)}")
+
+    def insert_ignore_sql(self, table, columns, row_count=1):
+        return (f"INSERT IGNORE INTO {self.quote(table)} ({', '.join(columns)})"
+                f" VALUES {self.values_sql(len(columns), row_count)}")
+
+    def was_inserted(self, cursor, explicit_key):
+        # Affected rows: 1 for an inserted row, 2 for an updated one, 0 if nothing changed
+        return cursor.rowcount == 1
@@ -0,0 +1,191 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+class Column():
+    def __init__(self, name, type, not_null=False, default=None, auto_increment=False):
+        self.name = name
+        self.type = type
+        self.not_null = not_null or auto_increment
+        self.default = default
+        self.auto_increment = auto_increment
+
+
+class Index():
+    def __init__(self, name, columns, unique=False):
+        self.name = name
+        self.columns = columns
+        self.unique = unique
+
+
+class ForeignKey():
+    def __init__(self, name, columns, table, references, on_delete=None):
+        self.name = name
+        self.columns = columns
+        self.table = table
+        self.references = references
+        self.on_delete = on_delete
+
+
+class Table():
+    def __init__(self, name, columns, primary_key, indexes=(), foreign_keys=()):
+        self.name = name
+        self.columns = columns
+        self.primary_key = primary_key
+        self.indexes = list(indexes)
+        self.foreign_keys = list(foreign_keys)
+
+
+def _stats_table(name, period):
+    return Table(name, [
+        Column("printer_id", "int(11)", not_null=True),
+        Column(period, "date", not_null=True),
+        Column("print_count", "int(11)", not_null=True, default=0),
+        Column("failed_count", "int(11)", not_null=True, default=0),
+        Column("print_seconds", "bigint(20)", not_null=True, default=0),
+        Column("filament_length", "decimal(14,2)", not_null=True, default=0),
+        Column("filament_weight", "decimal(14,2)", not_null=True, default=0),
+        Column("energy_kwh", "decimal(14,4)", not_null=True, default=0),
+        Column("electricity_cost", "decimal(14,4)", not_null=True, default=0),
+        Column("depreciation", "decimal(14,4)", not_null=True, default=0),
+    ], ["printer_id", period],
+        foreign_keys=[ForeignKey(f"{name}_ibfk_1", ["printer_id"], "Printer", ["printer_id"])])
+
+
+# Schema shared by every storage backend, in creation order (referenced tables first).
+# Types are written in MySQL syntax; each backend maps them to its own types.
+TABLES = [
+    Table("Customer", [
+        Column("customer_id", "int(11)", auto_increment=True),
+        Column("name", "varchar(100)"),
+        Column("email", "varchar(100)"),
+        Column("phone", "varchar(20)"),
+        Column("address", "varchar(255)"),
+    ], ["customer_id"]),
+
+    Table("Design", [
+        Column("design_id", "int(11)", auto_increment=True),
+        Column("name", "varchar(100)"),
+        Column("description", "text"),
+        Column("model_file", "blob"),
+        Column("model_url", "varchar(255)"),
+        Column("license", "varchar(50)"),
+        Column("website", "varchar(255)"),
+    ], ["design_id"]),
+
+    Table("Printer", [
+        Column("printer_id", "int(11)", auto_increment=True),
+        Column("brand", "varchar(100)"),
+        Column("model", "varchar(100)"),
+        Column("name", "varchar(100)"),
+        Column("status", "varchar(50)"),
+        Column("power_consumption", "decimal(10,2)"),
+        Column("purchase_price", "decimal(10,2)"),
+        Column("estimated_lifespan", "decimal(10,2)"),
+        Column("maintenance_costs", "decimal(10,2)"),
+    ], ["printer_id"]),
+
+    Table("Maintenance", [
+        Column("maintenance_id", "int(11)", auto_increment=True),
+        Column("printer_id", "int(11)"),
+        Column("subject", "varchar(100)"),
+        Column("description", "text"),
+        Column("cost", "decimal(10,2)"),
+    ], ["maintenance_id"],
+        indexes=[Index("printer_id", ["printer_id"])],
+        foreign_keys=[ForeignKey("Maintenance_ibfk_1", ["printer_id"], "Printer", ["printer_id"])]),
+
+    Table("Order", [
+        Column("order_id", "int(11)", auto_increment=True),
+        Column("customer_id", "int(11)"),
+        Column("order_date", "date"),
+        Column("status", "varchar(50)"),
+        Column("delivery_date", "date"),
+        Column("name", "varchar(100)"),
+    ], ["order_id"],
+        indexes=[Index("customer_id", ["customer_id"])],
+        foreign_keys=[ForeignKey("Order_ibfk_1", ["customer_id"], "Customer", ["customer_id"])]),
+
+    Table("Thumbnail", [
+        Column("thumbnail_hash", "char(64)", not_null=True),
+        Column("content_type", "varchar(50)"),
+        Column("size", "int(11)"),
+        Column("image", "mediumblob"),
+    ], ["thumbnail_hash"]),
+
+    Table("Print", [
+        Column("print_id", "int(11)", auto_increment=True),
+        Column("order_id", "int(11)"),
+        Column("printer_id", "int(11)"),
+        Column("filament_id", "int(11)"),
+        Column("start_datetime", "datetime"),
+        Column("end_datetime", "datetime"),
+        Column("duration", "int(11)"),
+        Column("estimated_time", "int(11)"),
+        Column("thumbnail_hash", "char(64)"),
+        Column("calculated_length", "decimal(10,2)"),
+        Column("total_length", "decimal(10,2)"),
+        Column("calculated_height", "decimal(10,2)"),
+        Column("total_height", "decimal(10,2)"),
+        Column("calculated_layers", "int(11)"),
+        Column("total_layers", "int(11)"),
+        Column("calculated_weight", "decimal(10,2)"),
+        Column("total_weight", "decimal(10,2)"),
+        Column("nozzle_temperature", "decimal(5,2)"),
+        Column("bed_temperature", "decimal(5,2)"),
+        Column("bed_type", "varchar(50)"),
+        Column("nozzle_diameter", "decimal(5,2)"),
+        Column("state", "varchar(50)"),
+        Column("file_name", "varchar(255)"),
+        Column("file_path", "varchar(255)"),
+        Column("print_uuid", "char(36)"),
+    ], ["print_id"],
+        indexes=[
+            Index("printer_id", ["printer_id"]),
+            Index("fk_order", ["order_id"]),
+            Index("idx_print_history", ["printer_id", "start_datetime", "print_id"]),
+            Index("idx_print_history_state", ["printer_id", "state", "start_datetime", "print_id"]),
+            Index("idx_print_history_file", ["printer_id", "file_name", "print_id"]),
+            Index("idx_print_history_by_state", ["printer_id", "state", "print_id"]),
+            Index("thumbnail_hash", ["thumbnail_hash"]),
+            Index("print_uuid", ["print_uuid"], unique=True),
+        ],
+        foreign_keys=[
+            ForeignKey("Print_ibfk_1", ["order_id"], "Order", ["order_id"]),
+            ForeignKey("Print_ibfk_2", ["printer_id"], "Printer", ["printer_id"]),
+            ForeignKey("Print_ibfk_3", ["thumbnail_hash"], "Thumbnail", ["thumbnail_hash"]),
+        ]),
+
+    Table("PrintTelemetry", [
+        Column("print_id", "int(11)", not_null=True),
+        Column("sample_count", "int(11)", not_null=True),
+        Column("data", "mediumblob", not_null=True),
+    ], ["print_id"],
+        foreign_keys=[ForeignKey("PrintTelemetry_ibfk_1", ["print_id"], "Print", ["print_id"], on_delete="CASCADE")]),
+
+    Table("Print_Design", [
+        Column("print_id", "int(11)", not_null=True),
+        Column("design_id", "int(11)", not_null=True),
+    ], ["print_id", "design_id"],
+        indexes=[Index("design_id", ["design_id"])],
+        foreign_keys=[
+            ForeignKey("Print_Design_ibfk_1", ["print_id"], "Print", ["print_id"]),
+            ForeignKey("Print_Design_ibfk_2", ["design_id"], "Design", ["design_id"]),
+        ]),
+]
+
+TABLES.extend([
+    _stats_table("PrinterStatsDaily", "day"),
+    _stats_table("PrinterStatsMonthly", "month"),
+    Table("SchemaVersion", [
+        Column("version", "int(11)", not_null=True),
+        Column("description", "varchar(255)"),
+        Column("applied_at", "datetime"),
+    ], ["version"]),
+])
+
+
+def get_table(name):
+    for table in TABLES:
+        if table.name == name:
+            return table
+    raise KeyError(name)
@@ -0,0 +1,207 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from .storageBackend import StorageBackend
+
+def _adapt(params):
+    # Store dates as text sorting like MySQL's and decimals as REAL, without
+    # registering process-wide sqlite3 adapters
+    adapted = []
+    for value in params:
+        if isinstance(value, datetime):
+            value = value.strftime("%Y-%m-%d %H:%M:%S")
+        elif isinstance(value, date):
+            value = value.strftime("%Y-%m-%d")
+        elif isinstance(value, Decimal):
+            value = float(value)
+        adapted.append(value)
+    return adapted
+
+
+class SQLiteCursor(sqlite3.Cursor):
+    """
+    Cursor accepting the ``%s`` placeholders used by the shared queries and
+    usable as a context manager like pymysql's.
+    """
+    def execute(self, query, params=()):
+        return sqlite3.Cursor.execute(self, query.replace("%s", "?"), _adapt(params))
+
+    def executemany(self, query, params):
+        return sqlite3.Cursor.executemany(self, query.replace("%s", "?"), [_adapt(row) for row in params])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SQLiteConnection(sqlite3.Connection):
+    open = True
+
+    def cursor(self, factory=SQLiteCursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+    def close(self):
+        self.open = False
+        sqlite3.Connection.close(self)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded SQLite database in WAL mode for standalone installs. Statements
+    are compiled once per connection and reused from sqlite3's statement cache;
+    ``PRAGMA optimize`` runs periodically when connections are released.
+    """
+    name = "sqlite"
+    TARGET_SETTINGS = ("path",)
+    # SQLITE_MAX_VARIABLE_NUMBER, raised from 999 in SQLite 3.32
+    MAX_VARIABLES = 999 if sqlite3.sqlite_version_info < (3, 32, 0) else 32766
+    DEFAULT_FILE_NAME = "print_history.db"
+
+    def __init__(self, settings, _logger, optimize_interval=3600):
+        StorageBackend.__init__(self, settings, _logger)
+        self.path = self.settings["path"]
+        self.optimize_interval = optimize_interval
+        self._last_optimize = time.monotonic()
+        self._optimize_lock = threading.Lock()
+
+    def connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                     cached_statements=256, factory=SQLiteConnection)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+
+    def ping(self, connection):
+        connection.execute("SELECT 1")
+
+    def is_open(self, connection):
+        return connection.open
+
+    def on_release(self, connection):
+        now = time.monotonic()
+        if now - self._last_optimize < self.optimize_interval:
+            return
+        with self._optimize_lock:
+            if now - self._last_optimize < self.optimize_interval:
+                return
+            self._last_optimize = now
+        try:
+            connection.execute("PRAGMA optimize")
+        except sqlite3.Error as e:
+            self._logger.error("Error optimizing SQLite database: " + str(e))
+
+    def quote(self, name):
+        return f'"{name}"'
+
+    def column_type(self, column):
+        column_type = column.type.lower()
+        if column_type.startswith(("int", "bigint", "tinyint")):
+            return "INTEGER"
+        if column_type.startswith("decimal"):
+            return "NUMERIC"
+        if column_type.endswith("blob"):
+            return "BLOB"
+        return "TEXT"
+
+    def schema_statements(self, tables):
+        statements = []
+        for table in tables:
+            definitions = [self._column_sql(column) for column in table.columns]
+            if not any(column.auto_increment for column in table.columns):
+                definitions.append(f"PRIMARY KEY ({self._columns_sql(table.primary_key)})")
+            for foreign_key in table.foreign_keys:
+                sql = (f"FOREIGN KEY ({self._columns_sql(foreign_key.columns)})"
+                       f" REFERENCES {self.quote(foreign_key.table)} ({self._columns_sql(foreign_key.references)})")
+                if foreign_key.on_delete:
+                    sql += f" ON DELETE {foreign_key.on_delete}"
+                definitions.append(sql)
+            statements.append(f"CREATE TABLE IF NOT EXISTS {self.quote(table.name)} (\n  " + ",\n  ".join(definitions) + "\n)")
+
+            for index in table.indexes:
+                statements.append(self._index_sql(table.name, index))
+        return statements
+
+    def _column_sql(self, column):
+        if column.auto_increment:
+            return f"{self.quote(column.name)} INTEGER PRIMARY KEY AUTOINCREMENT"
+        sql = f"{self.quote(column.name)} {self.column_type(column)}"
+        if column.not_null:
+            sql += " NOT NULL"
+        if column.default is not None:
+            sql += f" DEFAULT {column.default}"
+        return sql
+
+    def _index_sql(self, table, index):
+        unique = "UNIQUE " if index.unique else ""
+        return (f"CREATE {unique}INDEX IF NOT EXISTS {self.quote(self.index_name(table, index))}"
+                f" ON {self.quote(table)} ({self._columns_sql(index.columns)})")
+
+    def _columns_sql(self, columns):
+        return ", ".join(self.quote(column) for column in columns)
+
+    def index_name(self, table, index):
+        # SQLite index names are global to the database
+        return f"{table}_{index.name}"
+
+    def existing_tables(self, cursor):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        return set(row[0] for row in cursor.fetchall())
+
+    def table_columns(self, cursor, table):
+        cursor.execute(f"PRAGMA table_info({self.quote(table)})")
+        return set(row[1] for row in cursor.fetchall())
+
+    def table_indexes(self, cursor, table):
+        cursor.execute(f"PRAGMA index_list({self.quote(table)})")
+        return set(row[1] for row in cursor.fetchall())
+
+    def add_column(self, cursor, table, column):
+        # Adding a nullable column only rewrites the table definition, not the rows
+        cursor.execute(f"ALTER TABLE {self.quote(table)} ADD COLUMN {self._column_sql(column)}")
+
+    def add_index(self, cursor, table, index):
+        cursor.execute(self._index_sql(table, index))
+
+    def modify_column(self, cursor, table, column):
+        # Declared types are only affinities: int and decimal columns both
+        # have NUMERIC affinity and store any number, nothing to change
+        pass
+
+    def floor_division_sql(self, expression, divisor):
+        # Integer division truncates towards zero and FLOOR() is not always compiled in
+        divisor = int(divisor)
+        return f"(({expression}) / {divisor} - (({expression}) % {divisor} < 0))"
+
+    def upsert_sql(self, table, columns, key_columns, updates, row_count=1, guard=None):
+        assignments = []
+        for column, mode in updates.items():
+            if mode == "add":
+                assignments.append(f"{column} = {self.quote(table)}.{column} + excluded.{column}")
+            else:
+                assignments.append(f"{column} = excluded.{column}")
+        # Every assignment and the WHERE see the stored row
+        condition = f" WHERE {self.quote(table)}.{guard[0]} = {self.literal_sql(guard[1])}" if guard is not None else ""
+        return (f"INSERT INTO {self.quote(table)} ({', '.join(columns)})"
+                f" VALUES {self.values_sql(len(columns), row_count)}"
+                f" ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {', '.join(assignments)}{condition}")
+
+    def insert_ignore_sql(self, table, columns, row_count=1):
+        return (f"INSERT OR IGNORE INTO {self.quote(table)} ({', '.join(columns)})"
+                f" VALUES {self.values_sql(len(columns), row_count)}")
+
+    def was_inserted(self, cursor, explicit_key):
+        # SQLite reports one changed row either way; without an explicit key
+        # the conflict target cannot match, so the row must be new
+        return not explicit_key
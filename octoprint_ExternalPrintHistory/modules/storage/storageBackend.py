@@ -0,0 +1,139 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+from .schema import TABLES
+
+class StorageError(Exception):
+    pass
+
+
+class StorageBackend():
+    """
+    Interface every storage backend implements: opening and checking
+    connections, creating the shared schema and rendering the few statements
+    whose syntax differs between databases. Queries use ``%s`` placeholders.
+    """
+    name = None
+    # Settings that tell databases apart, credentials excluded
+    TARGET_SETTINGS = ()
+    # Most parameters one statement may bind, None when unbounded
+    MAX_VARIABLES = None
+
+    def __init__(self, settings, _logger):
+        self._logger = _logger
+        self.settings = dict(settings)
+
+    def identity(self):
+        """
+        Value that changes whenever a different database is targeted.
+        """
+        return (self.name, tuple(sorted(self.settings.items())))
+
+    def target(self):
+        """
+        Value naming the targeted database without its credentials, for keys
+        that are written to disk.
+        """
+        return (self.name,) + tuple(self.settings.get(key) for key in self.TARGET_SETTINGS)
+
+    def connect(self):
+        raise NotImplementedError()
+
+    def ping(self, connection):
+        raise NotImplementedError()
+
+    def is_open(self, connection):
+        raise NotImplementedError()
+
+    def on_release(self, connection):
+        """
+        Called when a connection goes back to the pool, for periodic housekeeping.
+        """
+        pass
+
+    def streaming_cursor(self, connection):
+        """
+        Cursor that fetches rows from the server as they are read instead of
+        buffering the whole result set.
+        """
+        return connection.cursor()
+
+    def test(self):
+        connection = self.connect()
+        try:
+            self.ping(connection)
+        finally:
+            connection.close()
+
+    ###################################################################
+    ##################### SCHEMA ######################################
+    ###################################################################
+    def quote(self, name):
+        return f"`{name}`"
+
+    def column_type(self, column):
+        return column.type
+
+    def schema_statements(self, tables=TABLES):
+        raise NotImplementedError()
+
+    def index_name(self, table, index):
+        return index.name
+
+    def existing_tables(self, cursor):
+        raise NotImplementedError()
+
+    def table_columns(self, cursor, table):
+        raise NotImplementedError()
+
+    def table_indexes(self, cursor, table):
+        raise NotImplementedError()
+
+    def add_column(self, cursor, table, column):
+        raise NotImplementedError()
+
+    def add_index(self, cursor, table, index):
+        raise NotImplementedError()
+
+    def modify_column(self, cursor, table, column):
+        raise NotImplementedError()
+
+    def create_schema(self, connection, tables=TABLES):
+        with connection.cursor() as cursor:
+            for statement in self.schema_statements(tables):
+                cursor.execute(statement)
+        connection.commit()
+
+    ###################################################################
+    ##################### DIALECT #####################################
+    ###################################################################
+    def values_sql(self, column_count, row_count=1):
+        row_placeholder = "(" + ", ".join(["%s"] * column_count) + ")"
+        return ", ".join([row_placeholder] * row_count)
+
+    def floor_division_sql(self, expression, divisor):
+        """
+        Integer bucket of ``expression``, rounded towards negative infinity.
+        """
+        return f"FLOOR(({expression}) / {int(divisor)})"
+
+    def upsert_sql(self, table, columns, key_columns, updates, row_count=1, guard=None):
+        """
+        INSERT that updates the existing row on a key conflict. ``updates`` maps
+        a column to ``"replace"`` (take the new value) or ``"add"`` (add the new
+        value to the stored one). With a ``(column, value)`` ``guard`` the
+        existing row is only updated while that column holds ``value``.
+        """
+        raise NotImplementedError()
+
+    def literal_sql(self, value):
+        return "'" + str(value).replace("'", "''") + "'"
+
+    def insert_ignore_sql(self, table, columns, row_count=1):
+        raise NotImplementedError()
+
+    def was_inserted(self, cursor, explicit_key):
+        """
+        Whether the last ``upsert_sql`` statement inserted a new row.
+        """
+        raise NotImplementedError()
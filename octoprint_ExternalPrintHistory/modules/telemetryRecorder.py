@@ -0,0 +1,228 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import base64
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+
+# Channel name, quantization factor applied before delta encoding
+CHANNELS = (
+    ("time", 1),
+    ("nozzle_actual", 10),
+    ("nozzle_target", 10),
+    ("bed_actual", 10),
+    ("bed_target", 10),
+    ("z", 100),
+    ("layer", 1),
+    ("feedrate", 1),
+)
+ENCODING_VERSION = 1
+
+Z_PATTERN = re.compile(r"\bZ(-?\d*\.?\d+)")
+F_PATTERN = re.compile(r"\bF(\d*\.?\d+)")
+S_PATTERN = re.compile(r"\bS(\d*\.?\d+)")
+
+# A layer starts when Z rises above the highest Z so far by more than this (mm),
+# so Z-hops and the moves back down after them do not count
+LAYER_EPSILON = 0.001
+
+
+class TelemetryRecorder():
+    """
+    Low-overhead recorder for temperatures, layer changes and feedrate during a
+    print, fed from the sent G-code hook.
+
+    The hook path only compares strings and updates a few attributes; a sample
+    is taken at most every ``sample_interval`` seconds into preallocated
+    ``array`` ring buffers, so no objects are allocated per sample.
+    """
+    def __init__(self, plugin, _logger, capacity=8192, sample_interval=5.0, max_points=600):
+        self._logger = _logger
+        self.plugin = plugin
+        self.capacity = capacity
+        self.sample_interval = sample_interval
+        self.max_points = max_points
+        self._buffers = [array("d", bytes(8 * capacity)) for _ in CHANNELS]
+        self._lock = threading.Lock()
+        self._active = False
+        self._reset()
+
+    def _reset(self):
+        self._count = 0
+        self._started = 0.0
+        self._next_sample = 0.0
+        self._z = 0.0
+        self._max_z = 0.0
+        self._relative = False
+        self._layer = 0
+        self._feedrate = 0.0
+        self._nozzle_target = 0.0
+        self._bed_target = 0.0
+
+    def start(self):
+        with self._lock:
+            self._reset()
+            self._started = time.monotonic()
+            self._active = True
+
+    def on_gcode_sent(self, cmd, gcode):
+        if not self._active or not gcode:
+            return
+
+        if gcode == "G1" or gcode == "G0":
+            if "Z" in cmd:
+                match = Z_PATTERN.search(cmd)
+                if match:
+                    z = float(match.group(1))
+                    if self._relative:
+                        z += self._z
+                    if z > self._max_z + LAYER_EPSILON:
+                        self._layer += 1
+                        self._max_z = z
+                    self._z = z
+            if "F" in cmd:
+                match = F_PATTERN.search(cmd)
+                if match:
+                    self._feedrate = float(match.group(1))
+        elif gcode == "G90":
+            self._relative = False
+        elif gcode == "G91":
+            self._relative = True
+        elif gcode == "G92":
+            match = Z_PATTERN.search(cmd)
+            if match:
+                # Position redefined, the layers continue from the new Z
+                self._z = self._max_z = float(match.group(1))
+        elif gcode == "M104" or gcode == "M109":
+            match = S_PATTERN.search(cmd)
+            if match:
+                self._nozzle_target = float(match.group(1))
+        elif gcode == "M140" or gcode == "M190":
+            match = S_PATTERN.search(cmd)
+            if match:
+                self._bed_target = float(match.group(1))
+
+        now = time.monotonic()
+        if now >= self._next_sample:
+            self._next_sample = now + self.sample_interval
+            self._sample(now)
+
+    def _sample(self, now):
+        nozzle_actual = bed_actual = 0.0
+        try:
+            temperatures = self.plugin._printer.get_current_temperatures()
+            nozzle_actual = (temperatures.get("tool0") or {}).get("actual") or 0.0
+            bed_actual = (temperatures.get("bed") or {}).get("actual") or 0.0
+        except Exception:
+            pass
+
+        with self._lock:
+            if not self._active:
+                return
+            index = self._count % self.capacity
+            buffers = self._buffers
+            buffers[0][index] = now - self._started
+            buffers[1][index] = nozzle_actual
+            buffers[2][index] = self._nozzle_target
+            buffers[3][index] = bed_actual
+            buffers[4][index] = self._bed_target
+            buffers[5][index] = self._z
+            buffers[6][index] = self._layer
+            buffers[7][index] = self._feedrate
+            self._count += 1
+
+    def finish(self):
+        """
+        Stop recording and return the downsampled, encoded telemetry of the
+        print as ``{"samples": n, "data": <base64>}``, or None if nothing was sampled.
+        """
+        with self._lock:
+            if not self._active:
+                return None
+            self._active = False
+            count = min(self._count, self.capacity)
+            start = self._count - count
+            columns = [[buffer[(start + i) % self.capacity] for i in range(count)] for buffer in self._buffers]
+
+        if not count:
+            return None
+
+        columns = self._downsample(columns, self.max_points)
+        data = encode_telemetry(columns)
+        return {"samples": len(columns[0]), "data": base64.b64encode(data).decode()}
+
+    def _downsample(self, columns, max_points):
+        count = len(columns[0])
+        if count <= max_points:
+            return columns
+
+        downsampled = [[] for _ in columns]
+        for bucket in range(max_points):
+            first = bucket * count // max_points
+            last = max(first + 1, (bucket + 1) * count // max_points)
+            for channel, column in enumerate(columns):
+                values = column[first:last]
+                name = CHANNELS[channel][0]
+                if name in ("z", "layer"):
+                    downsampled[channel].append(max(values))
+                elif name == "time":
+                    downsampled[channel].append(values[0])
+                elif name in ("nozzle_target", "bed_target"):
+                    downsampled[channel].append(values[-1])
+                else:
+                    downsampled[channel].append(sum(values) / len(values))
+        return downsampled
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+def encode_telemetry(columns):
+    """
+    Quantize every channel, delta-encode it, write the deltas as zigzag
+    varints and compress the result.
+    """
+    payload = bytearray(struct.pack("<BHI", ENCODING_VERSION, len(CHANNELS), len(columns[0])))
+    for (_, factor), column in zip(CHANNELS, columns):
+        previous = 0
+        for value in column:
+            quantized = int(round(value * factor))
+            delta = _zigzag(quantized - previous)
+            previous = quantized
+            while delta >= 0x80:
+                payload.append((delta & 0x7F) | 0x80)
+                delta >>= 7
+            payload.append(delta)
+    return zlib.compress(bytes(payload), 9)
+
+def decode_telemetry(data):
+    payload = zlib.decompress(data)
+    version, channel_count, count = struct.unpack_from("<BHI", payload)
+    if version != ENCODING_VERSION:
+        raise ValueError(f"Unsupported telemetry encoding version: {version}")
+
+    offset = struct.calcsize("<BHI")
+    decoded = {}
+    for name, factor in CHANNELS[:channel_count]:
+        values = []
+        previous = 0
+        for _ in range(count):
+            delta = shift = 0
+            while True:
+                byte = payload[offset]
+                offset += 1
+                delta |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            previous += _unzigzag(delta)
+            values.append(previous / factor)
+        decoded[name] = values
+    return decoded
@@ -85,4 +85,120 @@ function ExternalPrintHistoryApiRest() {
             });
         });
     };
+
+    /**
+     * Fetches one page of the print history.
+     *
+     * @param {object} query - Filters, sorting and the "after" key of the previous page.
+     * @return {Promise} A promise that resolves with {prints, next} or rejects with an error message.
+     */
+    self.getHistory = function (query) {
+        return new Promise((resolve, reject) => {
+            $.ajax({
+                url: urlApi + "/history",
+                type: "GET",
+                data: query,
+                success: function (response) {
+                    resolve(response);
+                },
+                error: function (xhr) {
+                    if (xhr.responseJSON && xhr.responseJSON.message) {
+                        errorMessage = xhr.responseJSON.message;
+                    } else if (xhr.responseText) {
+                        errorMessage = xhr.responseText;
+                    }
+                    console.error("Failed to load print history: " + errorMessage);
+                    reject(errorMessage);
+                },
+            });
+        });
+    };
+
+    self.getStats = function (query) {
+        return new Promise((resolve, reject) => {
+            $.ajax({
+                url: urlApi + "/stats",
+                type: "GET",
+                data: query,
+                success: function (response) {
+                    resolve(response);
+                },
+                error: function (xhr) {
+                    if (xhr.responseJSON && xhr.responseJSON.message) {
+                        errorMessage = xhr.responseJSON.message;
+                    } else if (xhr.responseText) {
+                        errorMessage = xhr.responseText;
+                    }
+                    console.error("Failed to load printer statistics: " + errorMessage);
+                    reject(errorMessage);
+                },
+            });
+        });
+    };
+
+    self.getEta = function () {
+        return new Promise((resolve, reject) => {
+            $.ajax({
+                url: urlApi + "/eta",
+                type: "GET",
+                success: function (response) {
+                    resolve(response);
+                },
+                error: function (xhr) {
+                    if (xhr.responseJSON && xhr.responseJSON.message) {
+                        errorMessage = xhr.responseJSON.message;
+                    } else if (xhr.responseText) {
+                        errorMessage = xhr.responseText;
+                    }
+                    console.error("Failed to load print time estimates: " + errorMessage);
+                    reject(errorMessage);
+                },
+            });
+        });
+    };
+
+    self.importHistory = function (data) {
+        return new Promise((resolve, reject) => {
+            $.ajax({
+                url: urlApi + "/importHistory",
+                type: "PUT",
+                contentType: "application/json",
+                data: JSON.stringify(data),
+                success: function (response) {
+                    resolve(response);
+                },
+                error: function (xhr) {
+                    if (xhr.responseJSON && xhr.responseJSON.message) {
+                        errorMessage = xhr.responseJSON.message;
+                    } else if (xhr.responseText) {
+                        errorMessage = xhr.responseText;
+                    }
+                    console.error("Failed to start history import: " + errorMessage);
+                    reject(errorMessage);
+                },
+            });
+        });
+    };
+
+    self.getAnalytics = function (query) {
+        return new Promise((resolve, reject) => {
+            $.ajax({
+                url: urlApi + "/analytics",
+                type: "GET",
+                data: query,
+                success: function (response) {
+                    resolve(response);
+                },
+                error: function (xhr) {
+                    if (xhr.responseJSON && xhr.responseJSON.message) {
+                        errorMessage = xhr.responseJSON.message;
+                    } else if (xhr.responseText) {
+                        errorMessage = xhr.responseText;
+                    }
+                    console.error("Failed to load analytics: " + errorMessage);
+                    reject(errorMessage);
+                },
+            });
+        });
+    };
 }
@@ -6,9 +6,47 @@ $(function () {
 
         self.printerStatus = ko.observable("");
         self.connection_Status = ko.observable("");
+        self.importStatus = ko.observable("");
+
+        self.importHistory = function () {
+            $("#import_history").prop("disabled", true);
+            self.api
+                .importHistory({})
+                .then((response) => {
+                    if (response.error) {
+                        self.importStatus("Import failed: " + response.message);
+                        $("#import_history").prop("disabled", false);
+                    } else {
+                        self.importStatus("Import started");
+                    }
+                })
+                .catch((error) => {
+                    self.importStatus("Import failed: " + error);
+                    $("#import_history").prop("disabled", false);
+                });
+        };
+
+        self.onDataUpdaterPluginMessage = function (plugin, data) {
+            if (plugin != "ExternalPrintHistory" || data.action != "importProgress") {
+                return;
+            }
+            const status = data.status;
+            const parts = Object.keys(status.sources || {}).map((source) => {
+                const progress = status.sources[source];
+                return source + ": " + progress.imported + " imported of " + progress.read +
+                    " read (" + Math.round(progress.rate) + "/s)" + (progress.done ? ", done" : "");
+            });
+            if (status.error) {
+                parts.push("error: " + status.error);
+            }
+            self.importStatus((status.running ? "Importing... " : "Import finished. ") + parts.join("; "));
+            $("#import_history").prop("disabled", status.running);
+        };
 
         self.testDbConnection = function () {
             const settings = {
+                db_backend: $("#db_backend").val(),
+                db_sqlite_path: $("#db_sqlite_path").val(),
                 db_user: $("#db_user").val(),
                 db_password: $("#db_password").val(),
                 db_host: $("#db_host").val(),
@@ -17,11 +55,12 @@ $(function () {
             };
 
             if (
+                settings.db_backend != "sqlite" && (
                 !settings.db_user ||
                 !settings.db_password ||
                 !settings.db_host ||
                 !settings.db_port ||
-                !settings.db_database
+                !settings.db_database)
             ) {
                 $("#connection_Status").text("All fields are required");
                 return;
@@ -109,6 +148,8 @@ $(function () {
             $("#db_host").prop("readonly", status);
             $("#db_port").prop("readonly", status);
             $("#db_database").prop("readonly", status);
+            $("#db_backend").prop("disabled", status);
+            $("#db_sqlite_path").prop("readonly", status);
         };
 
         self.statusInputPrinter = function (status) {
@@ -140,6 +181,7 @@ $(function () {
 
         $("#data_Printer").click(self.selectPrinter);
         $("#test_connection").click(self.testDbConnection);
+        $("#import_history").click(self.importHistory);
     }
 
     OCTOPRINT_VIEWMODELS.push({
@@ -0,0 +1,201 @@
+$(function () {
+    function ExternalPrintHistoryTab(parameters) {
+        var self = this;
+
+        self.settingsViewModel = parameters[0];
+        self.api = new ExternalPrintHistoryApiRest();
+
+        self.prints = ko.observableArray([]);
+        self.nextKey = ko.observable(null);
+        self.loading = ko.observable(false);
+        self.status = ko.observable("");
+
+        self.filterFileName = ko.observable("");
+        self.filterState = ko.observable("");
+        self.filterDateFrom = ko.observable("");
+        self.filterDateTo = ko.observable("");
+        self.sortBy = ko.observable("start_datetime");
+        self.sortOrder = ko.observable("desc");
+
+        self.activePrint = ko.observable(null);
+        self.today = ko.observable(null);
+        self.statsRefresh = null;
+
+        self.buildQuery = function () {
+            const query = {
+                sort_by: self.sortBy(),
+                order: self.sortOrder(),
+            };
+            if (self.filterFileName()) query.file_name = self.filterFileName();
+            if (self.filterState()) query.state = self.filterState();
+            if (self.filterDateFrom()) query.date_from = self.filterDateFrom();
+            if (self.filterDateTo()) query.date_to = self.filterDateTo();
+            if (self.nextKey()) query.after = JSON.stringify(self.nextKey());
+            return query;
+        };
+
+        self.loadPage = function () {
+            self.loading(true);
+            self.status("");
+            self.api
+                .getHistory(self.buildQuery())
+                .then((response) => {
+                    if (response.error == false) {
+                        ko.utils.arrayPushAll(self.prints, response.prints);
+                        self.nextKey(response.next);
+                        if (self.prints().length == 0) {
+                            self.status("No prints found");
+                        }
+                    } else {
+                        self.status("Error loading history: " + response.message);
+                    }
+                })
+                .catch((error) => {
+                    self.status("Error loading history: " + error);
+                })
+                .finally(() => {
+                    self.loading(false);
+                });
+        };
+
+        self.reload = function () {
+            self.prints.removeAll();
+            self.nextKey(null);
+            self.loadPage();
+            self.loadToday();
+        };
+
+        // Rollup buckets are keyed by the UTC end date of the prints
+        self.todayBucket = function () {
+            return new Date().toISOString().slice(0, 10);
+        };
+
+        self.loadToday = function () {
+            const bucket = self.todayBucket();
+            self.api
+                .getStats({ period: "day", date_from: bucket })
+                .then((response) => {
+                    if (response.error == false) {
+                        const stats = response.stats.find((row) => row.day == bucket);
+                        self.today(Object.assign({ day: bucket, print_count: 0, failed_count: 0, print_seconds: 0, filament_length: 0 }, stats));
+                    }
+                })
+                .catch(() => {});
+        };
+
+        self.loadActivePrint = function () {
+            self.api
+                .getEta()
+                .then((response) => {
+                    if (response.error == false) {
+                        self.activePrint(response.printing);
+                    }
+                })
+                .catch(() => {});
+        };
+
+        // Expected end of the active print, from the corrected estimate when the model has one
+        self.formatEta = function (print) {
+            const seconds = print.corrected_time || print.estimated_time;
+            if (!seconds || !print.start_datetime) return "";
+            const end = new Date(new Date(print.start_datetime.replace(" ", "T") + "Z").getTime() + seconds * 1000);
+            return "ETA " + end.toLocaleString() + (print.corrected_time ? " (" + self.formatDuration(print.corrected_time) +
+                ", slicer " + self.formatDuration(print.estimated_time) + ")" : "");
+        };
+
+        self.matchesFilters = function (row) {
+            if (self.filterState() && row.state != self.filterState()) return false;
+            if (self.filterFileName() && (row.file_name || "").indexOf(self.filterFileName()) == -1) return false;
+            if (self.filterDateFrom() && (row.start_datetime || "") < self.filterDateFrom()) return false;
+            if (self.filterDateTo() && (row.start_datetime || "") >= self.filterDateTo()) return false;
+            return true;
+        };
+
+        self.applyPrint = function (row) {
+            const existing = ko.utils.arrayFirst(self.prints(), (print) => print.print_uuid == row.print_uuid);
+            if (existing) {
+                self.prints.replace(existing, Object.assign({}, existing, row));
+            } else if (self.sortBy() == "start_datetime" && self.sortOrder() == "desc" && self.matchesFilters(row)) {
+                // Newest first, a new print belongs at the top of the first page
+                self.prints.unshift(row);
+                self.status("");
+            }
+        };
+
+        self.applyRollup = function (update) {
+            const today = self.today();
+            if (update.period != "day" || !today || update.bucket != today.day) return;
+            const updated = Object.assign({}, today);
+            Object.keys(update.delta).forEach((column) => {
+                updated[column] = (updated[column] || 0) + update.delta[column];
+            });
+            self.today(updated);
+        };
+
+        self.onDataUpdaterPluginMessage = function (plugin, data) {
+            if (plugin != "ExternalPrintHistory" || data.action != "historyUpdate") {
+                return;
+            }
+            data.updates.forEach((update) => {
+                if (update.type == "state") {
+                    self.activePrint(update.state == "printing" ? update : null);
+                } else if (update.type == "print") {
+                    self.applyPrint(update);
+                } else if (update.type == "rollup") {
+                    self.applyRollup(update);
+                }
+            });
+            if (data.stale.indexOf("rollup") != -1 && !self.statsRefresh) {
+                // Many buckets changed at once (e.g. an import), read today's figures again at most every few seconds
+                self.statsRefresh = setTimeout(() => {
+                    self.statsRefresh = null;
+                    self.loadToday();
+                }, 5000);
+            }
+            if (data.stale.indexOf("print") != -1) {
+                self.status("New prints were recorded, search again to show them");
+            }
+        };
+
+        self.loadMore = function () {
+            self.loadPage();
+        };
+
+        self.formatDuration = function (seconds) {
+            if (seconds == null) return "-";
+            const hours = Math.floor(seconds / 3600);
+            const minutes = Math.floor((seconds % 3600) / 60);
+            return hours + "h " + minutes + "m";
+        };
+
+        self.formatCost = function (cost) {
+            if (cost == null) return "-";
+            return cost.toFixed(2) + " " + self.settingsViewModel.settings.plugins.ExternalPrintHistory.currency();
+        };
+
+        self.thumbnailUrl = function (thumbnailHash) {
+            return BASEURL + "plugin/ExternalPrintHistory/thumbnail/" + thumbnailHash;
+        };
+
+        self.exportUrl = function (format) {
+            const query = { format: format, gzip: "true" };
+            if (self.filterState()) query.state = self.filterState();
+            if (self.filterDateFrom()) query.date_from = self.filterDateFrom();
+            if (self.filterDateTo()) query.date_to = self.filterDateTo();
+            return BASEURL + "plugin/ExternalPrintHistory/export?" + $.param(query);
+        };
+
+        self.onTabChange = function (current, previous) {
+            if (current == "#tab_plugin_ExternalPrintHistory" && self.prints().length == 0) {
+                self.reload();
+                self.loadActivePrint();
+            }
+        };
+    }
+
+    OCTOPRINT_VIEWMODELS.push({
+        construct: ExternalPrintHistoryTab,
+        dependencies: ["settingsViewModel"],
+        elements: ["#ExternalPrintHistory-tab"],
+    });
+});
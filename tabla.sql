@@ -51,7 +51,7 @@ CREATE TABLE `Print` (
   `end_datetime` datetime DEFAULT NULL,
   `duration` int(11) DEFAULT NULL,
   `estimated_time` int(11) DEFAULT NULL,
-  `image` blob DEFAULT NULL,
+  `thumbnail_hash` char(64) DEFAULT NULL,
   `calculated_length` decimal(10,2) DEFAULT NULL,
   `total_length` decimal(10,2) DEFAULT NULL,
   `calculated_height` decimal(10,2) DEFAULT NULL,
@@ -64,7 +64,23 @@ CREATE TABLE `Print` (
   `bed_temperature` decimal(5,2) DEFAULT NULL,
   `bed_type` varchar(50) DEFAULT NULL,
   `nozzle_diameter` decimal(5,2) DEFAULT NULL,
-  `state` varchar(50) DEFAULT NULL
+  `state` varchar(50) DEFAULT NULL,
+  `file_name` varchar(255) DEFAULT NULL,
+  `file_path` varchar(255) DEFAULT NULL,
+  `print_uuid` char(36) DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE `PrintTelemetry` (
+  `print_id` int(11) NOT NULL,
+  `sample_count` int(11) NOT NULL,
+  `data` mediumblob NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE `Thumbnail` (
+  `thumbnail_hash` char(64) NOT NULL,
+  `content_type` varchar(50) DEFAULT NULL,
+  `size` int(11) DEFAULT NULL,
+  `image` mediumblob DEFAULT NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 CREATE TABLE `Printer` (
@@ -73,7 +89,36 @@ CREATE TABLE `Printer` (
   `model` varchar(100) DEFAULT NULL,
   `name` varchar(100) DEFAULT NULL,
   `status` varchar(50) DEFAULT NULL,
-  `power_consumption` decimal(10,2) DEFAULT NULL
+  `power_consumption` decimal(10,2) DEFAULT NULL,
+  `purchase_price` decimal(10,2) DEFAULT NULL,
+  `estimated_lifespan` decimal(10,2) DEFAULT NULL,
+  `maintenance_costs` decimal(10,2) DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE `PrinterStatsDaily` (
+  `printer_id` int(11) NOT NULL,
+  `day` date NOT NULL,
+  `print_count` int(11) NOT NULL DEFAULT 0,
+  `failed_count` int(11) NOT NULL DEFAULT 0,
+  `print_seconds` bigint(20) NOT NULL DEFAULT 0,
+  `filament_length` decimal(14,2) NOT NULL DEFAULT 0,
+  `filament_weight` decimal(14,2) NOT NULL DEFAULT 0,
+  `energy_kwh` decimal(14,4) NOT NULL DEFAULT 0,
+  `electricity_cost` decimal(14,4) NOT NULL DEFAULT 0,
+  `depreciation` decimal(14,4) NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+CREATE TABLE `PrinterStatsMonthly` (
+  `printer_id` int(11) NOT NULL,
+  `month` date NOT NULL,
+  `print_count` int(11) NOT NULL DEFAULT 0,
+  `failed_count` int(11) NOT NULL DEFAULT 0,
+  `print_seconds` bigint(20) NOT NULL DEFAULT 0,
+  `filament_length` decimal(14,2) NOT NULL DEFAULT 0,
+  `filament_weight` decimal(14,2) NOT NULL DEFAULT 0,
+  `energy_kwh` decimal(14,4) NOT NULL DEFAULT 0,
+  `electricity_cost` decimal(14,4) NOT NULL DEFAULT 0,
+  `depreciation` decimal(14,4) NOT NULL DEFAULT 0
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 CREATE TABLE `Print_Design` (
@@ -81,6 +126,22 @@ CREATE TABLE `Print_Design` (
   `design_id` int(11) NOT NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
+CREATE TABLE `SchemaVersion` (
+  `version` int(11) NOT NULL,
+  `description` varchar(255) DEFAULT NULL,
+  `applied_at` datetime DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- This script creates the current schema; mark the plugin's migrations as applied
+INSERT INTO `SchemaVersion` (`version`, `description`, `applied_at`) VALUES
+(1, 'Printer cost columns', NOW()),
+(2, 'Print file and thumbnail columns', NOW()),
+(3, 'Print history indexes', NOW()),
+(4, 'Client generated print UUIDs', NOW()),
+(5, 'Drop the insert_or_update_print procedure', NOW()),
+(6, 'Print history state sort index', NOW()),
+(7, 'Printer lifespan in fractional hours', NOW());
+
 
 ALTER TABLE `Customer`
   ADD PRIMARY KEY (`customer_id`);
@@ -99,15 +160,36 @@ ALTER TABLE `Order`
 ALTER TABLE `Print`
   ADD PRIMARY KEY (`print_id`),
   ADD KEY `printer_id` (`printer_id`),
-  ADD KEY `fk_order` (`order_id`);
+  ADD KEY `fk_order` (`order_id`),
+  ADD KEY `idx_print_history` (`printer_id`,`start_datetime`,`print_id`),
+  ADD KEY `idx_print_history_state` (`printer_id`,`state`,`start_datetime`,`print_id`),
+  ADD KEY `idx_print_history_file` (`printer_id`,`file_name`,`print_id`),
+  ADD KEY `idx_print_history_by_state` (`printer_id`,`state`,`print_id`),
+  ADD KEY `thumbnail_hash` (`thumbnail_hash`),
+  ADD UNIQUE KEY `print_uuid` (`print_uuid`);
 
 ALTER TABLE `Printer`
   ADD PRIMARY KEY (`printer_id`);
 
+ALTER TABLE `PrintTelemetry`
+  ADD PRIMARY KEY (`print_id`);
+
+ALTER TABLE `Thumbnail`
+  ADD PRIMARY KEY (`thumbnail_hash`);
+
+ALTER TABLE `PrinterStatsDaily`
+  ADD PRIMARY KEY (`printer_id`,`day`);
+
+ALTER TABLE `PrinterStatsMonthly`
+  ADD PRIMARY KEY (`printer_id`,`month`);
+
 ALTER TABLE `Print_Design`
   ADD PRIMARY KEY (`print_id`,`design_id`),
   ADD KEY `design_id` (`design_id`);
 
+ALTER TABLE `SchemaVersion`
+  ADD PRIMARY KEY (`version`);
+
 
 ALTER TABLE `Customer`
   MODIFY `customer_id` int(11) NOT NULL AUTO_INCREMENT;
@@ -137,7 +219,17 @@ ALTER TABLE `Order`
 ALTER TABLE `Print`
   ADD CONSTRAINT `Print_ibfk_1` FOREIGN KEY (`order_id`) REFERENCES `Order` (`order_id`),
   ADD CONSTRAINT `Print_ibfk_2` FOREIGN KEY (`printer_id`) REFERENCES `Printer` (`printer_id`),
-  ADD CONSTRAINT `fk_order` FOREIGN KEY (`order_id`) REFERENCES `Order` (`order_id`);
+  ADD CONSTRAINT `fk_order` FOREIGN KEY (`order_id`) REFERENCES `Order` (`order_id`),
+  ADD CONSTRAINT `Print_ibfk_3` FOREIGN KEY (`thumbnail_hash`) REFERENCES `Thumbnail` (`thumbnail_hash`);
+
+ALTER TABLE `PrintTelemetry`
+  ADD CONSTRAINT `PrintTelemetry_ibfk_1` FOREIGN KEY (`print_id`) REFERENCES `Print` (`print_id`) ON DELETE CASCADE;
+
+ALTER TABLE `PrinterStatsDaily`
+  ADD CONSTRAINT `PrinterStatsDaily_ibfk_1` FOREIGN KEY (`printer_id`) REFERENCES `Printer` (`printer_id`);
+
+ALTER TABLE `PrinterStatsMonthly`
+  ADD CONSTRAINT `PrinterStatsMonthly_ibfk_1` FOREIGN KEY (`printer_id`) REFERENCES `Printer` (`printer_id`);
 
 ALTER TABLE `Print_Design`
   ADD CONSTRAINT `Print_Design_ibfk_1` FOREIGN KEY (`print_id`) REFERENCES `Print` (`print_id`),
@@ -146,122 +238,3 @@ ALTER TABLE `Print_Design`
 /*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;
 /*!40101 SET CHARACTER_SET_RESULTS=@OLD_CHARACTER_SET_RESULTS */;
 /*!40101 SET COLLATION_CONNECTION=@OLD_COLLATION_CONNECTION */;
-
-DELIMITER //
-
-CREATE PROCEDURE insert_or_update_print (
-    IN p_print_id INT,
-    IN p_order_id INT,
-    IN p_printer_id INT,
-    IN p_filament_id INT,
-    IN p_start_datetime DATETIME,
-    IN p_end_datetime DATETIME,
-    IN p_duration INT,
-    IN p_estimated_time INT,
-    IN p_image BLOB,
-    IN p_calculated_length DECIMAL(10,2),
-    IN p_total_length DECIMAL(10,2),
-    IN p_calculated_height DECIMAL(10,2),
-    IN p_total_height DECIMAL(10,2),
-    IN p_calculated_layers INT,
-    IN p_total_layers INT,
-    IN p_calculated_weight DECIMAL(10,2),
-    IN p_total_weight DECIMAL(10,2),
-    IN p_nozzle_temperature DECIMAL(5,2),
-    IN p_bed_temperature DECIMAL(5,2),
-    IN p_bed_type VARCHAR(50),
-    IN p_nozzle_diameter DECIMAL(5,2),
-    IN p_state VARCHAR(50),
-    OUT p_result_id INT
-)
-BEGIN
-    DECLARE v_existing_id INT;
-
-    -- Check if the print_id already exists
-    SELECT print_id INTO v_existing_id
-    FROM Print
-    WHERE print_id = p_print_id;
-
-    IF v_existing_id IS NOT NULL THEN
-        -- Update existing record
-        UPDATE Print
-        SET order_id = p_order_id,
-            printer_id = p_printer_id,
-            filament_id = p_filament_id,
-            start_datetime = p_start_datetime,
-            end_datetime = p_end_datetime,
-            duration = p_duration,
-            estimated_time = p_estimated_time,
-            image = p_image,
-            calculated_length = p_calculated_length,
-            total_length = p_total_length,
-            calculated_height = p_calculated_height,
-            total_height = p_total_height,
-            calculated_layers = p_calculated_layers,
-            total_layers = p_total_layers,
-            calculated_weight = p_calculated_weight,
-            total_weight = p_total_weight,
-            nozzle_temperature = p_nozzle_temperature,
-            bed_temperature = p_bed_temperature,
-            bed_type = p_bed_type,
-            nozzle_diameter = p_nozzle_diameter,
-            state = p_state
-        WHERE print_id = p_print_id;
-        
-        -- Set result ID to the existing print_id
-        SET p_result_id = p_print_id;
-    ELSE
-        -- Insert new record
-        INSERT INTO Print (
-            order_id,
-            printer_id,
-            filament_id,
-            start_datetime,
-            end_datetime,
-            duration,
-            estimated_time,
-            image,
-            calculated_length,
-            total_length,
-            calculated_height,
-            total_height,
-            calculated_layers,
-            total_layers,
-            calculated_weight,
-            total_weight,
-            nozzle_temperature,
-            bed_temperature,
-            bed_type,
-            nozzle_diameter,
-            state
-        )
-        VALUES (
-            p_order_id,
-            p_printer_id,
-            p_filament_id,
-            p_start_datetime,
-            p_end_datetime,
-            p_duration,
-            p_estimated_time,
-            p_image,
-            p_calculated_length,
-            p_total_length,
-            p_calculated_height,
-            p_total_height,
-            p_calculated_layers,
-            p_total_layers,
-            p_calculated_weight,
-            p_total_weight,
-            p_nozzle_temperature,
-            p_bed_temperature,
-            p_bed_type,
-            p_nozzle_diameter,
-            p_state
-        );
-
-        -- Get the last inserted ID
-        SET p_result_id = LAST_INSERT_ID();
-    END IF;
-END //
-
-DELIMITER ;